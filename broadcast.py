@@ -0,0 +1,359 @@
+"""
+Рассылка /broadcast по сегменту пользователей.
+
+При запуске telegram_id сегмента одним INSERT ... SELECT копируются в
+broadcast_recipients — дальше рассылка не зависит от изменений в users.
+Получатели обрабатываются батчами по возрастанию id; после каждого батча
+в одной транзакции сохраняются счётчики, checkpoint (последний id) и
+blocked_at для заблокировавших бота. После рестарта RUNNING-рассылки
+продолжаются с checkpoint (повторно может уйти не больше одного батча).
+
+Ошибка батча (БД занята, сбой записи, неожиданное исключение отправки)
+доставку не останавливает: батч повторяется с checkpoint с растущей
+задержкой, а после BROADCAST_ALERT_AFTER неудач подряд пишем админу.
+
+Скорость ограничивает общий telegram_limiter из fanout.py, прогресс
+обновляется в одном сообщении админа.
+"""
+import asyncio
+import html
+import logging
+import re
+import time
+from datetime import datetime, timezone
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from sqlalchemy import select, insert, update, delete, func, literal, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import keyboards
+from database import (
+    get_session,
+    background_db,
+    User,
+    BoxOrder,
+    BoxOrderStatus,
+    BroadcastStatus,
+    BroadcastJob,
+    BroadcastRecipient,
+)
+from fanout import fan_out, run_in_background, FanoutResult
+from notifier import AdminNotifier, PRIORITY_HIGH
+
+logger = logging.getLogger(__name__)
+
+# ===== КОНСТАНТЫ РАССЫЛКИ =====
+BROADCAST_BATCH_SIZE = 200          # Получателей между checkpoint'ами
+BROADCAST_PROGRESS_INTERVAL = 5     # Секунд между обновлениями прогресса
+BROADCAST_RETRY_BASE = 5            # Секунд до повтора упавшего батча; удваивается
+BROADCAST_RETRY_MAX = 300
+BROADCAST_ALERT_AFTER = 5           # Неудач подряд, после которых пишем админу
+
+SEGMENT_ALL = "all"
+SEGMENT_REMINDERS = "reminders"
+SEGMENT_BOX = "box"                 # box:2026-03 — покупатели набора месяца
+SEGMENT_BOX_PATTERN = re.compile(r"^box:\d{4}-(0[1-9]|1[0-2])$")
+
+# Предзаказы, которые считаются покупкой набора
+BOX_BUYER_STATUSES = (
+    BoxOrderStatus.PAID,
+    BoxOrderStatus.CONFIRMED,
+    BoxOrderStatus.SHIPPED,
+    BoxOrderStatus.DELIVERED,
+)
+
+STATUS_LABELS = {
+    BroadcastStatus.DRAFT: "ждёт подтверждения",
+    BroadcastStatus.RUNNING: "идёт",
+    BroadcastStatus.DONE: "завершена",
+    BroadcastStatus.CANCELLED: "остановлена",
+}
+
+# Рассылки, которые уже доставляются в этом процессе
+_running: set[int] = set()
+
+
+def parse_segment(args: str) -> str:
+    """
+    "all", "reminders" или "box 2026-03" -> сегмент.
+
+    Raises:
+        ValueError: неизвестный сегмент
+    """
+    tokens = args.lower().split()
+    if tokens in ([SEGMENT_ALL], [SEGMENT_REMINDERS]):
+        return tokens[0]
+    if len(tokens) == 2 and tokens[0] == SEGMENT_BOX:
+        segment = f"{SEGMENT_BOX}:{tokens[1]}"
+        if SEGMENT_BOX_PATTERN.match(segment):
+            return segment
+    raise ValueError(f"unknown segment {args!r}")
+
+
+def segment_query(segment: str) -> Select:
+    """telegram_id сегмента без заблокировавших бота."""
+    not_blocked = User.blocked_at.is_(None)
+
+    if segment == SEGMENT_ALL:
+        return select(User.telegram_id).where(not_blocked)
+    if segment == SEGMENT_REMINDERS:
+        return select(User.telegram_id).where(
+            User.reminder_enabled == True,  # noqa: E712
+            User.onboarding_completed == True,  # noqa: E712
+            not_blocked,
+        )
+
+    box_month = segment.split(":", 1)[1]
+    blocked = select(User.telegram_id).where(User.blocked_at.is_not(None))
+    return (
+        select(BoxOrder.telegram_id)
+        .where(
+            BoxOrder.box_month == box_month,
+            BoxOrder.status.in_(BOX_BUYER_STATUSES),
+            BoxOrder.telegram_id.not_in(blocked),
+        )
+        .distinct()
+    )
+
+
+async def count_segment(session: AsyncSession, segment: str) -> int:
+    """Размер сегмента (для превью)."""
+    subquery = segment_query(segment).subquery()
+    return (await session.execute(select(func.count()).select_from(subquery))).scalar_one()
+
+
+async def create_job(text: str, segment: str) -> tuple[int | None, int]:
+    """
+    Создать черновик рассылки.
+
+    Returns:
+        (id рассылки, размер сегмента сейчас); для пустого сегмента — (None, 0)
+    """
+    async with get_session() as session:
+        count = await count_segment(session, segment)
+        if not count:
+            return None, 0
+        job = BroadcastJob(text=text, segment=segment)
+        session.add(job)
+        await session.commit()
+        return job.id, count
+
+
+async def start_job(job_id: int, chat_id: int, message_id: int) -> int | None:
+    """
+    Запустить черновик: снять снимок получателей одним INSERT ... SELECT.
+
+    Черновик захватывается условным UPDATE (DRAFT -> RUNNING), как в
+    cancel_job: из двух нажатий «Запустить» снимок снимет и доставку
+    запустит только одно. Захват и снимок — одна транзакция, поэтому
+    RUNNING без получателей после рестарта не останется.
+
+    Returns:
+        Число получателей или None, если рассылка уже запущена или отменена
+    """
+    async with get_session() as session:
+        segment = (await session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.id == job_id, BroadcastJob.status == BroadcastStatus.DRAFT)
+            .values(
+                status=BroadcastStatus.RUNNING,
+                started_at=datetime.now(timezone.utc),
+                progress_chat_id=chat_id,
+                progress_message_id=message_id,
+            )
+            .returning(BroadcastJob.segment)
+        )).scalar_one_or_none()
+        if segment is None:
+            return None
+
+        recipients = segment_query(segment).subquery()
+        await session.execute(
+            insert(BroadcastRecipient).from_select(
+                ["job_id", "telegram_id"],
+                select(literal(job_id), recipients.c.telegram_id),
+            )
+        )
+        total = (await session.execute(
+            select(func.count()).where(BroadcastRecipient.job_id == job_id)
+        )).scalar_one()
+
+        await session.execute(
+            update(BroadcastJob).where(BroadcastJob.id == job_id).values(total=total)
+        )
+        await session.commit()
+
+    logger.info(f"Broadcast {job_id} started for {total} recipients")
+    return total
+
+
+async def cancel_job(job_id: int) -> bool:
+    """Отменить черновик или остановить идущую рассылку."""
+    async with get_session() as session:
+        result = await session.execute(
+            update(BroadcastJob)
+            .where(
+                BroadcastJob.id == job_id,
+                BroadcastJob.status.in_((BroadcastStatus.DRAFT, BroadcastStatus.RUNNING)),
+            )
+            .values(status=BroadcastStatus.CANCELLED, finished_at=datetime.now(timezone.utc))
+        )
+        await session.commit()
+    return result.rowcount > 0
+
+
+def render_progress(job: BroadcastJob) -> str:
+    """Текст сообщения с прогрессом."""
+    processed = job.sent + job.failed + job.blocked
+    return (
+        f"📣 Рассылка #{job.id} ({job.segment}): {STATUS_LABELS[job.status]}\n"
+        f"Обработано: {processed} из {job.total}\n"
+        f"✓ {job.sent}  🚫 {job.blocked}  ✗ {job.failed}"
+    )
+
+
+async def update_progress(bot: Bot, job: BroadcastJob):
+    """Обновить сообщение с прогрессом (кнопка «Остановить» — пока рассылка идёт)."""
+    if job.progress_chat_id is None:
+        return
+    reply_markup = None
+    if job.status == BroadcastStatus.RUNNING:
+        reply_markup = keyboards.admin_broadcast_progress(job.id)
+    try:
+        await bot.edit_message_text(
+            render_progress(job),
+            chat_id=job.progress_chat_id,
+            message_id=job.progress_message_id,
+            reply_markup=reply_markup,
+        )
+    except TelegramAPIError as e:
+        # "message is not modified" и удалённое сообщение рассылку не останавливают
+        logger.debug(f"Broadcast {job.id} progress not updated: {e}")
+
+
+async def _save_batch(job_id: int, last_id: int, result: FanoutResult) -> BroadcastJob:
+    """Счётчики, checkpoint и blocked_at — одной транзакцией."""
+    async with get_session() as session:
+        job = (await session.execute(
+            select(BroadcastJob).where(BroadcastJob.id == job_id).with_for_update()
+        )).scalar_one()
+        job.sent += result.sent
+        job.failed += result.failed
+        job.blocked += len(result.blocked)
+        job.checkpoint = last_id
+
+        if result.blocked:
+            await session.execute(
+                update(User)
+                .where(User.telegram_id.in_(result.blocked), User.blocked_at.is_(None))
+                .values(blocked_at=datetime.now(timezone.utc))
+                .execution_options(synchronize_session=False)
+            )
+        await session.commit()
+        return job
+
+
+async def _finish(bot: Bot, job_id: int):
+    """Отметить завершение и удалить снимок получателей."""
+    async with get_session() as session:
+        job = (await session.execute(
+            select(BroadcastJob).where(BroadcastJob.id == job_id).with_for_update()
+        )).scalar_one()
+        if job.status == BroadcastStatus.RUNNING:
+            job.status = BroadcastStatus.DONE
+            job.finished_at = datetime.now(timezone.utc)
+        await session.execute(
+            delete(BroadcastRecipient).where(BroadcastRecipient.job_id == job_id)
+        )
+        await session.commit()
+
+    logger.info(
+        f"Broadcast {job_id} {job.status.value}: {job.sent} sent, "
+        f"{job.blocked} blocked, {job.failed} failed"
+    )
+    await update_progress(bot, job)
+
+
+async def _deliver_batch(bot: Bot, job_id: int) -> tuple[BroadcastJob | None, bool]:
+    """
+    Отправить следующий батч с checkpoint.
+
+    Returns:
+        (рассылка или None, если удалена; есть ли ещё что отправлять)
+    """
+    async with get_session() as session:
+        job = await session.get(BroadcastJob, job_id)
+        if job is None or job.status != BroadcastStatus.RUNNING:
+            return job, False
+        rows = (await session.execute(
+            select(BroadcastRecipient.id, BroadcastRecipient.telegram_id)
+            .where(
+                BroadcastRecipient.job_id == job_id,
+                BroadcastRecipient.id > job.checkpoint,
+            )
+            .order_by(BroadcastRecipient.id)
+            .limit(BROADCAST_BATCH_SIZE)
+        )).all()
+    if not rows:
+        return job, False
+
+    result = await fan_out(bot, [telegram_id for _, telegram_id in rows], job.text)
+    return await _save_batch(job_id, rows[-1][0], result), True
+
+
+async def deliver(bot: Bot, job_id: int):
+    """Доставить рассылку с её checkpoint до конца (или до остановки)."""
+    if job_id in _running:
+        return
+    _running.add(job_id)
+    last_progress = time.monotonic()
+    failures = 0
+
+    try:
+        # Фоновая задача: под нагрузкой ждём БД, а не получаем DatabaseBusyError
+        with background_db():
+            while True:
+                try:
+                    job, more = await _deliver_batch(bot, job_id)
+                    if job is None:
+                        return
+                    if not more:
+                        await _finish(bot, job_id)
+                        return
+                    if time.monotonic() - last_progress >= BROADCAST_PROGRESS_INTERVAL:
+                        await update_progress(bot, job)
+                        last_progress = time.monotonic()
+                except Exception as e:
+                    # Повтор с checkpoint: повторно уйдёт не больше одного батча
+                    failures += 1
+                    delay = min(BROADCAST_RETRY_BASE * 2 ** (failures - 1), BROADCAST_RETRY_MAX)
+                    logger.exception(
+                        f"Broadcast {job_id} batch failed ({failures} in a row), "
+                        f"retrying in {delay}s"
+                    )
+                    if failures == BROADCAST_ALERT_AFTER:
+                        await AdminNotifier.get_instance().notify(
+                            f"⚠️ Рассылка #{job_id}: {failures} ошибок подряд, "
+                            f"продолжаю попытки\n{html.escape(str(e))}",
+                            f"⚠️ Рассылка #{job_id} не может продолжиться",
+                            priority=PRIORITY_HIGH,
+                        )
+                    await asyncio.sleep(delay)
+                    continue
+
+                failures = 0
+    finally:
+        _running.discard(job_id)
+
+
+async def resume_broadcasts(bot: Bot) -> int:
+    """Продолжить рассылки, прерванные рестартом (вызывается при старте)."""
+    async with get_session() as session:
+        job_ids = (await session.execute(
+            select(BroadcastJob.id).where(BroadcastJob.status == BroadcastStatus.RUNNING)
+        )).scalars().all()
+
+    for job_id in job_ids:
+        logger.info(f"Resuming broadcast {job_id}")
+        run_in_background(deliver(bot, job_id), name=f"broadcast_{job_id}")
+    return len(job_ids)
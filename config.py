@@ -21,6 +21,31 @@ class Config(BaseSettings):
 
     # База данных
     database_url: str = "sqlite+aiosqlite:///bot.db"
+    slow_query_ms: int = Field(default=200, gt=0)  # Порог лога медленных запросов
+
+    # Пул соединений
+    db_pool_size: int = Field(default=5, gt=0)
+    db_max_overflow: int = Field(default=10, ge=0)
+    db_pool_recycle: int = Field(default=1800, gt=0)      # Секунды (PostgreSQL)
+    db_pool_timeout: float = Field(default=30, gt=0)      # Жёсткий таймаут пула
+    db_pool_min_idle: int = Field(default=2, ge=0)        # Соединений при старте
+    db_checkout_budget: float = Field(default=5, gt=0)    # Ожидание в get_session
+
+    # Контроль допуска к БД
+    db_admission_limit: int = Field(default=0, ge=0)      # 0 — pool_size + max_overflow
+    db_admission_queue_timeout: float = Field(default=2, gt=0)
+
+    # Отчёты (/stats, /orders, выгрузки): снапшот SQLite или read-replica
+    database_read_url: str = ""                           # PostgreSQL read-replica
+    snapshot_path: str = "bot.snapshot.db"
+    snapshot_interval_minutes: int = Field(default=5, ge=0)  # 0 — без снапшота
+
+    # Срок жизни заказов (0 — не трогать)
+    box_pending_ttl_hours: int = Field(default=72, ge=0)   # Отмена брошенных PENDING-предзаказов
+    order_retention_days: int = Field(default=90, ge=0)    # Перенос CANCELLED в архив
+
+    # Уведомления админу: раз в N секунд одним сообщением (0 — каждое отдельно)
+    admin_digest_seconds: int = Field(default=0, ge=0)
 
     # Продукт
     product_name: str = "Пауза"
@@ -31,6 +56,7 @@ class Config(BaseSettings):
     notion_token: str = ""
     notion_content_db: str = ""
     notion_ui_texts_db: str = ""
+    notion_sync_interval_minutes: int = Field(default=10, ge=0)  # 0 — только по /sync
 
     # Медиа
     welcome_photo_path: str = ""  # Путь к локальному файлу (например, "assets/welcome.jpg")
@@ -3,15 +3,35 @@
 
 Загружает контент из SQLite (синхронизированный из Notion)
 и предоставляет fallback на hardcoded значения.
+
+Кэш свой у каждого процесса. Синхронизация увеличивает content_version,
+и каждая реплика перечитывает кэш, увидев новую версию: на PostgreSQL —
+сразу по NOTIFY, на SQLite — опросом раз в CONTENT_VERSION_POLL_INTERVAL.
+
+В кэше лежит готовый к отправке вид (content_format.py): контент
+экранирован для HTML и разбит на части по лимиту Telegram, UI тексты
+экранированы с сохранением {placeholders}. Getters контента отдают
+кортеж частей — отправлять через send_parts().
 """
 import asyncio
+import html
 import logging
 import random
+import time
 from typing import Optional
 
 from sqlalchemy import select
 
-from database import get_session, ContentCache, UITextCache
+from content_format import prepare_content, prepare_ui_text
+from database import (
+    get_session,
+    background_db,
+    ContentCache,
+    UITextCache,
+    get_content_version,
+    listen_content_version,
+    unlisten_content_version,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -371,6 +391,13 @@ Email: {email}
 /box — предзаказ набора""",
 }
 
+# Через сколько секунд повторять загрузку кэша после ошибки БД
+RELOAD_RETRY_INTERVAL = 30
+
+# Проверка версии контента (синхронизация на другой реплике), секунды
+CONTENT_VERSION_POLL_INTERVAL = 30          # SQLite — только опрос
+CONTENT_VERSION_LISTEN_POLL_INTERVAL = 300  # PostgreSQL: страховка, если LISTEN отвалился
+
 # Обязательные UI ключи для валидации
 REQUIRED_UI_KEYS = [
     "ONBOARDING_WELCOME",
@@ -400,6 +427,20 @@ REQUIRED_UI_KEYS = [
     "HELP",
 ]
 
+# Fallback в готовом к отправке виде — готовится один раз при импорте
+PREPARED_FALLBACK: dict[str, list[tuple[str, ...]]] = {
+    content_type: [prepare_content(text) for text in items]
+    for content_type, items in (
+        ("pause_phrases", FALLBACK_PAUSE_PHRASES),
+        ("pause_long", FALLBACK_PAUSE_POEMS),
+        ("pause_music", FALLBACK_PAUSE_MUSIC),
+        ("breathe", FALLBACK_BREATHE),
+        ("movie", FALLBACK_MOVIES),
+        ("book", FALLBACK_BOOKS),
+    )
+}
+PREPARED_FALLBACK_UI_TEXTS = {key: prepare_ui_text(text) for key, text in FALLBACK_UI_TEXTS.items()}
+
 
 class ContentManager:
     """
@@ -410,10 +451,15 @@ class ContentManager:
     _instance: Optional["ContentManager"] = None
 
     def __init__(self):
-        self._cache: dict[str, list[str]] = {}
+        self._cache: dict[str, list[tuple[str, ...]]] = {}
         self._ui_cache: dict[str, str] = {}
         self._lock = asyncio.Lock()
         self._loaded = False
+        self._failed_at: float | None = None  # Время последней неудачной загрузки
+        self._version = 0                     # content_version загруженного кэша
+        self._version_changed = asyncio.Event()
+        self._watch_task: asyncio.Task | None = None
+        self._listen_conn = None
 
     @classmethod
     def get_instance(cls) -> "ContentManager":
@@ -427,22 +473,32 @@ class ContentManager:
         Атомарная перезагрузка кэша из SQLite.
         Вызывается при старте и после /sync.
 
+        Если БД недоступна или перегружена, кэш не трогаем: остаются
+        ранее загруженные данные (или fallback), повторная попытка —
+        не раньше чем через RELOAD_RETRY_INTERVAL секунд.
+
         Args:
             force: Принудительная перезагрузка даже если кэш загружен
         """
         # Быстрая проверка без lock — если уже загружено, не блокируем
         if self._loaded and not force:
             return
+        if not force and self._recently_failed():
+            return
 
         async with self._lock:
             # Двойная проверка после получения lock (double-checked locking)
             if self._loaded and not force:
                 return
-            new_cache: dict[str, list[str]] = {}
+            new_cache: dict[str, list[tuple[str, ...]]] = {}
             new_ui_cache: dict[str, str] = {}
 
             try:
                 async with get_session() as session:
+                    # Версию читаем до контента: синхронизация во время
+                    # загрузки оставит версию старой, и кэш перечитается ещё раз
+                    version = await get_content_version(session)
+
                     # Загружаем контент
                     result = await session.execute(
                         select(ContentCache).where(ContentCache.is_active == True)
@@ -452,14 +508,18 @@ class ContentManager:
                     for entry in entries:
                         if entry.content_type not in new_cache:
                             new_cache[entry.content_type] = []
-                        new_cache[entry.content_type].append(entry.content)
+                        new_cache[entry.content_type].append(prepare_content(entry.content))
 
                     # Загружаем UI тексты
                     ui_result = await session.execute(select(UITextCache))
                     ui_entries = ui_result.scalars().all()
 
                     for entry in ui_entries:
-                        new_ui_cache[entry.key] = entry.text
+                        try:
+                            new_ui_cache[entry.key] = prepare_ui_text(entry.text)
+                        except ValueError as e:
+                            # Битый текст не отдаём — будет fallback
+                            logger.warning(f"UI text {entry.key} skipped: {e}")
 
                 logger.info(
                     f"Content cache loaded: {sum(len(v) for v in new_cache.values())} items, "
@@ -467,11 +527,75 @@ class ContentManager:
                 )
 
             except Exception as e:
-                logger.warning(f"Failed to load cache from DB: {e}, using fallback")
+                # Не затираем рабочий кэш пустым — отдаём то, что уже в памяти
+                self._failed_at = time.monotonic()
+                if self._loaded:
+                    logger.warning(f"Failed to reload cache from DB: {e}, keeping in-memory cache")
+                else:
+                    logger.warning(f"Failed to load cache from DB: {e}, using fallback")
+                return
 
-            self._cache = new_cache
-            self._ui_cache = new_ui_cache
+            # Подмена одним присваиванием: читатели видят либо старый, либо новый кэш
+            self._cache, self._ui_cache = new_cache, new_ui_cache
+            self._version = version
             self._loaded = True
+            self._failed_at = None
+
+    def _recently_failed(self) -> bool:
+        """Была ли неудачная загрузка меньше RELOAD_RETRY_INTERVAL секунд назад."""
+        if self._failed_at is None:
+            return False
+        return time.monotonic() - self._failed_at < RELOAD_RETRY_INTERVAL
+
+    # ===== ИНВАЛИДАЦИЯ МЕЖДУ РЕПЛИКАМИ =====
+
+    async def start_watching(self) -> None:
+        """Перечитывать кэш, когда контент синхронизировала другая реплика."""
+        try:
+            self._listen_conn = await listen_content_version(self._version_changed.set)
+        except Exception as e:
+            logger.warning(f"LISTEN unavailable, polling content version: {e}")
+        interval = CONTENT_VERSION_POLL_INTERVAL
+        if self._listen_conn is not None:
+            interval = CONTENT_VERSION_LISTEN_POLL_INTERVAL
+        self._watch_task = asyncio.create_task(self._watch(interval), name="content_version_watch")
+
+    async def stop_watching(self) -> None:
+        """Остановить слежение за версией."""
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+        if self._listen_conn is not None:
+            await unlisten_content_version(self._listen_conn)
+            self._listen_conn = None
+
+    async def _watch(self, interval: float) -> None:
+        # Фоновая задача: под нагрузкой ждём БД, а не получаем DatabaseBusyError
+        with background_db():
+            while True:
+                try:
+                    await asyncio.wait_for(self._version_changed.wait(), interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._version_changed.clear()
+                try:
+                    await self.check_version()
+                except Exception as e:
+                    logger.warning(f"Content version check failed: {e}")
+
+    async def check_version(self) -> bool:
+        """Перечитать кэш, если версия в БД новее загруженной."""
+        async with get_session() as session:
+            version = await get_content_version(session)
+        if version == self._version:
+            return False
+        logger.info(f"Content version {self._version} -> {version}, reloading cache")
+        await self.reload(force=True)
+        return True
 
     def validate_ui_keys(self) -> list[str]:
         """
@@ -488,14 +612,14 @@ class ContentManager:
 
     # ===== КОНТЕНТ =====
 
-    async def get_random_pause(self) -> str:
+    async def get_random_pause(self) -> tuple[str, ...]:
         """Кнопка 'Пауза', /pause, pause_now — стихи + музыка."""
         content, _ = await self.get_random_pause_excluding(None)
         return content
 
     async def get_random_pause_excluding(
         self, exclude_type: str | None
-    ) -> tuple[str, str]:
+    ) -> tuple[tuple[str, ...], str]:
         """
         Кнопка 'Пауза' с циклическим чередованием типа контента.
         Цикл: pause_long → pause_music → pause_long → ...
@@ -504,7 +628,7 @@ class ContentManager:
             exclude_type: Предыдущий тип контента
 
         Returns:
-            (контент, тип_контента)
+            (части контента, тип_контента)
         """
         logger.info(f"get_random_pause_excluding(exclude_type={exclude_type}) called")
         await self.reload()
@@ -513,7 +637,7 @@ class ContentManager:
         type_cycle = ["pause_long", "pause_music"]
 
         # Собираем контент по типам
-        content_by_type: dict[str, list[str]] = {}
+        content_by_type: dict[str, list[tuple[str, ...]]] = {}
         for ctype in type_cycle:
             items = self._cache.get(ctype, [])
             if items:
@@ -522,10 +646,7 @@ class ContentManager:
         # Fallback если кэш пуст
         if not content_by_type:
             logger.info("Using fallback for pause")
-            content_by_type = {
-                "pause_long": FALLBACK_PAUSE_POEMS,
-                "pause_music": FALLBACK_PAUSE_MUSIC,
-            }
+            content_by_type = {ctype: PREPARED_FALLBACK[ctype] for ctype in type_cycle}
 
         # Определяем доступные типы (которые есть в кэше)
         available_types = [t for t in type_cycle if t in content_by_type]
@@ -541,17 +662,17 @@ class ContentManager:
 
         result = random.choice(content_by_type[selected_type])
 
-        logger.info(f"get_random_pause_excluding returning type={selected_type}: {result[:50]}...")
+        logger.info(f"get_random_pause_excluding returning type={selected_type}: {result[0][:50]}...")
         return result, selected_type
 
-    async def get_random_long_pause(self) -> str:
+    async def get_random_long_pause(self) -> tuple[str, ...]:
         """Кнопка 'Длинная пауза' — медитация + фильмы + книги."""
         content, _ = await self.get_random_long_pause_excluding(None)
         return content
 
     async def get_random_long_pause_excluding(
         self, exclude_type: str | None
-    ) -> tuple[str, str]:
+    ) -> tuple[tuple[str, ...], str]:
         """
         Кнопка 'Длинная пауза' с циклическим чередованием типа контента.
         Цикл: breathe → movie → book → breathe → ...
@@ -560,7 +681,7 @@ class ContentManager:
             exclude_type: Предыдущий тип контента
 
         Returns:
-            (контент, тип_контента)
+            (части контента, тип_контента)
         """
         logger.info(f"get_random_long_pause_excluding(exclude_type={exclude_type}) called")
         await self.reload()
@@ -569,7 +690,7 @@ class ContentManager:
         type_cycle = ["breathe", "movie", "book"]
 
         # Собираем контент по типам
-        content_by_type: dict[str, list[str]] = {}
+        content_by_type: dict[str, list[tuple[str, ...]]] = {}
         for ctype in type_cycle:
             items = self._cache.get(ctype, [])
             if items:
@@ -578,11 +699,7 @@ class ContentManager:
         # Fallback если кэш пуст
         if not content_by_type:
             logger.info("Using fallback for long_pause")
-            content_by_type = {
-                "breathe": FALLBACK_BREATHE,
-                "movie": FALLBACK_MOVIES,
-                "book": FALLBACK_BOOKS,
-            }
+            content_by_type = {ctype: PREPARED_FALLBACK[ctype] for ctype in type_cycle}
 
         # Определяем доступные типы (которые есть в кэше)
         available_types = [t for t in type_cycle if t in content_by_type]
@@ -598,27 +715,27 @@ class ContentManager:
 
         result = random.choice(content_by_type[selected_type])
 
-        logger.info(f"get_random_long_pause_excluding returning type={selected_type}: {result[:50]}...")
+        logger.info(f"get_random_long_pause_excluding returning type={selected_type}: {result[0][:50]}...")
         return result, selected_type
 
-    async def get_random_reminder(self) -> str:
+    async def get_random_reminder(self) -> tuple[str, ...]:
         """Напоминания — только короткие фразы."""
-        return await self._get_random_content("pause_phrases", FALLBACK_PAUSE_PHRASES)
+        return await self._get_random_content("pause_phrases")
 
-    async def get_random_breathe(self) -> str:
+    async def get_random_breathe(self) -> tuple[str, ...]:
         """Случайная медитация (для /breathe)."""
-        return await self._get_random_content("breathe", FALLBACK_BREATHE)
+        return await self._get_random_content("breathe")
 
-    async def get_random_movie(self) -> str:
+    async def get_random_movie(self) -> tuple[str, ...]:
         """Случайный фильм (для /movie)."""
-        return await self._get_random_content("movie", FALLBACK_MOVIES)
+        return await self._get_random_content("movie")
 
-    async def get_random_book(self) -> str:
+    async def get_random_book(self) -> tuple[str, ...]:
         """Случайная книга (для /book)."""
-        return await self._get_random_content("book", FALLBACK_BOOKS)
+        return await self._get_random_content("book")
 
-    async def _get_random_content(self, content_type: str, fallback: list[str]) -> str:
-        """Получить случайный контент с fallback."""
+    async def _get_random_content(self, content_type: str) -> tuple[str, ...]:
+        """Получить случайный контент (части сообщения) с fallback."""
         await self.reload()
 
         # Читаем без lock — dict read-safe, cache уже загружен
@@ -626,7 +743,7 @@ class ContentManager:
 
         if not items:
             logger.debug(f"No cached content for {content_type}, using fallback")
-            items = fallback
+            items = PREPARED_FALLBACK[content_type]
 
         return random.choice(items)
 
@@ -640,7 +757,7 @@ class ContentManager:
         Args:
             key: Ключ текста (например ONBOARDING_WELCOME)
             fallback: Fallback значение если ключ не найден
-            **kwargs: Параметры для форматирования
+            **kwargs: Параметры для форматирования (экранируются для HTML)
 
         Returns:
             Отформатированный текст
@@ -652,15 +769,15 @@ class ContentManager:
 
         if text is None:
             # Пробуем fallback из словаря
-            text = FALLBACK_UI_TEXTS.get(key)
+            text = PREPARED_FALLBACK_UI_TEXTS.get(key)
             if text is None:
                 logger.warning(f"UI text not found: {key}")
                 text = fallback or f"[{key}]"
 
         if kwargs:
             try:
-                text = text.format(**kwargs)
-            except KeyError as e:
+                text = text.format(**{k: html.escape(str(v), quote=False) for k, v in kwargs.items()})
+            except (KeyError, IndexError) as e:
                 logger.error(f"Missing placeholder in {key}: {e}")
 
         return text
@@ -0,0 +1,90 @@
+"""
+Подготовка контента к отправке.
+
+Бот шлёт сообщения с parse_mode=HTML, а контент из Notion и fallback —
+обычный текст: «<» или «&» в стихотворении ломают отправку. Поэтому текст
+экранируется и режется на сообщения один раз — при синхронизации
+(проверка) и при загрузке кэша ContentManager (готовые части). При
+отправке строки уже не обрабатываются.
+"""
+import html
+import string
+
+from aiogram import Bot
+
+# ===== ЛИМИТЫ TELEGRAM =====
+# Лимит считается в UTF-16 единицах после разбора HTML; мы меряем
+# экранированный текст — с запасом на сущности вроде &amp;
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Разрез по абзацу/строке/пробелу ищем не левее половины лимита
+SPLIT_SEPARATORS = ("\n\n", "\n", " ")
+
+_formatter = string.Formatter()
+
+
+def message_length(text: str) -> int:
+    """Длина сообщения так, как её считает Telegram (UTF-16 единицы)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _cut_position(text: str, limit: int) -> int:
+    """Индекс, до которого text[:i] влезает в limit и не рвёт абзац/HTML-сущность."""
+    cut = min(len(text), limit)
+    while message_length(text[:cut]) > limit:
+        cut -= 1
+
+    for separator in SPLIT_SEPARATORS:
+        pos = text.rfind(separator, 0, cut)
+        if pos > cut // 2:
+            return pos
+
+    # Режем по символу, но не внутри &amp; / &lt;
+    amp = text.rfind("&", 0, cut)
+    if amp != -1 and text.find(";", amp, cut) == -1:
+        cut = amp
+    return cut
+
+
+def prepare_content(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> tuple[str, ...]:
+    """
+    Экранировать текст для HTML и разбить на сообщения не длиннее limit.
+
+    Returns:
+        Части в порядке отправки (обычно одна)
+    """
+    rest = html.escape(text.strip(), quote=False)
+    parts = []
+    while message_length(rest) > limit:
+        cut = _cut_position(rest, limit)
+        parts.append(rest[:cut].rstrip())
+        rest = rest[cut:].lstrip("\n ")
+    parts.append(rest)
+    return tuple(parts)
+
+
+def prepare_ui_text(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> str:
+    """
+    Экранировать UI текст для HTML, сохранив {placeholders}.
+
+    UI текст уходит одним сообщением (обычно с клавиатурой), поэтому
+    не режется: слишком длинный или с битым шаблоном отклоняется.
+
+    Raises:
+        ValueError: шаблон не разбирается str.format или текст длиннее limit
+    """
+    escaped = html.escape(text, quote=False)
+    try:
+        list(_formatter.parse(escaped))
+    except ValueError as e:
+        raise ValueError(f"bad placeholder: {e}") from e
+    if message_length(escaped) > limit:
+        raise ValueError(f"longer than {limit} characters")
+    return escaped
+
+
+async def send_parts(bot: Bot, chat_id: int, parts: tuple[str, ...], **kwargs) -> None:
+    """Отправить части подряд; kwargs (reply_markup и т.п.) — только последней."""
+    for part in parts[:-1]:
+        await bot.send_message(chat_id, part)
+    await bot.send_message(chat_id, parts[-1], **kwargs)
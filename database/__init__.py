@@ -1,4 +1,12 @@
-from database.connection import init_db, get_session, close_db
+from database.connection import (
+    init_db,
+    get_session,
+    close_db,
+    get_pool_stats,
+    get_admission_stats,
+    background_db,
+    DatabaseBusyError,
+)
 from database.models import (
     Base,
     User,
@@ -10,12 +18,89 @@ from database.models import (
     ReminderTime,
     ContentCache,
     UITextCache,
+    ContentVersion,
+    ContentCacheShadow,
+    UITextCacheShadow,
+    NotionSyncState,
+    OrderCounter,
+    SchemaVersion,
+    ArchivedOrder,
+    ArchivedBoxOrder,
+    BroadcastStatus,
+    BroadcastJob,
+    BroadcastRecipient,
+)
+from database.retention import (
+    expire_pending_box_orders,
+    archive_cancelled_orders,
+)
+from database.instrumentation import (
+    handler_context,
+    get_query_stats,
+    reset_query_stats,
+    query_budget,
+)
+from database.snapshot import (
+    init_read_db,
+    close_read_db,
+    get_read_session,
+    refresh_snapshot,
+    snapshot_enabled,
+    snapshot_taken_at,
+    get_snapshot_stats,
+)
+from database.search import (
+    search_orders,
+    search_terms,
+    SearchUnavailableError,
+    SEARCH_MIN_TERM_LENGTH,
+)
+from database.content_version import (
+    CONTENT_VERSION_CHANNEL,
+    get_content_version,
+    bump_content_version,
+    listen_content_version,
+    unlisten_content_version,
+)
+from database.counters import (
+    COUNTER_USER,
+    COUNTER_ORDER,
+    COUNTER_BOX,
+    record_transition,
+    record_user_created,
+    load_counters,
+    counters_empty,
+    rebuild_counters,
+    ensure_counters,
+)
+from database.locks import (
+    try_lock,
+    NOTION_SYNC_LOCK_KEY,
 )
 
 __all__ = [
     "init_db",
     "get_session",
     "close_db",
+    "get_pool_stats",
+    "background_db",
+    "get_admission_stats",
+    "DatabaseBusyError",
+    "init_read_db",
+    "close_read_db",
+    "get_read_session",
+    "refresh_snapshot",
+    "snapshot_enabled",
+    "snapshot_taken_at",
+    "get_snapshot_stats",
+    "search_orders",
+    "search_terms",
+    "SearchUnavailableError",
+    "SEARCH_MIN_TERM_LENGTH",
+    "handler_context",
+    "get_query_stats",
+    "reset_query_stats",
+    "query_budget",
     "Base",
     "User",
     "Order",
@@ -26,4 +111,33 @@ __all__ = [
     "ReminderTime",
     "ContentCache",
     "UITextCache",
+    "ContentVersion",
+    "ContentCacheShadow",
+    "UITextCacheShadow",
+    "NotionSyncState",
+    "OrderCounter",
+    "SchemaVersion",
+    "ArchivedOrder",
+    "ArchivedBoxOrder",
+    "BroadcastStatus",
+    "BroadcastJob",
+    "BroadcastRecipient",
+    "expire_pending_box_orders",
+    "archive_cancelled_orders",
+    "CONTENT_VERSION_CHANNEL",
+    "get_content_version",
+    "bump_content_version",
+    "listen_content_version",
+    "unlisten_content_version",
+    "COUNTER_USER",
+    "COUNTER_ORDER",
+    "COUNTER_BOX",
+    "record_transition",
+    "record_user_created",
+    "load_counters",
+    "counters_empty",
+    "rebuild_counters",
+    "ensure_counters",
+    "try_lock",
+    "NOTION_SYNC_LOCK_KEY",
 ]
@@ -0,0 +1,95 @@
+"""
+Контроль допуска к БД (admission control).
+
+Ограничивает число одновременных get_session() семафором и не даёт
+очереди расти бесконечно: если слот не освободился за queue_timeout,
+запрос отбрасывается с DatabaseBusyError, а хэндлер деградирует
+или просит пользователя повторить позже.
+
+Отбрасываются только интерактивные запросы: фоновые задачи
+(shed=False) ждут слот сколько нужно — их некому попросить повторить.
+"""
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """Ограниченный семафор с бюджетом ожидания и счётчиками."""
+
+    def __init__(self, limit: int, queue_timeout: float):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self._in_use = 0
+        self._waiting = 0
+        self._stats = {
+            "admitted": 0,
+            "queued": 0,
+            "shed": 0,
+            "queue_max_ms": 0.0,
+        }
+
+    async def acquire(self, shed: bool = True) -> bool:
+        """
+        Занять слот.
+
+        Args:
+            shed: Отбросить запрос, если слот не освободился за queue_timeout
+
+        Returns:
+            True если слот получен, False если истёк бюджет ожидания (запрос отброшен)
+        """
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            self._admit()
+            return True
+
+        self._stats["queued"] += 1
+        self._waiting += 1
+        started = time.perf_counter()
+        acquired = False
+        try:
+            # asyncio.timeout, а не wait_for: wait_for на 3.11 может получить слот
+            # в момент срабатывания таймаута и потерять его. Здесь отмена приходит
+            # внутрь Semaphore.acquire, и тот сам возвращает слот
+            async with asyncio.timeout(self.queue_timeout if shed else None):
+                await self._semaphore.acquire()
+                acquired = True
+        except TimeoutError:
+            if acquired:
+                # Слот успели получить — запрос всё равно отброшен, слот возвращаем
+                self._semaphore.release()
+            self._stats["shed"] += 1
+            logger.warning(
+                f"DB admission: request shed after {self.queue_timeout}s "
+                f"(in use {self._in_use}/{self.limit}, waiting {self._waiting - 1})"
+            )
+            return False
+        finally:
+            self._waiting -= 1
+            wait_ms = (time.perf_counter() - started) * 1000
+            self._stats["queue_max_ms"] = max(self._stats["queue_max_ms"], wait_ms)
+
+        self._admit()
+        return True
+
+    def _admit(self) -> None:
+        self._in_use += 1
+        self._stats["admitted"] += 1
+
+    def release(self) -> None:
+        """Освободить слот."""
+        self._in_use -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict[str, float]:
+        """Счётчики допуска: limit, in_use, waiting, admitted, queued, shed, queue_max_ms."""
+        return {
+            "limit": self.limit,
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            **self._stats,
+        }
@@ -1,12 +1,24 @@
+import asyncio
 import logging
-from contextlib import asynccontextmanager
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Iterator
 from urllib.parse import urlparse
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from database.models import Base
+from database.migrations import run_migrations
+from database.instrumentation import install_query_instrumentation
+from database.admission import AdmissionController
 
 logger = logging.getLogger(__name__)
 
 
+class DatabaseBusyError(RuntimeError):
+    """БД перегружена: нет слота допуска или соединения за отведённое время."""
+
+
 def _sanitize_db_url_for_log(url: str) -> str:
     """Безопасно извлечь хост из URL для логирования (без credentials)."""
     try:
@@ -17,14 +29,9 @@ def _sanitize_db_url_for_log(url: str) -> str:
     except Exception:
         return "***"
 
-engine = None
-async_session = None
-
-
-async def init_db(database_url: str | None = None):
-    """Инициализация базы данных."""
-    global engine, async_session
 
+def normalize_database_url(database_url: str | None) -> str:
+    """Привести URL к async-драйверу (aiosqlite / asyncpg)."""
     # Если URL не передан, используем SQLite
     if not database_url:
         database_url = "sqlite+aiosqlite:///bot.db"
@@ -36,38 +43,136 @@ async def init_db(database_url: str | None = None):
         database_url = database_url.replace("postgres://", "postgresql+asyncpg://")
     elif database_url.startswith("postgresql://") and "+asyncpg" not in database_url:
         database_url = database_url.replace("postgresql://", "postgresql+asyncpg://")
+    return database_url
+
+
+engine = None
+async_session = None
+admission: AdmissionController | None = None
+
+# Бюджет ожидания соединения в get_session (секунды)
+_checkout_budget: float = 5.0
+
+# Сессии фоновых задач (планировщик, рассылки): ждут без DatabaseBusyError
+_background: ContextVar[bool] = ContextVar("db_background", default=False)
+
+# Метрики ожидания соединения из пула
+_pool_wait = {"checkouts": 0, "total_ms": 0.0, "max_ms": 0.0, "timeouts": 0}
+
+
+def _is_memory_sqlite(database_url: str) -> bool:
+    """SQLite в памяти (sqlite+aiosqlite://, :memory:, ?mode=memory)."""
+    url = make_url(database_url)
+    return (
+        not url.database
+        or url.database == ":memory:"
+        or url.query.get("mode") == "memory"
+    )
+
+
+def _enable_sqlite_wal(dbapi_connection, connection_record) -> None:
+    """
+    WAL для файловой SQLite: читатели (снапшот VACUUM INTO, отчёты) не
+    блокируют писателей и наоборот. Режим хранится в файле базы, но
+    PRAGMA повторяем на каждом соединении — это дёшево.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    finally:
+        cursor.close()
+
+
+async def _warm_up_pool(min_idle: int) -> None:
+    """Открыть min_idle соединений заранее, чтобы первые запросы не ждали connect."""
+    if min_idle <= 0:
+        return
+
+    connections = []
+    try:
+        for _ in range(min_idle):
+            connections.append(await engine.connect())
+    finally:
+        # Возвращаем соединения в пул — они остаются открытыми и простаивают
+        for conn in connections:
+            await conn.close()
+
+    logger.info(f"Connection pool warmed up: {len(connections)} idle connections")
+
+
+async def init_db(
+    database_url: str | None = None,
+    slow_query_ms: float = 200,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_recycle: int = 1800,
+    pool_timeout: float = 30,
+    pool_min_idle: int = 0,
+    checkout_budget: float = 5.0,
+    admission_limit: int = 0,
+    admission_queue_timeout: float = 2.0,
+):
+    """Инициализация базы данных.
+
+    Args:
+        database_url: URL базы (по умолчанию SQLite bot.db)
+        slow_query_ms: Порог логирования медленных запросов
+        pool_size: Базовый размер пула
+        max_overflow: Дополнительные соединения при пике
+        pool_recycle: Переподключение через N секунд (PostgreSQL)
+        pool_timeout: Жёсткий таймаут ожидания соединения в самом пуле
+        pool_min_idle: Сколько соединений открыть при старте
+        checkout_budget: Сколько get_session ждёт соединение до DatabaseBusyError
+        admission_limit: Одновременных сессий (0 — pool_size + max_overflow)
+        admission_queue_timeout: Сколько запрос ждёт в очереди допуска
+    """
+    global engine, async_session, admission, _checkout_budget
+
+    database_url = normalize_database_url(database_url)
 
     # Настройки пула зависят от типа БД
     is_sqlite = "sqlite" in database_url
-    engine_kwargs = {
-        "echo": False,
-    }
+    in_memory = is_sqlite and _is_memory_sqlite(database_url)
+    engine_kwargs = {"echo": False}
+    # aiosqlite для файловой базы тоже использует очередь соединений;
+    # in-memory база живёт в одном соединении (StaticPool) — без настроек очереди
+    if not in_memory:
+        engine_kwargs.update({
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": pool_timeout,
+        })
 
     if is_sqlite:
-        # SQLite использует NullPool, настраиваем только connect_args
         engine_kwargs["connect_args"] = {"check_same_thread": False}
     else:
-        # PostgreSQL: полная конфигурация пула соединений
+        # PostgreSQL: проверка и переподключение соединений
         engine_kwargs.update({
-            "pool_pre_ping": True,      # Проверка соединения перед использованием
-            "pool_size": 5,             # Базовый размер пула
-            "max_overflow": 10,         # Дополнительные соединения при пике
-            "pool_recycle": 1800,       # Переподключение каждые 30 минут
-            "pool_timeout": 30,         # Таймаут ожидания соединения из пула
+            "pool_pre_ping": True,          # Проверка соединения перед использованием
+            "pool_recycle": pool_recycle,   # Переподключение каждые N секунд
         })
 
     engine = create_async_engine(database_url, **engine_kwargs)
+    if is_sqlite and not in_memory:
+        event.listen(engine.sync_engine, "connect", _enable_sqlite_wal)
     async_session = async_sessionmaker(engine, expire_on_commit=False)
+    _checkout_budget = checkout_budget
+    admission = AdmissionController(
+        admission_limit or (pool_size + max_overflow), admission_queue_timeout
+    )
+    install_query_instrumentation(engine, slow_query_ms)
+
+    # Схема: одна строка schema_version, миграции — только если версия отстала
+    await run_migrations(engine)
 
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await _warm_up_pool(min(pool_min_idle, pool_size))
 
     logger.info(f"Database initialized: {_sanitize_db_url_for_log(database_url)}")
 
 
 async def close_db():
     """Закрытие соединений с базой данных."""
-    global engine, async_session
+    global engine, async_session, admission
 
     if engine:
         await engine.dispose()
@@ -75,19 +180,105 @@ async def close_db():
 
     engine = None
     async_session = None
+    admission = None
+
+
+def get_admission_stats() -> dict[str, float]:
+    """Счётчики допуска к БД (очередь и отброшенные запросы)."""
+    if admission is None:
+        return {}
+    return admission.stats()
+
+
+def get_pool_stats() -> dict[str, float]:
+    """
+    Метрики пула соединений.
+
+    Returns:
+        dict: size, checked_out, overflow, checkouts, wait_avg_ms, wait_max_ms, timeouts
+    """
+    stats: dict[str, float] = {
+        "checkouts": _pool_wait["checkouts"],
+        "wait_avg_ms": (
+            _pool_wait["total_ms"] / _pool_wait["checkouts"] if _pool_wait["checkouts"] else 0.0
+        ),
+        "wait_max_ms": _pool_wait["max_ms"],
+        "timeouts": _pool_wait["timeouts"],
+    }
+    pool = engine.pool if engine is not None else None
+    if pool is not None and hasattr(pool, "checkedout"):
+        stats["size"] = pool.size()
+        stats["checked_out"] = pool.checkedout()
+        # overflow() отрицателен, пока базовый размер не выбран целиком
+        stats["overflow"] = max(pool.overflow(), 0)
+    return stats
+
+
+@contextmanager
+def background_db() -> Iterator[None]:
+    """
+    Сессии внутри блока — фоновые: ждут слот допуска и соединение без
+    бюджета, а не падают с DatabaseBusyError. Отбрасывать под нагрузкой
+    стоит только интерактивные запросы — фоновую задачу (напоминания,
+    рассылку) никто не перезапустит.
+    """
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
+
+async def _checkout(session: AsyncSession, budget: float | None) -> None:
+    """Получить соединение для сессии с учётом бюджета ожидания (None — без бюджета)."""
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(session.connection(), timeout=budget)
+    except asyncio.TimeoutError:
+        _pool_wait["timeouts"] += 1
+        stats = get_pool_stats()
+        logger.warning(
+            f"DB checkout budget exceeded ({budget}s): "
+            f"checked_out={stats.get('checked_out')}, overflow={stats.get('overflow')}"
+        )
+        raise DatabaseBusyError(
+            f"No database connection available within {budget}s "
+            f"(checked out: {stats.get('checked_out')}, pool size: {stats.get('size')})"
+        ) from None
+    finally:
+        wait_ms = (time.perf_counter() - started) * 1000
+        _pool_wait["checkouts"] += 1
+        _pool_wait["total_ms"] += wait_ms
+        _pool_wait["max_ms"] = max(_pool_wait["max_ms"], wait_ms)
 
 
 @asynccontextmanager
 async def get_session() -> AsyncSession:
-    """Контекстный менеджер для получения сессии."""
+    """Контекстный менеджер для получения сессии.
+
+    Сначала запрос проходит контроль допуска (не больше admission_limit
+    сессий одновременно), затем соединение берётся из пула сразу.
+    Если очередь допуска или пул не успевают за отведённое время,
+    поднимается DatabaseBusyError (кроме фоновых задач — см. background_db).
+    Вложенные get_session() в одной задаче занимают два слота — не
+    открывайте сессию внутри сессии.
+    """
     if async_session is None:
         raise RuntimeError("Database not initialized. Call init_db() first.")
 
+    background = _background.get()
+    if not await admission.acquire(shed=not background):
+        raise DatabaseBusyError(
+            f"Database admission queue timeout ({admission.queue_timeout}s)"
+        )
+
     session = async_session()
     try:
+        await _checkout(session, None if background else _checkout_budget)
         yield session
     except Exception:
         await session.rollback()
         raise
     finally:
         await session.close()
+        admission.release()
@@ -0,0 +1,77 @@
+"""
+Версия контента для инвалидации кэша между репликами.
+
+ContentManager — свой у каждого процесса. Синхронизация, изменившая кэш,
+увеличивает content_version.version; процессы сравнивают её с версией,
+которую загрузили, и перечитывают кэш. На PostgreSQL вместе с увеличением
+уходит NOTIFY в канал CONTENT_VERSION_CHANNEL (доставляется при commit),
+на SQLite версию опрашивают.
+"""
+import logging
+from typing import Callable
+
+from sqlalchemy import select, update, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from database import connection
+from database.connection import get_session
+from database.models import ContentVersion, utc_now
+
+logger = logging.getLogger(__name__)
+
+CONTENT_VERSION_CHANNEL = "content_version"
+
+
+async def get_content_version(session: AsyncSession) -> int:
+    """Текущая версия контента."""
+    version = (await session.execute(
+        select(ContentVersion.version).where(ContentVersion.id == 1)
+    )).scalar_one_or_none()
+    return version or 0
+
+
+async def bump_content_version() -> int:
+    """Увеличить версию (и разослать NOTIFY на PostgreSQL). Возвращает новую версию."""
+    async with get_session() as session:
+        version = (await session.execute(
+            update(ContentVersion)
+            .where(ContentVersion.id == 1)
+            .values(version=ContentVersion.version + 1, updated_at=utc_now())
+            .returning(ContentVersion.version)
+        )).scalar_one()
+        if session.get_bind().dialect.name == "postgresql":
+            await session.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": CONTENT_VERSION_CHANNEL, "payload": str(version)},
+            )
+        await session.commit()
+
+    logger.info(f"Content version bumped to {version}")
+    return version
+
+
+async def listen_content_version(callback: Callable[[], None]) -> AsyncConnection | None:
+    """
+    PostgreSQL: вызывать callback на каждый NOTIFY об изменении версии.
+
+    Соединение подписки занимает слот пула до unlisten_content_version().
+
+    Returns:
+        Соединение подписки или None (SQLite — только опрос)
+    """
+    if connection.engine.dialect.name != "postgresql":
+        return None
+
+    conn = await connection.engine.connect()
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.add_listener(
+        CONTENT_VERSION_CHANNEL, lambda *args: callback()
+    )
+    logger.info(f"Listening for {CONTENT_VERSION_CHANNEL} notifications")
+    return conn
+
+
+async def unlisten_content_version(conn: AsyncConnection) -> None:
+    """Закрыть подписку: соединение с listener в пул не возвращаем."""
+    await conn.invalidate()
+    await conn.close()
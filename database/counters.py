@@ -0,0 +1,192 @@
+"""
+Материализованные счётчики заказов.
+
+Каждая смена статуса заказа переносит единицу (и сумму amount) из строки
+старого статуса в строку нового — в той же транзакции, что и сам заказ.
+/stats читает только таблицу order_counters, размер которой не зависит
+от истории заказов.
+"""
+import logging
+from enum import Enum
+
+from sqlalchemy import select, delete, func, Select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.connection import get_session
+from database.models import OrderCounter, User, Order, BoxOrder, ArchivedOrder, ArchivedBoxOrder
+
+logger = logging.getLogger(__name__)
+
+# Сущности счётчиков
+COUNTER_USER = "user"
+COUNTER_ORDER = "order"
+COUNTER_BOX = "box"
+
+# Статус-заглушка для счётчика пользователей
+USER_STATUS_ALL = "all"
+
+
+def _status_key(status: str | Enum | None) -> str | None:
+    """Привести статус к строке, которая хранится в order_counters."""
+    if status is None:
+        return None
+    if isinstance(status, Enum):
+        return status.value
+    return status
+
+
+def _insert_for(session: AsyncSession):
+    """insert() с поддержкой ON CONFLICT для текущего диалекта."""
+    if session.get_bind().dialect.name == "postgresql":
+        return pg_insert
+    return sqlite_insert
+
+
+async def apply_counter_delta(
+    session: AsyncSession,
+    entity: str,
+    status: str | Enum,
+    count: int = 1,
+    amount: int = 0,
+    box_month: str = "",
+) -> None:
+    """Атомарно изменить счётчик (UPSERT count = count + delta)."""
+    if count == 0 and amount == 0:
+        return
+
+    insert = _insert_for(session)
+    stmt = insert(OrderCounter).values(
+        entity=entity,
+        status=_status_key(status),
+        box_month=box_month,
+        count=count,
+        amount=amount,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[OrderCounter.entity, OrderCounter.status, OrderCounter.box_month],
+        set_={
+            "count": OrderCounter.count + stmt.excluded.count,
+            "amount": OrderCounter.amount + stmt.excluded.amount,
+        },
+    )
+    await session.execute(stmt)
+
+
+async def record_transition(
+    session: AsyncSession,
+    entity: str,
+    old_status: str | Enum | None,
+    new_status: str | Enum | None,
+    amount: int = 0,
+    box_month: str = "",
+    count: int = 1,
+) -> None:
+    """
+    Учесть смену статуса `count` заказов на общую сумму `amount`.
+
+    old_status=None — заказ создан, new_status=None — заказ удалён.
+    Вызывать до commit, в той же сессии, где меняется заказ.
+    """
+    old_key = _status_key(old_status)
+    new_key = _status_key(new_status)
+    if old_key == new_key:
+        return
+
+    if old_key is not None:
+        await apply_counter_delta(session, entity, old_key, -count, -amount, box_month)
+    if new_key is not None:
+        await apply_counter_delta(session, entity, new_key, count, amount, box_month)
+
+
+async def record_user_created(session: AsyncSession) -> None:
+    """Учесть нового пользователя."""
+    await apply_counter_delta(session, COUNTER_USER, USER_STATUS_ALL, 1)
+
+
+def counters_query() -> Select:
+    """Запрос всех счётчиков — таблица из десятков строк."""
+    return select(OrderCounter)
+
+
+async def load_counters(session: AsyncSession) -> list[OrderCounter]:
+    """Прочитать все счётчики (десятки строк)."""
+    result = await session.execute(counters_query())
+    return list(result.scalars().all())
+
+
+async def counters_empty(session: AsyncSession) -> bool:
+    """Проверить, заполнена ли таблица счётчиков."""
+    row = await session.execute(select(OrderCounter.entity).limit(1))
+    return row.first() is None
+
+
+async def rebuild_counters(session: AsyncSession) -> int:
+    """
+    Пересчитать счётчики по исходным таблицам (сверка).
+
+    Дорогая операция — полные агрегаты по users, orders и box_orders
+    (вместе с архивными таблицами: архивирование счётчики не меняет).
+    Выполняется одной транзакцией, вызывающий делает commit.
+
+    Returns:
+        Количество строк счётчиков после пересчёта
+    """
+    await session.execute(delete(OrderCounter))
+
+    rows: list[dict] = []
+
+    users_count = await session.scalar(select(func.count()).select_from(User)) or 0
+    rows.append({
+        "entity": COUNTER_USER, "status": USER_STATUS_ALL, "box_month": "",
+        "count": users_count, "amount": 0,
+    })
+
+    # (entity, status, box_month) -> [count, amount]
+    totals: dict[tuple[str, str, str], list[int]] = {}
+
+    for model in (Order, ArchivedOrder):
+        order_stats = await session.execute(
+            select(model.status, func.count(), func.coalesce(func.sum(model.amount), 0))
+            .group_by(model.status)
+        )
+        for status, count, amount in order_stats:
+            total = totals.setdefault((COUNTER_ORDER, _status_key(status), ""), [0, 0])
+            total[0] += count
+            total[1] += amount
+
+    for model in (BoxOrder, ArchivedBoxOrder):
+        box_stats = await session.execute(
+            select(
+                model.box_month,
+                model.status,
+                func.count(),
+                func.coalesce(func.sum(model.amount), 0),
+            ).group_by(model.box_month, model.status)
+        )
+        for box_month, status, count, amount in box_stats:
+            total = totals.setdefault((COUNTER_BOX, _status_key(status), box_month or ""), [0, 0])
+            total[0] += count
+            total[1] += amount
+
+    for (entity, status, box_month), (count, amount) in totals.items():
+        rows.append({
+            "entity": entity, "status": status, "box_month": box_month,
+            "count": count, "amount": amount,
+        })
+
+    session.add_all(OrderCounter(**row) for row in rows)
+    await session.flush()
+
+    logger.info(f"Order counters rebuilt: {len(rows)} rows")
+    return len(rows)
+
+
+async def ensure_counters() -> None:
+    """Заполнить счётчики при первом запуске на существующей базе."""
+    async with get_session() as session:
+        if not await counters_empty(session):
+            return
+        await rebuild_counters(session)
+        await session.commit()
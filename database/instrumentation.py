@@ -0,0 +1,153 @@
+"""
+Инструментирование SQL-запросов.
+
+Хуки before/after_cursor_execute на engine считают количество и время
+запросов и относят их к текущему хэндлеру (contextvar, который
+выставляет HandlerContextMiddleware или handler_context()).
+Медленные запросы логируются без параметров — в них персональные данные.
+"""
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина SQL в логе медленных запросов
+SLOW_QUERY_LOG_MAX_LENGTH = 300
+
+# Имя текущего хэндлера (или фоновой задачи), к которому относятся запросы
+current_handler: ContextVar[str] = ContextVar("db_current_handler", default="-")
+
+# Счётчик для query_budget() — задаётся только внутри блока проверки
+_budget_counter: ContextVar["QueryCounter | None"] = ContextVar("db_budget_counter", default=None)
+
+# handler -> {"queries": int, "total_ms": float, "max_ms": float, "slow": int}
+_stats: dict[str, dict[str, float]] = {}
+
+_slow_query_ms: float = 200.0
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class QueryCounter:
+    """Счётчик запросов внутри query_budget()."""
+
+    def __init__(self):
+        self.queries = 0
+        self.total_ms = 0.0
+        self.statements: list[str] = []
+
+
+def _shorten(statement: str) -> str:
+    """Сжать SQL до одной строки ограниченной длины."""
+    statement = _WHITESPACE_RE.sub(" ", statement).strip()
+    if len(statement) > SLOW_QUERY_LOG_MAX_LENGTH:
+        statement = statement[:SLOW_QUERY_LOG_MAX_LENGTH] + "..."
+    return statement
+
+
+def _params_summary(parameters, executemany: bool) -> str:
+    """Описание параметров без значений."""
+    if executemany:
+        return f"<{len(parameters)} rows redacted>"
+    if not parameters:
+        return "<none>"
+    return f"<{len(parameters)} redacted>"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start_time")
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+
+    handler = current_handler.get()
+    stats = _stats.get(handler)
+    if stats is None:
+        stats = _stats[handler] = {"queries": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0}
+    stats["queries"] += 1
+    stats["total_ms"] += elapsed_ms
+    stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    counter = _budget_counter.get()
+    if counter is not None:
+        counter.queries += 1
+        counter.total_ms += elapsed_ms
+        counter.statements.append(_shorten(statement))
+
+    if elapsed_ms >= _slow_query_ms:
+        stats["slow"] += 1
+        logger.warning(
+            f"Slow query {elapsed_ms:.0f} ms in {handler}: {_shorten(statement)} "
+            f"params={_params_summary(parameters, executemany)}"
+        )
+
+
+def install_query_instrumentation(engine: AsyncEngine, slow_query_ms: float) -> None:
+    """Подключить хуки к engine (вызывается из init_db)."""
+    global _slow_query_ms
+    _slow_query_ms = slow_query_ms
+
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def handler_context(name: str) -> Iterator[None]:
+    """Отнести запросы внутри блока к хэндлеру/задаче `name`."""
+    token = current_handler.set(name)
+    try:
+        yield
+    finally:
+        current_handler.reset(token)
+
+
+def get_query_stats() -> dict[str, dict[str, float]]:
+    """Накопленные счётчики по хэндлерам (копия)."""
+    return {handler: dict(stats) for handler, stats in _stats.items()}
+
+
+def reset_query_stats() -> None:
+    """Сбросить накопленные счётчики."""
+    _stats.clear()
+
+
+@contextmanager
+def query_budget(max_queries: int, max_total_ms: float | None = None) -> Iterator[QueryCounter]:
+    """
+    Проверить, что блок укладывается в бюджет запросов (для тестов и скриптов).
+
+        with query_budget(2):
+            await cmd_stats(message, config)
+
+    Raises:
+        AssertionError: если запросов больше max_queries или суммарное время
+            больше max_total_ms
+    """
+    counter = QueryCounter()
+    token = _budget_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _budget_counter.reset(token)
+
+    if counter.queries > max_queries:
+        statements = "\n".join(f"  {s}" for s in counter.statements)
+        raise AssertionError(
+            f"Query budget exceeded: {counter.queries} > {max_queries}\n{statements}"
+        )
+    if max_total_ms is not None and counter.total_ms > max_total_ms:
+        raise AssertionError(
+            f"Query time budget exceeded: {counter.total_ms:.1f} ms > {max_total_ms} ms"
+        )
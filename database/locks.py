@@ -0,0 +1,69 @@
+"""
+Межпроцессные блокировки фоновых задач.
+
+Несколько реплик бота работают с одной БД. Задачу, которую нельзя
+запускать параллельно (синхронизация Notion пишет в общие теневые
+таблицы), выполняет та реплика, что взяла блокировку; остальные запуск
+пропускают.
+
+PostgreSQL — pg_try_advisory_lock на отдельном соединении: при падении
+процесса блокировка снимается вместе с соединением. SQLite — flock на
+файле рядом с базой (реплики на SQLite живут на одной машине).
+"""
+import fcntl
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy import text
+
+from database import connection
+
+logger = logging.getLogger(__name__)
+
+# Ключи блокировок (pg_advisory_lock / имя lock-файла)
+NOTION_SYNC_LOCK_KEY = 7_061_757_366
+
+
+@asynccontextmanager
+async def try_lock(key: int) -> AsyncIterator[bool]:
+    """
+    Взять блокировку key без ожидания.
+
+    Yields:
+        True, если блокировка взята; False — её держит другой процесс
+        (или другая задача этого процесса)
+    """
+    engine = connection.engine
+    if engine.dialect.name == "postgresql":
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            acquired = (await conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": key}
+            )).scalar_one()
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    await conn.execute(
+                        text("SELECT pg_advisory_unlock(:key)"), {"key": key}
+                    )
+        return
+
+    database = engine.url.database
+    if not database or database == ":memory:":
+        # Память процесса — других процессов у этой базы нет
+        yield True
+        return
+
+    # flock привязан к открытому файлу: второй open() в том же процессе тоже не возьмёт
+    with open(f"{database}.{key}.lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
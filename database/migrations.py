@@ -0,0 +1,390 @@
+"""
+Версионированные миграции схемы.
+
+При старте читается одна строка schema_version. Если версия актуальна,
+больше ничего не делается — ни create_all, ни рефлексии метаданных.
+Иначе по порядку применяются недостающие миграции; после каждой версия
+сохраняется, так что прерванный запуск продолжится с места сбоя.
+
+Миграции обязаны быть идемпотентными: процесс может упасть между
+применением миграции и записью версии. Индексы на существующих таблицах
+строятся онлайн (PostgreSQL: CREATE INDEX CONCURRENTLY), данные
+заполняются батчами в отдельных транзакциях.
+
+Новая миграция добавляется в конец MIGRATIONS со следующим номером.
+"""
+import logging
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import inspect, insert, select, text, update, Index
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import CreateIndex
+
+from database.models import Base, SchemaVersion, ContentVersion, utc_now
+from database.search import sqlite_search_statements, pg_search_indexes
+
+logger = logging.getLogger(__name__)
+
+# Строк за одну транзакцию при заполнении данных
+BACKFILL_BATCH_SIZE = 5000
+
+# Ключ pg_advisory_lock: мигрирует один процесс, остальные ждут
+MIGRATION_LOCK_KEY = 7_061_757_365
+
+# Таблицы с внешним ключом user_id -> users.id
+USER_FK_TABLES = ("orders", "box_orders")
+
+# Индексы для горячих запросов, которых нет на базах, созданных раньше моделей
+HOT_QUERY_INDEXES = (
+    "ix_users_reminder_eligible",
+    "ix_orders_telegram_status_created",
+    "ix_box_orders_telegram_status_created",
+    "ix_orders_user_id",
+    "ix_box_orders_user_id",
+)
+
+# Индексы, которые заменены более широкими составными
+SUPERSEDED_INDEXES = ("ix_orders_telegram_status", "ix_box_orders_telegram_status")
+
+# Индексы keyset-пагинации /orders по (created_at, id) и индексы, которые они заменяют
+KEYSET_INDEXES = (
+    "ix_orders_created_id",
+    "ix_orders_status_created_id",
+    "ix_box_orders_created_id",
+    "ix_box_orders_status_created_id",
+    "ix_box_orders_month_created_id",
+)
+KEYSET_SUPERSEDED_INDEXES = (
+    "ix_orders_status",
+    "ix_orders_created_at",
+    "ix_box_orders_status",
+    "ix_box_orders_box_month",
+)
+
+
+class Migration:
+    """Шаг миграции: номер версии, описание и функция применения."""
+
+    def __init__(
+        self,
+        version: int,
+        description: str,
+        apply: Callable[[AsyncEngine], Awaitable[None]],
+    ):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+# ===== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ =====
+
+def _is_postgres(engine: AsyncEngine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+async def _execute_autocommit(engine: AsyncEngine, sql: str, **params) -> None:
+    """Выполнить DDL вне транзакции (нужно для CONCURRENTLY)."""
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(sql), params)
+
+
+async def _column_exists(engine: AsyncEngine, table: str, column: str) -> bool:
+    async with engine.connect() as conn:
+        columns = await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).get_columns(table)
+        )
+    return any(col["name"] == column for col in columns)
+
+
+async def _drop_invalid_index(engine: AsyncEngine, name: str) -> None:
+    """Удалить индекс, оставшийся невалидным после прерванного CONCURRENTLY."""
+    async with engine.connect() as conn:
+        invalid = (await conn.execute(
+            text(
+                "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ),
+            {"name": name},
+        )).scalar()
+    if invalid:
+        logger.warning(f"Dropping invalid index {name} left by an interrupted build")
+        await _execute_autocommit(engine, f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def model_index(name: str) -> Index:
+    """Индекс из метаданных моделей по имени."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(f"Index {name} is not defined in models")
+
+
+async def create_index_online(engine: AsyncEngine, index: Index) -> None:
+    """
+    Создать индекс, если его нет, не блокируя запись в таблицу.
+
+    PostgreSQL строит индекс с CONCURRENTLY. SQLite такого режима не имеет:
+    там индекс строится обычным CREATE INDEX (база однопроцессная и небольшая).
+    """
+    sql = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+    if _is_postgres(engine):
+        await _drop_invalid_index(engine, index.name)
+        sql = sql.replace(" INDEX ", " INDEX CONCURRENTLY ", 1)
+
+    started = time.perf_counter()
+    await _execute_autocommit(engine, sql)
+    logger.info(
+        f"Index {index.name} on {index.table.name} ensured "
+        f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+
+
+async def drop_index_online(engine: AsyncEngine, name: str) -> None:
+    """Удалить индекс, если он есть."""
+    concurrently = "CONCURRENTLY " if _is_postgres(engine) else ""
+    await _execute_autocommit(engine, f"DROP INDEX {concurrently}IF EXISTS {name}")
+
+
+# ===== МИГРАЦИИ =====
+
+async def _create_tables(engine: AsyncEngine) -> None:
+    """Таблицы, которых ещё нет (на новой базе — вся схема с индексами)."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def _backfill_user_id(engine: AsyncEngine, table: str) -> int:
+    """Заполнить user_id по telegram_id батчами по диапазонам id."""
+    async with engine.connect() as conn:
+        max_id = (await conn.execute(text(f"SELECT max(id) FROM {table}"))).scalar() or 0
+
+    filled = 0
+    for low in range(0, max_id, BACKFILL_BATCH_SIZE):
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                text(
+                    f"UPDATE {table} SET user_id = "
+                    f"(SELECT users.id FROM users WHERE users.telegram_id = {table}.telegram_id) "
+                    f"WHERE user_id IS NULL AND id > :low AND id <= :high "
+                    f"AND EXISTS (SELECT 1 FROM users WHERE users.telegram_id = {table}.telegram_id)"
+                ),
+                {"low": low, "high": low + BACKFILL_BATCH_SIZE},
+            )
+            filled += result.rowcount
+    return filled
+
+
+async def _add_user_foreign_keys(engine: AsyncEngine) -> None:
+    """Колонки user_id в заказах: добавить, где их нет, и заполнить."""
+    postgres = _is_postgres(engine)
+
+    for table in USER_FK_TABLES:
+        if not await _column_exists(engine, table, "user_id"):
+            async with engine.begin() as conn:
+                if postgres:
+                    # NOT VALID — ключ не проверяет всю таблицу под блокировкой
+                    await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN user_id INTEGER"))
+                    await conn.execute(text(
+                        f"ALTER TABLE {table} ADD CONSTRAINT {table}_user_id_fkey "
+                        f"FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE SET NULL NOT VALID"
+                    ))
+                else:
+                    await conn.execute(text(
+                        f"ALTER TABLE {table} ADD COLUMN user_id INTEGER "
+                        f"REFERENCES users (id) ON DELETE SET NULL"
+                    ))
+            logger.info(f"Added {table}.user_id")
+
+        filled = await _backfill_user_id(engine, table)
+        logger.info(f"Backfilled {table}.user_id: {filled} rows")
+
+        if postgres:
+            # Проверка ключа после заполнения — без эксклюзивной блокировки
+            async with engine.connect() as conn:
+                names = (await conn.execute(
+                    text(
+                        "SELECT conname FROM pg_constraint "
+                        "WHERE conrelid = CAST(:table AS regclass) AND contype = 'f' "
+                        "AND NOT convalidated"
+                    ),
+                    {"table": table},
+                )).scalars().all()
+            for name in names:
+                await _execute_autocommit(engine, f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+
+async def _create_hot_query_indexes(engine: AsyncEngine) -> None:
+    """Индексы горячих запросов на существующих таблицах (create_all их не добавляет)."""
+    for name in HOT_QUERY_INDEXES:
+        await create_index_online(engine, model_index(name))
+
+
+async def _drop_superseded_indexes(engine: AsyncEngine) -> None:
+    """Индексы (telegram_id, status) заменены на (telegram_id, status, created_at)."""
+    for name in SUPERSEDED_INDEXES:
+        await drop_index_online(engine, name)
+
+
+async def _create_keyset_indexes(engine: AsyncEngine) -> None:
+    """Составные индексы (..., created_at, id) для /orders; одиночные — удалить."""
+    for name in KEYSET_INDEXES:
+        await create_index_online(engine, model_index(name))
+    for name in KEYSET_SUPERSEDED_INDEXES:
+        await drop_index_online(engine, name)
+
+
+async def _create_order_search(engine: AsyncEngine) -> None:
+    """Индекс /find: FTS5 с триггерами (SQLite) или GIN pg_trgm (PostgreSQL)."""
+    try:
+        if _is_postgres(engine):
+            await _execute_autocommit(engine, "CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for name, sql in pg_search_indexes():
+                await _drop_invalid_index(engine, name)
+                await _execute_autocommit(engine, sql)
+        else:
+            async with engine.begin() as conn:
+                for statement in sqlite_search_statements():
+                    await conn.execute(text(statement))
+    except DBAPIError as e:
+        # SQLite без FTS5 или нет прав на CREATE EXTENSION: бот работает,
+        # /find сообщает, что поиск недоступен (PostgreSQL — ищет без индекса)
+        logger.error(f"Order search index not installed: {e}")
+
+
+async def _create_broadcasts(engine: AsyncEngine) -> None:
+    """Таблицы рассылок и users.blocked_at."""
+    await _create_tables(engine)
+    if not await _column_exists(engine, "users", "blocked_at"):
+        # Nullable-колонка без default — без перезаписи таблицы
+        column_type = "TIMESTAMP WITH TIME ZONE" if _is_postgres(engine) else "DATETIME"
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE users ADD COLUMN blocked_at {column_type}"))
+        logger.info("Added users.blocked_at")
+
+
+
+async def _create_content_version(engine: AsyncEngine) -> None:
+    """Таблица content_version и её единственная строка (bump — всегда UPDATE)."""
+    await _create_tables(engine)
+    async with engine.begin() as conn:
+        exists = (await conn.execute(
+            select(ContentVersion.id).where(ContentVersion.id == 1)
+        )).scalar_one_or_none()
+        if exists is None:
+            await conn.execute(insert(ContentVersion).values(id=1, version=0, updated_at=utc_now()))
+
+
+async def _dedupe_broadcast_recipients(engine: AsyncEngine) -> None:
+    """Уникальный (job_id, telegram_id) в снимке рассылки; дубли снимков — удалить."""
+    async with engine.begin() as conn:
+        result = await conn.execute(text(
+            "DELETE FROM broadcast_recipients WHERE id NOT IN ("
+            "SELECT MIN(id) FROM broadcast_recipients GROUP BY job_id, telegram_id)"
+        ))
+    if result.rowcount:
+        logger.warning(f"Removed {result.rowcount} duplicate broadcast recipients")
+    await create_index_online(engine, model_index("ux_broadcast_recipients_job_telegram"))
+
+
+MIGRATIONS = [
+    Migration(1, "create missing tables", _create_tables),
+    Migration(2, "user_id foreign keys on orders and box_orders", _add_user_foreign_keys),
+    Migration(3, "online build of hot query indexes", _create_hot_query_indexes),
+    Migration(4, "drop superseded (telegram_id, status) indexes", _drop_superseded_indexes),
+    Migration(5, "orders_archive and box_orders_archive tables", _create_tables),
+    Migration(6, "order search index for /find", _create_order_search),
+    Migration(7, "keyset pagination indexes for /orders", _create_keyset_indexes),
+    Migration(8, "broadcast jobs and users.blocked_at", _create_broadcasts),
+    Migration(9, "notion_sync_state watermarks", _create_tables),
+    Migration(10, "shadow tables for full Notion sync", _create_tables),
+    Migration(11, "content_version for cross-replica cache invalidation", _create_content_version),
+    Migration(12, "unique broadcast recipients per job", _dedupe_broadcast_recipients),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# ===== ЗАПУСК =====
+
+async def get_schema_version(engine: AsyncEngine) -> int:
+    """Текущая версия схемы (0 — новая база или база до версионирования)."""
+    try:
+        async with engine.connect() as conn:
+            version = (await conn.execute(
+                select(SchemaVersion.version).where(SchemaVersion.id == 1)
+            )).scalar()
+    except DBAPIError:
+        # Таблицы schema_version ещё нет
+        return 0
+    return version or 0
+
+
+async def _set_schema_version(engine: AsyncEngine, version: int) -> None:
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            update(SchemaVersion)
+            .where(SchemaVersion.id == 1)
+            .values(version=version, updated_at=utc_now())
+        )
+        if result.rowcount == 0:
+            await conn.execute(
+                insert(SchemaVersion).values(id=1, version=version, updated_at=utc_now())
+            )
+
+
+async def _apply_pending(engine: AsyncEngine) -> int:
+    # Перечитываем под блокировкой: другой процесс мог уже всё применить
+    current = await get_schema_version(engine)
+
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        logger.info(f"Applying migration {migration.version}: {migration.description}")
+        started = time.perf_counter()
+        await migration.apply(engine)
+        await _set_schema_version(engine, migration.version)
+        current = migration.version
+        logger.info(
+            f"Migration {migration.version} applied "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+
+    return current
+
+
+async def run_migrations(engine: AsyncEngine) -> int:
+    """
+    Привести схему к LATEST_VERSION.
+
+    Returns:
+        Версия схемы после запуска
+    """
+    current = await get_schema_version(engine)
+    if current > LATEST_VERSION:
+        logger.warning(
+            f"Database schema version {current} is newer than this code ({LATEST_VERSION})"
+        )
+        return current
+    if current == LATEST_VERSION:
+        logger.info(f"Database schema is current (version {current})")
+        return current
+
+    if not _is_postgres(engine):
+        return await _apply_pending(engine)
+
+    # Несколько реплик бота стартуют одновременно — мигрирует одна
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        await lock_conn.execute(
+            text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY}
+        )
+        try:
+            return await _apply_pending(engine)
+        finally:
+            await lock_conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY}
+            )
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 from enum import Enum
-from sqlalchemy import BigInteger, DateTime, String, Text, Boolean, Enum as SQLEnum, Index, ForeignKey
+from sqlalchemy import BigInteger, DateTime, String, Text, Boolean, Enum as SQLEnum, Index, ForeignKey, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -50,6 +50,17 @@ class ReminderTime(str, Enum):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Частичный индекс по аудитории напоминаний: планировщик каждый час
+        # ищет по (reminder_time, reminder_frequency) только среди тех, кому
+        # напоминания включены. telegram_id в конце — чтобы индекс был покрывающим.
+        Index(
+            "ix_users_reminder_eligible",
+            "reminder_time", "reminder_frequency", "id", "telegram_id",
+            sqlite_where=text("reminder_enabled = 1 AND onboarding_completed = 1"),
+            postgresql_where=text("reminder_enabled AND onboarding_completed"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True)
@@ -66,6 +77,8 @@ class User(Base):
     reminder_time: Mapped[ReminderTime | None] = mapped_column(
         SQLEnum(ReminderTime), nullable=True
     )
+    # Когда рассылка получила Forbidden (бот заблокирован); сбрасывается при /start
+    blocked_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
     # Relationships (для удобства ORM-запросов)
     orders: Mapped[list["Order"]] = relationship(back_populates="user", lazy="selectin")
@@ -75,9 +88,11 @@ class User(Base):
 class Order(Base):
     __tablename__ = "orders"
     __table_args__ = (
-        Index("ix_orders_status", "status"),
-        Index("ix_orders_created_at", "created_at"),
-        Index("ix_orders_telegram_status", "telegram_id", "status"),
+        # Keyset-пагинация /orders по (created_at, id): без фильтра и по статусу
+        Index("ix_orders_created_id", "created_at", "id"),
+        Index("ix_orders_status_created_id", "status", "created_at", "id"),
+        # "Последний PENDING заказ пользователя": поиск + сортировка по индексу
+        Index("ix_orders_telegram_status_created", "telegram_id", "status", "created_at"),
     )
 
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -105,9 +120,11 @@ class BoxOrder(Base):
     """Предзаказ физического набора."""
     __tablename__ = "box_orders"
     __table_args__ = (
-        Index("ix_box_orders_status", "status"),
-        Index("ix_box_orders_box_month", "box_month"),
-        Index("ix_box_orders_telegram_status", "telegram_id", "status"),
+        # Keyset-пагинация /orders по (created_at, id): без фильтра, по статусу, по месяцу
+        Index("ix_box_orders_created_id", "created_at", "id"),
+        Index("ix_box_orders_status_created_id", "status", "created_at", "id"),
+        Index("ix_box_orders_month_created_id", "box_month", "created_at", "id"),
+        Index("ix_box_orders_telegram_status_created", "telegram_id", "status", "created_at"),
     )
 
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -134,8 +151,141 @@ class BoxOrder(Base):
     user: Mapped["User | None"] = relationship(back_populates="box_orders")
 
 
+# ===== АРХИВ =====
+
+class ArchivedOrder(Base):
+    """Отменённый заказ старше срока хранения (перенесён из orders).
+
+    Колонки повторяют Order, id сохраняется. Внешних ключей нет:
+    архив не должен мешать удалению пользователей.
+    """
+    __tablename__ = "orders_archive"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    user_id: Mapped[int | None] = mapped_column(nullable=True)
+    name: Mapped[str] = mapped_column(String(255))
+    phone: Mapped[str] = mapped_column(String(50))
+    address: Mapped[str] = mapped_column(Text)
+    email: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    amount: Mapped[int] = mapped_column()
+    currency: Mapped[str] = mapped_column(String(3))
+    status: Mapped[OrderStatus] = mapped_column(SQLEnum(OrderStatus))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    paid_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    confirmed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now)
+
+
+class ArchivedBoxOrder(Base):
+    """Отменённый предзаказ набора старше срока хранения (перенесён из box_orders)."""
+    __tablename__ = "box_orders_archive"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    user_id: Mapped[int | None] = mapped_column(nullable=True)
+    name: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    phone: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    email: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    address: Mapped[str | None] = mapped_column(Text, nullable=True)
+    box_month: Mapped[str] = mapped_column(String(7))
+    amount: Mapped[int] = mapped_column()
+    currency: Mapped[str] = mapped_column(String(3))
+    status: Mapped[BoxOrderStatus] = mapped_column(SQLEnum(BoxOrderStatus))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    paid_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    shipped_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now)
+
+
+# ===== МАТЕРИАЛИЗОВАННЫЕ СЧЁТЧИКИ =====
+
+class OrderCounter(Base):
+    """Счётчики заказов по статусам (для /stats без агрегатов по всей истории).
+
+    Обновляются в той же транзакции, что и смена статуса заказа.
+    Для предзаказов набора ведутся отдельно по каждому box_month,
+    для обычных заказов и пользователей box_month = "".
+    """
+    __tablename__ = "order_counters"
+
+    entity: Mapped[str] = mapped_column(String(20), primary_key=True)  # user, order, box
+    status: Mapped[str] = mapped_column(String(20), primary_key=True)
+    box_month: Mapped[str] = mapped_column(String(7), primary_key=True, default="")
+    count: Mapped[int] = mapped_column(BigInteger, default=0)
+    amount: Mapped[int] = mapped_column(BigInteger, default=0)  # Сумма amount в этом статусе
+
+
+# ===== РАССЫЛКИ =====
+
+class BroadcastStatus(str, Enum):
+    DRAFT = "draft"              # Создана, ждёт подтверждения
+    RUNNING = "running"          # Идёт (продолжится после рестарта)
+    DONE = "done"                # Завершена
+    CANCELLED = "cancelled"      # Отменена админом
+
+
+class BroadcastJob(Base):
+    """Рассылка /broadcast: текст, сегмент и прогресс."""
+    __tablename__ = "broadcast_jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    text: Mapped[str] = mapped_column(Text)
+    segment: Mapped[str] = mapped_column(String(20))  # all, reminders, box:2026-03
+    status: Mapped[BroadcastStatus] = mapped_column(
+        SQLEnum(BroadcastStatus), default=BroadcastStatus.DRAFT
+    )
+    total: Mapped[int] = mapped_column(default=0)
+    sent: Mapped[int] = mapped_column(default=0)
+    failed: Mapped[int] = mapped_column(default=0)
+    blocked: Mapped[int] = mapped_column(default=0)
+    # Последний обработанный broadcast_recipients.id — с него продолжаем после рестарта
+    checkpoint: Mapped[int] = mapped_column(default=0)
+    # Сообщение админа, в котором обновляется прогресс
+    progress_chat_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    progress_message_id: Mapped[int | None] = mapped_column(nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class BroadcastRecipient(Base):
+    """Получатель рассылки: снимок telegram_id сегмента на момент запуска."""
+    __tablename__ = "broadcast_recipients"
+    __table_args__ = (
+        # Батчи по (job_id, id > checkpoint)
+        Index("ix_broadcast_recipients_job_id", "job_id", "id"),
+        # Получатель попадает в снимок рассылки один раз
+        Index("ux_broadcast_recipients_job_telegram", "job_id", "telegram_id", unique=True),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    job_id: Mapped[int] = mapped_column(ForeignKey("broadcast_jobs.id", ondelete="CASCADE"))
+    telegram_id: Mapped[int] = mapped_column(BigInteger)
+
+
+# ===== СЛУЖЕБНЫЕ ТАБЛИЦЫ =====
+
+class SchemaVersion(Base):
+    """Версия схемы БД (одна строка, id = 1). Ведёт database/migrations.py."""
+    __tablename__ = "schema_version"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now)
+
+
 # ===== КЭШИРОВАНИЕ КОНТЕНТА ИЗ NOTION =====
 
+class ContentVersion(Base):
+    """Версия кэша контента (одна строка, id = 1). Растёт с каждой синхронизацией с изменениями."""
+    __tablename__ = "content_version"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now)
+
+
 class ContentCache(Base):
     """Кэш контента из Notion (паузы, ссылки)."""
     __tablename__ = "content_cache"
@@ -148,6 +298,18 @@ class ContentCache(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now)
 
 
+class NotionSyncState(Base):
+    """Водяной знак инкрементальной синхронизации базы Notion."""
+    __tablename__ = "notion_sync_state"
+
+    database_id: Mapped[str] = mapped_column(String(50), primary_key=True)
+    # Самый поздний last_edited_time среди применённых страниц
+    last_edited_time: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Последняя сверка списка страниц (удалённые в Notion страницы)
+    reconciled_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now)
+
+
 class UITextCache(Base):
     """Кэш UI текстов из Notion."""
     __tablename__ = "ui_text_cache"
@@ -157,3 +319,30 @@ class UITextCache(Base):
     text: Mapped[str] = mapped_column(Text)
     notion_page_id: Mapped[str] = mapped_column(String(50))
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now)
+
+
+# ===== ТЕНЕВЫЕ ТАБЛИЦЫ ПОЛНОЙ СИНХРОНИЗАЦИИ =====
+# Полная синхронизация пишет сюда, а в живые таблицы переносит одной
+# короткой транзакцией (notion_sync.py). Без unique: дубли снимаются при переносе.
+
+class ContentCacheShadow(Base):
+    """Теневая копия content_cache."""
+    __tablename__ = "content_cache_shadow"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    content_type: Mapped[str] = mapped_column(String(50))
+    content: Mapped[str] = mapped_column(Text)
+    notion_page_id: Mapped[str] = mapped_column(String(50))
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now)
+
+
+class UITextCacheShadow(Base):
+    """Теневая копия ui_text_cache."""
+    __tablename__ = "ui_text_cache_shadow"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    key: Mapped[str] = mapped_column(String(100))
+    text: Mapped[str] = mapped_column(Text)
+    notion_page_id: Mapped[str] = mapped_column(String(50))
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now)
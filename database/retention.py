@@ -0,0 +1,158 @@
+"""
+Срок жизни заказов.
+
+- PENDING-предзаказы набора старше TTL отменяются: box_start создаёт заказ
+  сразу по нажатию «Откликается», и брошенные сценарии копятся бесконечно.
+- CANCELLED заказы старше срока хранения переносятся в архивные таблицы,
+  чтобы orders/box_orders и их индексы оставались маленькими.
+
+Всё выполняется ограниченными батчами в отдельных транзакциях.
+Архивирование не меняет order_counters: /stats по-прежнему учитывает
+отменённые заказы, а rebuild_counters() считает и архив.
+"""
+import asyncio
+import logging
+from datetime import timedelta
+
+from sqlalchemy import select, insert, update, delete, func, literal, DateTime
+
+from database.connection import get_session
+from database.counters import COUNTER_BOX, record_transition
+from database.models import (
+    Order,
+    OrderStatus,
+    BoxOrder,
+    BoxOrderStatus,
+    ArchivedOrder,
+    ArchivedBoxOrder,
+    utc_now,
+)
+
+logger = logging.getLogger(__name__)
+
+# Строк за одну транзакцию
+RETENTION_BATCH_SIZE = 500
+# Батчей за один запуск (остальное — в следующий раз)
+RETENTION_MAX_BATCHES = 20
+# Пауза между батчами, чтобы не занимать писателя SQLite подряд
+RETENTION_BATCH_DELAY = 0.05
+
+
+async def expire_pending_box_orders(ttl_hours: int) -> int:
+    """
+    Отменить PENDING-предзаказы, созданные раньше ttl_hours назад.
+
+    Returns:
+        Количество отменённых предзаказов
+    """
+    cutoff = utc_now() - timedelta(hours=ttl_hours)
+    expired = 0
+
+    for _ in range(RETENTION_MAX_BATCHES):
+        async with get_session() as session:
+            ids = (await session.execute(
+                select(BoxOrder.id)
+                .where(BoxOrder.status == BoxOrderStatus.PENDING, BoxOrder.created_at < cutoff)
+                .order_by(BoxOrder.id)
+                .limit(RETENTION_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            if not ids:
+                break
+
+            # Статус проверяется ещё раз: заказ мог оплатиться между SELECT и UPDATE
+            result = await session.execute(
+                update(BoxOrder)
+                .where(BoxOrder.id.in_(ids), BoxOrder.status == BoxOrderStatus.PENDING)
+                .values(status=BoxOrderStatus.CANCELLED)
+                .returning(BoxOrder.box_month, BoxOrder.amount)
+                .execution_options(synchronize_session=False)
+            )
+
+            # box_month -> [count, amount]: одна запись счётчика на месяц
+            by_month: dict[str, list[int]] = {}
+            for box_month, amount in result:
+                total = by_month.setdefault(box_month, [0, 0])
+                total[0] += 1
+                total[1] += amount
+            for box_month, (count, amount) in by_month.items():
+                await record_transition(
+                    session, COUNTER_BOX, BoxOrderStatus.PENDING, BoxOrderStatus.CANCELLED,
+                    amount, box_month, count=count,
+                )
+            await session.commit()
+
+        expired += sum(count for count, _ in by_month.values())
+        if len(ids) < RETENTION_BATCH_SIZE:
+            break
+        await asyncio.sleep(RETENTION_BATCH_DELAY)
+
+    if expired:
+        logger.info(f"Expired {expired} pending box orders older than {ttl_hours}h")
+    return expired
+
+
+async def _archive_cancelled(model, archive, cancelled_status, cutoff) -> int:
+    """Перенести отменённые строки model старше cutoff в archive."""
+    columns = [column.name for column in model.__table__.columns]
+    archived = 0
+
+    for _ in range(RETENTION_MAX_BATCHES):
+        async with get_session() as session:
+            ids = (await session.execute(
+                select(model.id)
+                .where(
+                    model.status == cancelled_status,
+                    model.created_at < cutoff,
+                    # SQLite без AUTOINCREMENT переиспользует максимальный id
+                    # после удаления — последнюю строку таблицы не трогаем
+                    model.id < select(func.max(model.id)).scalar_subquery(),
+                )
+                .order_by(model.id)
+                .limit(RETENTION_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            if not ids:
+                break
+
+            await session.execute(
+                insert(archive).from_select(
+                    columns + ["archived_at"],
+                    select(
+                        *(model.__table__.c[name] for name in columns),
+                        literal(utc_now(), DateTime(timezone=True)),
+                    ).where(model.id.in_(ids)),
+                )
+            )
+            await session.execute(
+                delete(model)
+                .where(model.id.in_(ids))
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+        archived += len(ids)
+        if len(ids) < RETENTION_BATCH_SIZE:
+            break
+        await asyncio.sleep(RETENTION_BATCH_DELAY)
+
+    return archived
+
+
+async def archive_cancelled_orders(retention_days: int) -> int:
+    """
+    Перенести CANCELLED заказы и предзаказы старше retention_days в архив.
+
+    Returns:
+        Количество перенесённых строк
+    """
+    cutoff = utc_now() - timedelta(days=retention_days)
+
+    archived = await _archive_cancelled(Order, ArchivedOrder, OrderStatus.CANCELLED, cutoff)
+    archived += await _archive_cancelled(
+        BoxOrder, ArchivedBoxOrder, BoxOrderStatus.CANCELLED, cutoff
+    )
+
+    if archived:
+        logger.info(f"Archived {archived} cancelled orders older than {retention_days} days")
+    return archived
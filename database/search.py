@@ -0,0 +1,165 @@
+"""
+Полнотекстовый поиск заказов для /find.
+
+SQLite: виртуальная таблица FTS5 order_search с токенизатором trigram
+(поиск подстроки без учёта регистра, в т.ч. по кириллице и цифрам телефона).
+rowid = id * 2 + kind (0 — Order, 1 — BoxOrder); строки поддерживают
+триггеры на orders и box_orders.
+
+PostgreSQL: GIN-индексы pg_trgm по выражению name/phone/address,
+запрос — ILIKE по тому же выражению (индекс обновляется сам).
+
+Индексы создаёт миграция 6 (database/migrations.py), модели их не описывают.
+"""
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Order, BoxOrder
+
+# Trigram-поиск работает с подстроками от 3 символов
+SEARCH_MIN_TERM_LENGTH = 3
+SEARCH_MAX_TERMS = 5
+
+SEARCH_KIND_ORDER = 0
+SEARCH_KIND_BOX = 1
+
+# (таблица, kind) для индексируемых заказов
+SEARCH_TABLES = (("orders", SEARCH_KIND_ORDER), ("box_orders", SEARCH_KIND_BOX))
+
+# Выражение для GIN-индекса PostgreSQL. Запрос должен использовать его
+# дословно (с литералами, без параметров) — иначе планировщик не узнает индекс
+PG_SEARCH_EXPRESSION = (
+    "(coalesce(name, '') || ' ' || coalesce(phone, '') || ' ' || coalesce(address, ''))"
+)
+
+
+class SearchUnavailableError(RuntimeError):
+    """Индекс поиска не создан (SQLite без FTS5)."""
+
+
+def search_terms(query: str) -> list[str]:
+    """Слова запроса, пригодные для trigram-поиска."""
+    terms = [term for term in query.split() if len(term) >= SEARCH_MIN_TERM_LENGTH]
+    return terms[:SEARCH_MAX_TERMS]
+
+
+# ===== DDL ИНДЕКСА (применяет миграция) =====
+
+def _sqlite_trigger_statements(table: str, kind: int) -> list[str]:
+    rowid_new = f"new.id * 2 + {kind}"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO order_search (rowid, name, phone, address) "
+        f"VALUES ({rowid_new}, new.name, new.phone, new.address); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_au "
+        f"AFTER UPDATE OF name, phone, address ON {table} BEGIN "
+        f"UPDATE order_search SET name = new.name, phone = new.phone, address = new.address "
+        f"WHERE rowid = {rowid_new}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM order_search WHERE rowid = old.id * 2 + {kind}; END",
+    ]
+
+
+def sqlite_search_statements() -> list[str]:
+    """FTS5-таблица, триггеры и заполнение (выполнять одной транзакцией)."""
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS order_search "
+        "USING fts5(name, phone, address, tokenize = 'trigram')",
+        "DELETE FROM order_search",
+    ]
+    for table, kind in SEARCH_TABLES:
+        statements += _sqlite_trigger_statements(table, kind)
+        statements.append(
+            f"INSERT INTO order_search (rowid, name, phone, address) "
+            f"SELECT id * 2 + {kind}, name, phone, address FROM {table}"
+        )
+    return statements
+
+
+def pg_search_indexes() -> list[tuple[str, str]]:
+    """(имя, CREATE INDEX CONCURRENTLY) для GIN-индексов pg_trgm."""
+    return [
+        (
+            f"ix_{table}_search",
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_search ON {table} "
+            f"USING gin ({PG_SEARCH_EXPRESSION} gin_trgm_ops)",
+        )
+        for table, _ in SEARCH_TABLES
+    ]
+
+
+# ===== ПОИСК =====
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def _search_sqlite(session: AsyncSession, terms: list[str], limit: int) -> list[int]:
+    # Каждое слово — фраза в кавычках: подстрока, все слова обязательны
+    match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+    try:
+        result = await session.execute(
+            text(
+                "SELECT rowid FROM order_search WHERE order_search MATCH :match "
+                "ORDER BY rank LIMIT :limit"
+            ),
+            {"match": match, "limit": limit},
+        )
+    except OperationalError as e:
+        raise SearchUnavailableError(str(e)) from e
+    return list(result.scalars().all())
+
+
+async def _search_postgres(session: AsyncSession, terms: list[str], limit: int) -> list[int]:
+    conditions = " AND ".join(
+        f"{PG_SEARCH_EXPRESSION} ILIKE :term{i}" for i in range(len(terms))
+    )
+    params = {f"term{i}": f"%{_escape_like(term)}%" for i, term in enumerate(terms)}
+    rowids: list[int] = []
+    for table, kind in SEARCH_TABLES:
+        result = await session.execute(
+            text(
+                f"SELECT id * 2 + {kind} FROM {table} WHERE {conditions} "
+                f"ORDER BY created_at DESC LIMIT :limit"
+            ),
+            {**params, "limit": limit},
+        )
+        rowids.extend(result.scalars().all())
+    return rowids[:limit]
+
+
+async def search_orders(
+    session: AsyncSession, query: str, limit: int = 20
+) -> list[Order | BoxOrder]:
+    """
+    Найти заказы и предзаказы по имени, контакту и адресу.
+
+    Raises:
+        SearchUnavailableError: индекс поиска не создан
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    if session.get_bind().dialect.name == "postgresql":
+        rowids = await _search_postgres(session, terms, limit)
+    else:
+        rowids = await _search_sqlite(session, terms, limit)
+
+    order_ids = [rowid // 2 for rowid in rowids if rowid % 2 == SEARCH_KIND_ORDER]
+    box_ids = [rowid // 2 for rowid in rowids if rowid % 2 == SEARCH_KIND_BOX]
+
+    found: dict[int, Order | BoxOrder] = {}
+    if order_ids:
+        orders = await session.execute(select(Order).where(Order.id.in_(order_ids)))
+        for order in orders.scalars():
+            found[order.id * 2 + SEARCH_KIND_ORDER] = order
+    if box_ids:
+        box_orders = await session.execute(select(BoxOrder).where(BoxOrder.id.in_(box_ids)))
+        for order in box_orders.scalars():
+            found[order.id * 2 + SEARCH_KIND_BOX] = order
+
+    # Порядок релевантности из индекса
+    return [found[rowid] for rowid in rowids if rowid in found]
@@ -0,0 +1,217 @@
+"""
+Чтение отчётов со снапшота или реплики.
+
+SQLite: фоновая задача копирует живую базу в файл снапшота одним
+VACUUM INTO (одна читающая транзакция — копия согласована, и, в отличие
+от постраничного backup, её не перезапускает каждая запись в живую базу)
+и атомарно подменяет файл. Живая база работает в WAL (init_db), поэтому
+читающая транзакция копии не блокирует писателей. Копия ограничена
+SNAPSHOT_TIMEOUT: если не успела, остаётся прежний снапшот. Админские и
+отчётные запросы (/stats, /orders, выгрузки) читают снапшот в режиме
+read-only и не держат блокировок на живой базе.
+
+PostgreSQL: те же запросы идут на DATABASE_READ_URL (read-replica).
+
+Если ни снапшота, ни реплики нет, get_read_session() отдаёт обычную
+сессию get_session().
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import NullPool
+
+from database.connection import get_session, normalize_database_url
+from database.instrumentation import install_query_instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Предел одной копии, секунды: дольше — прерываем и оставляем прежний снапшот
+SNAPSHOT_TIMEOUT = 30
+# Как часто (в инструкциях VM SQLite) проверять предел
+SNAPSHOT_PROGRESS_STEPS = 10_000
+
+# Пул для read-replica PostgreSQL (отчёты редкие)
+READ_POOL_SIZE = 2
+READ_MAX_OVERFLOW = 3
+
+read_engine = None
+read_session = None
+
+# Пути для SQLite-снапшота (None — снапшот выключен)
+_source_path: str | None = None
+_snapshot_path: str | None = None
+
+_last_snapshot = {"taken_at": None, "duration_ms": 0.0, "size": 0, "failures": 0}
+
+
+def _sqlite_file_path(database_url: str) -> str | None:
+    """Путь к файлу SQLite-базы или None (PostgreSQL, in-memory)."""
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite":
+        return None
+    if not url.database or url.database == ":memory:" or url.database.startswith("file:"):
+        return None
+    return os.path.abspath(url.database)
+
+
+async def init_read_db(
+    database_url: str | None = None,
+    read_url: str = "",
+    snapshot_path: str = "bot.snapshot.db",
+    snapshot_enabled: bool = True,
+    slow_query_ms: float = 200,
+):
+    """Подготовить движок для отчётных запросов.
+
+    Args:
+        database_url: URL основной базы
+        read_url: URL read-replica (PostgreSQL)
+        snapshot_path: Файл снапшота для SQLite
+        snapshot_enabled: False — отчёты читают основную базу
+        slow_query_ms: Порог логирования медленных запросов
+    """
+    global read_engine, read_session, _source_path, _snapshot_path
+
+    database_url = normalize_database_url(database_url)
+
+    if read_url:
+        read_engine = create_async_engine(
+            normalize_database_url(read_url),
+            pool_size=READ_POOL_SIZE,
+            max_overflow=READ_MAX_OVERFLOW,
+            pool_pre_ping=True,
+        )
+        logger.info("Reporting reads routed to read replica")
+    else:
+        source = _sqlite_file_path(database_url)
+        if source is None or not snapshot_enabled:
+            logger.info("Reporting reads use the primary database")
+            return
+
+        _source_path = source
+        _snapshot_path = os.path.abspath(snapshot_path)
+        # Каждая сессия открывает файл заново — после подмены видна новая копия
+        read_engine = create_async_engine(
+            f"sqlite+aiosqlite:///file:{_snapshot_path}?mode=ro&uri=true",
+            poolclass=NullPool,
+        )
+        logger.info(f"Reporting reads routed to snapshot {_snapshot_path}")
+
+    read_session = async_sessionmaker(read_engine, expire_on_commit=False)
+    install_query_instrumentation(read_engine, slow_query_ms)
+
+
+async def close_read_db():
+    """Закрытие движка отчётов."""
+    global read_engine, read_session, _source_path, _snapshot_path
+
+    if read_engine:
+        await read_engine.dispose()
+
+    read_engine = None
+    read_session = None
+    _source_path = None
+    _snapshot_path = None
+
+
+def snapshot_enabled() -> bool:
+    """Нужна ли фоновая задача снапшота."""
+    return _source_path is not None
+
+
+def _backup(source: str, target: str) -> int:
+    """Скопировать базу во временный файл и атомарно подменить снапшот."""
+    tmp_path = f"{target}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    src = sqlite3.connect(f"{Path(source).as_uri()}?mode=ro", uri=True)
+    deadline = time.monotonic() + SNAPSHOT_TIMEOUT
+    # Ненулевой ответ прерывает VACUUM INTO с OperationalError("interrupted")
+    src.set_progress_handler(lambda: time.monotonic() > deadline, SNAPSHOT_PROGRESS_STEPS)
+    try:
+        src.execute("VACUUM INTO ?", (tmp_path,))
+    except sqlite3.Error:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        src.close()
+
+    dst = sqlite3.connect(tmp_path)
+    try:
+        # Снапшот только читается — журнал WAL ему не нужен
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+
+    os.replace(tmp_path, target)
+    return os.path.getsize(target)
+
+
+async def refresh_snapshot() -> bool:
+    """
+    Обновить файл снапшота (в отдельном потоке).
+
+    Returns:
+        True если снапшот обновлён
+    """
+    if _source_path is None:
+        return False
+
+    started = time.perf_counter()
+    try:
+        size = await asyncio.to_thread(_backup, _source_path, _snapshot_path)
+    except (sqlite3.Error, OSError) as e:
+        _last_snapshot["failures"] += 1
+        logger.error(f"Snapshot refresh failed, keeping previous snapshot: {e}")
+        return False
+
+    duration_ms = (time.perf_counter() - started) * 1000
+    _last_snapshot.update(
+        taken_at=datetime.now(timezone.utc), duration_ms=duration_ms, size=size
+    )
+    logger.info(f"Snapshot refreshed in {duration_ms:.0f} ms ({size // 1024} KB)")
+    return True
+
+
+def snapshot_taken_at() -> datetime | None:
+    """Время последнего снапшота (None — отчёты читают живые данные)."""
+    if _source_path is None:
+        return None
+    return _last_snapshot["taken_at"]
+
+
+def get_snapshot_stats() -> dict:
+    """Состояние снапшота: taken_at, duration_ms, size, failures."""
+    if _source_path is None:
+        return {}
+    return dict(_last_snapshot)
+
+
+@asynccontextmanager
+async def get_read_session() -> AsyncSession:
+    """Сессия для админских и отчётных запросов (только чтение).
+
+    Читает снапшот (SQLite) или реплику (PostgreSQL) и не проходит
+    контроль допуска основной базы. Пока первого снапшота нет,
+    отдаёт обычную сессию get_session().
+    """
+    if read_session is None or (_snapshot_path and not os.path.exists(_snapshot_path)):
+        async with get_session() as session:
+            yield session
+        return
+
+    session = read_session()
+    try:
+        yield session
+    finally:
+        await session.close()
@@ -0,0 +1,133 @@
+"""
+Потоковая выгрузка строк в сжатый CSV/JSONL (для /export).
+
+Строки читаются через session.stream() с yield_per (серверный курсор на
+PostgreSQL, fetchmany на SQLite) и сразу пишутся в gzip-поток внутри
+SpooledTemporaryFile: до EXPORT_SPOOL_MAX_BYTES файл живёт в памяти,
+дальше — на диске. Расход памяти не зависит от числа строк.
+"""
+import csv
+import gzip
+import io
+import json
+import logging
+import re
+from datetime import datetime
+from enum import Enum
+from tempfile import SpooledTemporaryFile
+from typing import AsyncGenerator
+
+from aiogram import Bot
+from aiogram.types import InputFile
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# ===== КОНСТАНТЫ ВЫГРУЗКИ =====
+EXPORT_BATCH_SIZE = 1000                    # Строк за один fetch
+EXPORT_SPOOL_MAX_BYTES = 1024 * 1024        # Дальше файл уходит на диск
+TELEGRAM_DOCUMENT_MAX_BYTES = 50 * 1024 * 1024  # Лимит Bot API на sendDocument
+
+# Начало ячейки, которое Excel/Sheets считают формулой (CSV injection)
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+# Телефон в международном формате (+7 999 123-45-67) — не формула, оставляем как есть
+CSV_PHONE_PATTERN = re.compile(r"^\+?\d[\d -]*$")
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+EXPORT_FORMATS = (FORMAT_CSV, FORMAT_JSONL)
+
+
+class SpooledInputFile(InputFile):
+    """Документ для Telegram, читаемый кусками из временного файла."""
+
+    def __init__(self, file, filename: str):
+        super().__init__(filename=filename)
+        self.file = file
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
+
+def _cell(value):
+    """Значение для CSV/JSON: Enum — его value, даты — ISO 8601."""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_cell(value):
+    """Ячейка CSV: пользовательский текст, похожий на формулу, — как текст ('=...)."""
+    value = _cell(value)
+    if (
+        isinstance(value, str)
+        and value.startswith(CSV_FORMULA_PREFIXES)
+        and not CSV_PHONE_PATTERN.match(value)
+    ):
+        return "'" + value
+    return value
+
+
+async def stream_export(
+    session: AsyncSession, stmt: Select, fmt: str
+) -> tuple[SpooledTemporaryFile, int]:
+    """
+    Выполнить запрос потоково и записать строки в gzip-файл.
+
+    Args:
+        session: Сессия (лучше get_read_session — выгрузка читает долго)
+        stmt: Core-запрос по колонкам (не ORM-сущностям — без identity map)
+        fmt: FORMAT_CSV или FORMAT_JSONL
+
+    Returns:
+        (файл, перемотанный в начало; число строк). Файл закрывает вызывающий.
+    """
+    columns = list(stmt.selected_columns.keys())
+    spool = SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+    rows = 0
+
+    try:
+        # mtime=0 — одинаковые данные дают одинаковый архив
+        with gzip.GzipFile(fileobj=spool, mode="wb", mtime=0) as gz:
+            text = io.TextIOWrapper(gz, encoding="utf-8", newline="")
+            writer = None
+            if fmt == FORMAT_CSV:
+                # BOM — чтобы Excel открыл кириллицу как UTF-8
+                text.write("\ufeff")
+                writer = csv.writer(text)
+                writer.writerow(columns)
+
+            result = await session.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            async for partition in result.partitions():
+                for row in partition:
+                    if writer is not None:
+                        writer.writerow([_csv_cell(value) for value in row])
+                    else:
+                        values = [_cell(value) for value in row]
+                        text.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False))
+                        text.write("\n")
+                rows += len(partition)
+
+            text.flush()
+            # Отсоединяем обёртку, чтобы её закрытие не закрыло gzip раньше времени
+            text.detach()
+    except BaseException:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return spool, rows
+
+
+def spool_size(spool: SpooledTemporaryFile) -> int:
+    """Размер готового файла в байтах."""
+    position = spool.tell()
+    spool.seek(0, io.SEEK_END)
+    size = spool.tell()
+    spool.seek(position)
+    return size
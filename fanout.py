@@ -0,0 +1,144 @@
+"""
+Массовая рассылка сообщений с ограничением скорости.
+
+Telegram принимает от бота около 30 сообщений в секунду на всех
+получателей; при превышении отвечает RetryAfter. Рассылка идёт
+несколькими воркерами, но все они берут слот у общего RateLimiter,
+а RetryAfter ставит на паузу весь лимитер, а не один воркер.
+
+Лимит Telegram — на бота, поэтому лимитер один на процесс
+(telegram_limiter): /ship, /deliver, подтверждение из дайджеста,
+/broadcast и напоминания планировщика делят одни 25 сообщений/с.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Iterable
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+
+logger = logging.getLogger(__name__)
+
+# ===== КОНСТАНТЫ РАССЫЛКИ =====
+FANOUT_RATE = 25            # Сообщений в секунду (с запасом до лимита Telegram)
+FANOUT_CONCURRENCY = 8      # Одновременных запросов к Bot API
+FANOUT_MAX_RETRIES = 3      # Повторов одного сообщения после RetryAfter
+
+SEND_OK = "sent"
+SEND_BLOCKED = "blocked"
+SEND_FAILED = "failed"
+
+
+class RateLimiter:
+    """Равномерный лимит: не больше rate вызовов в секунду на все задачи."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        """Дождаться своего слота."""
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float):
+        """Не выдавать слоты ближайшие seconds секунд (после RetryAfter)."""
+        resume_at = asyncio.get_running_loop().time() + seconds
+        self._next_slot = max(self._next_slot, resume_at)
+
+
+# Общий лимит Bot API на все массовые отправки процесса
+telegram_limiter = RateLimiter(FANOUT_RATE)
+
+
+@dataclass
+class FanoutResult:
+    """Итог рассылки."""
+    sent: int = 0
+    failed: int = 0
+    blocked: list[int] = field(default_factory=list)  # Заблокировали бота
+
+
+async def send_limited(bot: Bot, limiter: RateLimiter, chat_id: int, text: str, **kwargs) -> str:
+    """
+    Отправить одно сообщение через лимитер.
+
+    Returns:
+        SEND_OK, SEND_BLOCKED или SEND_FAILED
+    """
+    for _ in range(FANOUT_MAX_RETRIES + 1):
+        await limiter.wait()
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            return SEND_OK
+        except TelegramRetryAfter as e:
+            logger.warning(f"Fan-out hit flood control, pausing for {e.retry_after}s")
+            limiter.pause(e.retry_after)
+        except TelegramForbiddenError:
+            return SEND_BLOCKED
+        except TelegramAPIError as e:
+            logger.warning(f"Failed to send to {chat_id}: {e}")
+            return SEND_FAILED
+    return SEND_FAILED
+
+
+async def fan_out(
+    bot: Bot,
+    chat_ids: Iterable[int],
+    text: str,
+    concurrency: int = FANOUT_CONCURRENCY,
+    limiter: RateLimiter | None = None,
+    **kwargs,
+) -> FanoutResult:
+    """
+    Разослать text по chat_ids через общий telegram_limiter.
+
+    Дубликаты chat_id отправляются один раз. kwargs передаются в send_message.
+    limiter — другой лимитер (например, в бенчмарке), по умолчанию общий.
+    """
+    pending = iter(dict.fromkeys(chat_ids))
+    limiter = limiter or telegram_limiter
+    result = FanoutResult()
+
+    async def worker():
+        # Итератор общий: каждый chat_id достаётся ровно одному воркеру
+        for chat_id in pending:
+            status = await send_limited(bot, limiter, chat_id, text, **kwargs)
+            if status == SEND_OK:
+                result.sent += 1
+            elif status == SEND_BLOCKED:
+                result.blocked.append(chat_id)
+            else:
+                result.failed += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return result
+
+
+# Ссылки на фоновые задачи, чтобы их не собрал GC до завершения
+_background_tasks: set[asyncio.Task] = set()
+
+
+def run_in_background(coro: Awaitable, name: str) -> asyncio.Task:
+    """Запустить рассылку фоном, не задерживая ответ на callback."""
+    task = asyncio.create_task(coro, name=name)
+    _background_tasks.add(task)
+
+    def done(finished: asyncio.Task):
+        _background_tasks.discard(finished)
+        if not finished.cancelled() and finished.exception():
+            logger.error(f"Background task {name} failed", exc_info=finished.exception())
+
+    task.add_done_callback(done)
+    return task
@@ -1,14 +1,49 @@
+import html
 import logging
+import re
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
+from aiogram.filters import Command, CommandObject
 from aiogram.exceptions import TelegramAPIError
-from sqlalchemy import select, func, case
-from datetime import datetime, timezone
+from sqlalchemy import select, update, func, tuple_, Select
+from datetime import datetime, timedelta, timezone
 
 import texts
+import keyboards
 from config import Config
-from database import get_session, Order, OrderStatus, User, BoxOrder, BoxOrderStatus
+from database import (
+    get_session,
+    get_read_session,
+    snapshot_taken_at,
+    get_snapshot_stats,
+    Order,
+    OrderStatus,
+    BoxOrder,
+    BoxOrderStatus,
+    COUNTER_USER,
+    COUNTER_ORDER,
+    COUNTER_BOX,
+    record_transition,
+    load_counters,
+    rebuild_counters,
+    get_query_stats,
+    get_pool_stats,
+    get_admission_stats,
+    search_orders,
+    SearchUnavailableError,
+    SEARCH_MIN_TERM_LENGTH,
+)
+from export import (
+    stream_export,
+    spool_size,
+    SpooledInputFile,
+    EXPORT_FORMATS,
+    FORMAT_CSV,
+    TELEGRAM_DOCUMENT_MAX_BYTES,
+)
+from fanout import fan_out, run_in_background
+from broadcast import parse_segment, create_job, start_job, cancel_job, deliver
+from notifier import AdminNotifier, DIGEST_HEADER, ORDER_KIND, BOX_KIND
 from notion_sync import NotionSyncService
 from content import ContentManager
 
@@ -23,115 +58,606 @@ def admin_only(config: Config):
     return check
 
 
+def snapshot_note() -> str:
+    """Подпись о свежести данных, если отчёт читает снапшот."""
+    taken_at = snapshot_taken_at()
+    if taken_at is None:
+        return ""
+    return f"\n\nДанные на {taken_at:%H:%M} UTC"
+
+
+# ===== СПИСОК ЗАКАЗОВ (/orders) =====
+
+ORDERS_PAGE_SIZE = 10
+
+# callback_data браузера: ob_{kind}_{status}_{month}_{direction}_{ts}_{id}
+# (лимит Telegram — 64 байта; ts — микросекунды created_at от эпохи)
+ORDERS_BROWSER_PREFIX = "ob"
+
+KIND_ORDER = "o"
+KIND_BOX = "b"
+
+DIRECTION_FIRST = "f"
+DIRECTION_OLDER = "n"
+DIRECTION_NEWER = "p"
+
+STATUS_ALL = "a"
+
+# Однобуквенные коды статусов для callback_data
+ORDER_STATUS_CODES = {
+    "p": OrderStatus.PENDING,
+    "d": OrderStatus.PAID,
+    "c": OrderStatus.CONFIRMED,
+    "x": OrderStatus.CANCELLED,
+}
+BOX_STATUS_CODES = {
+    "p": BoxOrderStatus.PENDING,
+    "d": BoxOrderStatus.PAID,
+    "c": BoxOrderStatus.CONFIRMED,
+    "s": BoxOrderStatus.SHIPPED,
+    "v": BoxOrderStatus.DELIVERED,
+    "x": BoxOrderStatus.CANCELLED,
+}
+
+STATUS_EMOJI = {
+    "pending": "⏳",
+    "paid": "💰",
+    "confirmed": "✅",
+    "shipped": "🚚",
+    "delivered": "🏠",
+    "cancelled": "❌",
+}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor_time(value: datetime) -> int:
+    """created_at -> целые микросекунды от эпохи (SQLite отдаёт naive UTC)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def decode_cursor_time(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def shift_month(month: str, delta: int) -> str:
+    """Месяц "2026-03", сдвинутый на delta месяцев."""
+    year, number = int(month[:4]), int(month[5:7])
+    index = year * 12 + number - 1 + delta
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def month_bounds(month: str) -> tuple[datetime, datetime]:
+    """Начало месяца и начало следующего (UTC)."""
+    start = datetime(int(month[:4]), int(month[5:7]), 1, tzinfo=timezone.utc)
+    following = shift_month(month, 1)
+    end = datetime(int(following[:4]), int(following[5:7]), 1, tzinfo=timezone.utc)
+    return start, end
+
+
+class OrdersView:
+    """Состояние браузера /orders: тип заказов, фильтр статуса и месяца."""
+
+    def __init__(self, kind: str = KIND_ORDER, status: str = STATUS_ALL, month: str = ""):
+        self.kind = kind
+        self.status = status
+        self.month = month  # "2026-03" или "" (все месяцы)
+
+    @property
+    def model(self) -> type[Order] | type[BoxOrder]:
+        return BoxOrder if self.kind == KIND_BOX else Order
+
+    @property
+    def status_codes(self) -> dict:
+        return BOX_STATUS_CODES if self.kind == KIND_BOX else ORDER_STATUS_CODES
+
+    @property
+    def status_filter(self) -> OrderStatus | BoxOrderStatus | None:
+        return self.status_codes.get(self.status)
+
+    def replace(self, **changes) -> "OrdersView":
+        values = {"kind": self.kind, "status": self.status, "month": self.month, **changes}
+        return OrdersView(**values)
+
+    def data(
+        self, direction: str = DIRECTION_FIRST, cursor: tuple[datetime, int] | None = None
+    ) -> str:
+        """callback_data для этого вида (и страницы после/до курсора)."""
+        ts, order_id = (encode_cursor_time(cursor[0]), cursor[1]) if cursor else (0, 0)
+        month = self.month.replace("-", "") or "0"
+        return (
+            f"{ORDERS_BROWSER_PREFIX}_{self.kind}_{self.status}_{month}_"
+            f"{direction}_{ts}_{order_id}"
+        )
+
+    @classmethod
+    def parse(cls, data: str) -> tuple["OrdersView", str, tuple[datetime, int] | None]:
+        """
+        Разобрать callback_data.
+
+        Raises:
+            ValueError: неверный формат
+        """
+        parts = data.split("_")
+        if len(parts) != 7 or parts[0] != ORDERS_BROWSER_PREFIX:
+            raise ValueError("unexpected format")
+        _, kind, status, month, direction, ts, order_id = parts
+
+        if kind not in (KIND_ORDER, KIND_BOX):
+            raise ValueError("unknown kind")
+        view = cls(kind)
+        if status != STATUS_ALL and status not in view.status_codes:
+            raise ValueError("unknown status")
+        view.status = status
+        if month != "0":
+            if len(month) != 6 or not month.isdigit() or not 1 <= int(month[4:]) <= 12:
+                raise ValueError("bad month")
+            view.month = f"{month[:4]}-{month[4:]}"
+        if direction not in (DIRECTION_FIRST, DIRECTION_OLDER, DIRECTION_NEWER):
+            raise ValueError("unknown direction")
+
+        cursor = None
+        if direction != DIRECTION_FIRST:
+            cursor = (decode_cursor_time(int(ts)), int(order_id))
+        return view, direction, cursor
+
+
+def filter_orders(
+    stmt: Select,
+    model: type[Order] | type[BoxOrder],
+    status: OrderStatus | BoxOrderStatus | None,
+    month: str,
+) -> Select:
+    """Фильтр по статусу и месяцу (box_month для наборов, created_at для заказов)."""
+    if status is not None:
+        stmt = stmt.where(model.status == status)
+    if month:
+        if model is BoxOrder:
+            stmt = stmt.where(BoxOrder.box_month == month)
+        else:
+            start, end = month_bounds(month)
+            stmt = stmt.where(model.created_at >= start, model.created_at < end)
+    return stmt
+
+
+def orders_page_query(
+    view: OrdersView,
+    direction: str = DIRECTION_FIRST,
+    cursor: tuple[datetime, int] | None = None,
+    limit: int = ORDERS_PAGE_SIZE,
+) -> Select:
+    """
+    Страница /orders: keyset по (created_at, id), на одну строку больше limit.
+
+    Каждая страница — диапазон по индексу (..., created_at, id), стоимость
+    не зависит от глубины. DIRECTION_NEWER выбирает строки в прямом
+    порядке — вызывающий разворачивает их.
+    """
+    model = view.model
+    stmt = filter_orders(select(model), model, view.status_filter, view.month)
+
+    key = tuple_(model.created_at, model.id)
+    if direction == DIRECTION_NEWER and cursor is not None:
+        stmt = stmt.where(key > tuple_(*cursor)).order_by(model.created_at, model.id)
+    else:
+        if direction == DIRECTION_OLDER and cursor is not None:
+            stmt = stmt.where(key < tuple_(*cursor))
+        stmt = stmt.order_by(model.created_at.desc(), model.id.desc())
+
+    return stmt.limit(limit + 1)
+
+
+async def load_orders_page(
+    view: OrdersView, direction: str, cursor: tuple[datetime, int] | None
+) -> tuple[list[Order | BoxOrder], bool, bool]:
+    """
+    Строки страницы (от новых к старым) и флаги соседних страниц.
+
+    Returns:
+        (orders, has_newer, has_older)
+    """
+    async with get_read_session() as session:
+        result = await session.execute(orders_page_query(view, direction, cursor))
+        orders = list(result.scalars().all())
+
+    more = len(orders) > ORDERS_PAGE_SIZE
+    orders = orders[:ORDERS_PAGE_SIZE]
+
+    if direction == DIRECTION_NEWER:
+        orders.reverse()
+        return orders, more, True
+    if direction == DIRECTION_OLDER:
+        return orders, True, more
+    return orders, False, more
+
+
+def format_order_row(order: Order | BoxOrder) -> str:
+    """Строка заказа в /orders (пользовательские данные экранированы)."""
+    emoji = STATUS_EMOJI.get(order.status.value, "?")
+    month = f" | {order.box_month}" if isinstance(order, BoxOrder) else ""
+    return (
+        f"{emoji} #{order.id}{month} | {html.escape(order.name or '—')} | "
+        f"{html.escape(order.phone or '—')} | {order.status.value} | {order.created_at:%d.%m %H:%M}"
+    )
+
+
+def render_orders_page(
+    view: OrdersView, orders: list[Order | BoxOrder], has_newer: bool, has_older: bool
+) -> tuple[str, list[list[tuple[str, str]]]]:
+    """Текст и строки кнопок браузера."""
+    title = "Предзаказы набора" if view.kind == KIND_BOX else "Заказы"
+    filters = []
+    if view.status_filter is not None:
+        filters.append(f"статус {view.status_filter.value}")
+    if view.month:
+        filters.append(f"месяц {view.month}")
+    text = title + (f" ({', '.join(filters)})" if filters else "") + ":\n\n"
+
+    if orders:
+        text += "\n".join(format_order_row(order) for order in orders)
+    else:
+        text += "Заказов нет."
+    text += snapshot_note()
+
+    def mark(label: str, active: bool) -> str:
+        return f"• {label}" if active else label
+
+    kinds = [
+        (mark("Заказы", view.kind == KIND_ORDER), view.replace(kind=KIND_ORDER, status=STATUS_ALL).data()),
+        (mark("Наборы", view.kind == KIND_BOX), view.replace(kind=KIND_BOX, status=STATUS_ALL).data()),
+    ]
+    statuses = [(mark("Все", view.status == STATUS_ALL), view.replace(status=STATUS_ALL).data())]
+    statuses += [
+        (mark(STATUS_EMOJI[status.value], view.status == code), view.replace(status=code).data())
+        for code, status in view.status_codes.items()
+    ]
+
+    current_month = datetime.now(timezone.utc).strftime("%Y-%m")
+    base_month = view.month or current_month
+    months = [("‹", view.replace(month=shift_month(base_month, -1)).data())]
+    if view.month:
+        months.append((f"📅 {view.month} ✕", view.replace(month="").data()))
+    else:
+        months.append(("📅 все месяцы", view.replace(month=current_month).data()))
+    months.append(("›", view.replace(month=shift_month(base_month, 1)).data()))
+
+    navigation = []
+    if has_newer and orders:
+        first = orders[0]
+        navigation.append(("← Новее", view.data(DIRECTION_NEWER, (first.created_at, first.id))))
+    if has_older and orders:
+        last = orders[-1]
+        navigation.append(("Старее →", view.data(DIRECTION_OLDER, (last.created_at, last.id))))
+
+    return text, [kinds, statuses, months, navigation]
+
+
 @router.message(Command("orders"))
 async def cmd_orders(message: Message, config: Config):
+    """Браузер заказов: первая страница без фильтров."""
     if message.from_user.id != config.admin_id:
         return
-    
-    async with get_session() as session:
-        result = await session.execute(
-            select(Order).order_by(Order.created_at.desc()).limit(10)
+
+    view = OrdersView()
+    orders, has_newer, has_older = await load_orders_page(view, DIRECTION_FIRST, None)
+    text, rows = render_orders_page(view, orders, has_newer, has_older)
+    await message.answer(text, reply_markup=keyboards.admin_orders_browser(rows))
+
+
+@router.callback_query(F.data.startswith(f"{ORDERS_BROWSER_PREFIX}_"))
+async def orders_browser_page(callback: CallbackQuery, config: Config):
+    """Переход по страницам и фильтрам браузера /orders."""
+    if callback.from_user.id != config.admin_id:
+        await callback.answer("Нет доступа")
+        return
+
+    try:
+        view, direction, cursor = OrdersView.parse(callback.data)
+    except ValueError:
+        logger.warning(f"Invalid callback format: {callback.data[:64]}")
+        await callback.answer("Ошибка данных")
+        return
+
+    orders, has_newer, has_older = await load_orders_page(view, direction, cursor)
+    if not orders and direction != DIRECTION_FIRST:
+        # Соседние строки исчезли (архив/снапшот) — начинаем с первой страницы
+        direction = DIRECTION_FIRST
+        orders, has_newer, has_older = await load_orders_page(view, direction, None)
+
+    text, rows = render_orders_page(view, orders, has_newer, has_older)
+    if (callback.message.text or "").startswith(DIGEST_HEADER):
+        # Кнопка из дайджеста: дайджест не затираем, браузер — новым сообщением
+        await callback.message.answer(text, reply_markup=keyboards.admin_orders_browser(rows))
+        await callback.answer()
+        return
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboards.admin_orders_browser(rows))
+    except TelegramAPIError:
+        pass
+    await callback.answer()
+
+
+# ===== ВЫГРУЗКА (/export) =====
+
+EXPORT_USAGE = (
+    "Использование: /export orders|box [ГГГГ-ММ] [статус] [csv|jsonl]\n"
+    "Например: /export box 2026-03 confirmed"
+)
+EXPORT_MONTH_PATTERN = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+
+def parse_export_args(args: str) -> tuple[OrdersView, str]:
+    """
+    Разобрать аргументы /export в фильтры и формат.
+
+    Raises:
+        ValueError: неизвестный аргумент
+    """
+    tokens = args.lower().split()
+    if not tokens or tokens[0] not in ("orders", "box"):
+        raise ValueError("kind required")
+
+    view = OrdersView(KIND_BOX if tokens[0] == "box" else KIND_ORDER)
+    codes_by_value = {status.value: code for code, status in view.status_codes.items()}
+    fmt = FORMAT_CSV
+
+    for token in tokens[1:]:
+        if EXPORT_MONTH_PATTERN.match(token):
+            view.month = token
+        elif token in codes_by_value:
+            view.status = codes_by_value[token]
+        elif token in EXPORT_FORMATS:
+            fmt = token
+        else:
+            raise ValueError(f"unknown argument {token}")
+    return view, fmt
+
+
+def export_query(view: OrdersView) -> Select:
+    """Все колонки заказов по фильтрам, по возрастанию id."""
+    model = view.model
+    stmt = select(*model.__table__.columns)
+    return filter_orders(stmt, model, view.status_filter, view.month).order_by(model.id)
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject, config: Config):
+    """Выгрузка заказов или предзаказов в сжатый CSV/JSONL документом."""
+    if message.from_user.id != config.admin_id:
+        return
+
+    try:
+        view, fmt = parse_export_args(command.args or "")
+    except ValueError:
+        await message.answer(EXPORT_USAGE)
+        return
+
+    status_msg = await message.answer("Готовлю выгрузку...")
+
+    name_parts = ["box_orders" if view.kind == KIND_BOX else "orders"]
+    if view.month:
+        name_parts.append(view.month)
+    if view.status_filter is not None:
+        name_parts.append(view.status_filter.value)
+    filename = f"{'-'.join(name_parts)}.{fmt}.gz"
+
+    try:
+        async with get_read_session() as session:
+            spool, rows = await stream_export(session, export_query(view), fmt)
+    except Exception as e:
+        logger.exception("Export failed")
+        await status_msg.edit_text(f"Ошибка выгрузки:\n{e}")
+        return
+
+    try:
+        size = spool_size(spool)
+        if size > TELEGRAM_DOCUMENT_MAX_BYTES:
+            await status_msg.edit_text(
+                f"Файл слишком большой для Telegram ({size // (1024 * 1024)} МБ). "
+                f"Сузь выборку месяцем или статусом."
+            )
+            return
+
+        await message.answer_document(
+            SpooledInputFile(spool, filename),
+            caption=f"{filename}: {rows} строк" + snapshot_note(),
+        )
+        await status_msg.delete()
+    finally:
+        spool.close()
+
+
+# ===== ПОИСК ЗАКАЗОВ =====
+
+FIND_RESULTS_LIMIT = 20
+FIND_ADDRESS_MAX_LENGTH = 40
+
+
+def format_search_result(order: Order | BoxOrder) -> str:
+    """Строка результата /find (пользовательские данные экранированы)."""
+    if isinstance(order, BoxOrder):
+        prefix = f"📦 Набор #{order.id} ({order.box_month})"
+    else:
+        prefix = f"🧾 Заказ #{order.id}"
+    address = order.address or "—"
+    if len(address) > FIND_ADDRESS_MAX_LENGTH:
+        address = address[:FIND_ADDRESS_MAX_LENGTH] + "…"
+    return (
+        f"{prefix} | {html.escape(order.name or '—')} | {html.escape(order.phone or '—')} | "
+        f"{html.escape(address)} | {order.status.value} | tg {order.telegram_id}"
+    )
+
+
+@router.message(Command("find"))
+async def cmd_find(message: Message, command: CommandObject, config: Config):
+    """Поиск заказов и предзаказов по имени, контакту или адресу."""
+    if message.from_user.id != config.admin_id:
+        return
+
+    query = (command.args or "").strip()
+    if len(query) < SEARCH_MIN_TERM_LENGTH:
+        await message.answer(
+            f"Использование: /find имя, телефон или адрес\n"
+            f"Минимум {SEARCH_MIN_TERM_LENGTH} символа в слове."
         )
-        orders = result.scalars().all()
-    
+        return
+
+    # Живая база, а не снапшот: после поиска обычно действуют с заказом
+    try:
+        async with get_session() as session:
+            orders = await search_orders(session, query, FIND_RESULTS_LIMIT)
+    except SearchUnavailableError:
+        logger.exception("Order search unavailable")
+        await message.answer("Поиск недоступен: индекс не создан (см. лог миграций).")
+        return
+
     if not orders:
-        await message.answer("Заказов пока нет.")
-        return
-    
-    text = "Последние заказы:\n\n"
-    for order in orders:
-        status_emoji = {
-            OrderStatus.PENDING: "⏳",
-            OrderStatus.PAID: "💰",
-            OrderStatus.CONFIRMED: "✅",
-            OrderStatus.CANCELLED: "❌"
-        }
-        text += f"{status_emoji.get(order.status, '?')} #{order.id} | {order.name} | {order.phone} | {order.status.value}\n"
-    
-    await message.answer(text)
+        await message.answer("Ничего не найдено.")
+        return
+
+    lines = [f"Найдено: {len(orders)}\n"]
+    lines += [format_search_result(order) for order in orders]
+    await message.answer("\n".join(lines))
+
+
+# Сколько последних месяцев наборов показывать в /stats
+STATS_BOX_MONTHS = 6
+
+# Статусы, которые учитываются в выручке
+ORDER_REVENUE_STATUSES = {OrderStatus.CONFIRMED.value}
+BOX_REVENUE_STATUSES = {
+    BoxOrderStatus.CONFIRMED.value,
+    BoxOrderStatus.SHIPPED.value,
+    BoxOrderStatus.DELIVERED.value,
+}
 
 
 @router.message(Command("stats"))
 async def cmd_stats(message: Message, config: Config):
     """Статистика заказов и пользователей.
 
-    Оптимизировано: 3 запроса вместо 11 (используем CASE WHEN).
+    Читает материализованные счётчики (order_counters) — один запрос
+    к таблице из десятков строк, независимо от объёма истории.
+    Читает снапшот/реплику, а не живую базу.
     """
     if message.from_user.id != config.admin_id:
         return
 
-    async with get_session() as session:
-        # 1. Пользователи - один запрос
-        users_count = await session.scalar(
-            select(func.count()).select_from(User)
-        ) or 0
-
-        # 2. Order статистика - один запрос с CASE WHEN
-        order_stats = await session.execute(
-            select(
-                func.count().label("total"),
-                func.sum(case((Order.status == OrderStatus.PENDING, 1), else_=0)).label("pending"),
-                func.sum(case((Order.status == OrderStatus.PAID, 1), else_=0)).label("paid"),
-                func.sum(case((Order.status == OrderStatus.CONFIRMED, 1), else_=0)).label("confirmed"),
-                func.coalesce(
-                    func.sum(case((Order.status == OrderStatus.CONFIRMED, Order.amount), else_=0)),
-                    0
-                ).label("revenue"),
-            )
-        )
-        order_row = order_stats.one()
-        total_orders = order_row.total or 0
-        pending = order_row.pending or 0
-        paid = order_row.paid or 0
-        confirmed = order_row.confirmed or 0
-        total_revenue = order_row.revenue or 0
-
-        # 3. BoxOrder статистика - один запрос с CASE WHEN
-        box_stats = await session.execute(
-            select(
-                func.count().label("total"),
-                func.sum(case((BoxOrder.status == BoxOrderStatus.PENDING, 1), else_=0)).label("pending"),
-                func.sum(case((BoxOrder.status == BoxOrderStatus.PAID, 1), else_=0)).label("paid"),
-                func.sum(case((BoxOrder.status == BoxOrderStatus.CONFIRMED, 1), else_=0)).label("confirmed"),
-                func.coalesce(
-                    func.sum(case(
-                        (BoxOrder.status.in_([
-                            BoxOrderStatus.CONFIRMED,
-                            BoxOrderStatus.SHIPPED,
-                            BoxOrderStatus.DELIVERED
-                        ]), BoxOrder.amount),
-                        else_=0
-                    )),
-                    0
-                ).label("revenue"),
-            )
-        )
-        box_row = box_stats.one()
-        box_total = box_row.total or 0
-        box_pending = box_row.pending or 0
-        box_paid = box_row.paid or 0
-        box_confirmed = box_row.confirmed or 0
-        box_revenue = box_row.revenue or 0
+    async with get_read_session() as session:
+        counters = await load_counters(session)
+
+    users_count = 0
+    orders_by_status: dict[str, int] = {}
+    total_revenue = 0
+    box_by_status: dict[str, int] = {}
+    box_revenue = 0
+    # box_month -> {status: count}
+    box_months: dict[str, dict[str, int]] = {}
+
+    for row in counters:
+        if row.entity == COUNTER_USER:
+            users_count += row.count
+        elif row.entity == COUNTER_ORDER:
+            orders_by_status[row.status] = orders_by_status.get(row.status, 0) + row.count
+            if row.status in ORDER_REVENUE_STATUSES:
+                total_revenue += row.amount
+        elif row.entity == COUNTER_BOX:
+            box_by_status[row.status] = box_by_status.get(row.status, 0) + row.count
+            month = box_months.setdefault(row.box_month, {})
+            month[row.status] = month.get(row.status, 0) + row.count
+            if row.status in BOX_REVENUE_STATUSES:
+                box_revenue += row.amount
 
     text = f"""Статистика
 
 Пользователей: {users_count}
 
 --- Заказы ---
-Всего: {total_orders}
-⏳ Ожидают оплаты: {pending}
-💰 Оплачено (не подтв.): {paid}
-✅ Подтверждено: {confirmed}
+Всего: {sum(orders_by_status.values())}
+⏳ Ожидают оплаты: {orders_by_status.get(OrderStatus.PENDING.value, 0)}
+💰 Оплачено (не подтв.): {orders_by_status.get(OrderStatus.PAID.value, 0)}
+✅ Подтверждено: {orders_by_status.get(OrderStatus.CONFIRMED.value, 0)}
 Выручка: {total_revenue} €
 
 --- Предзаказы набора ---
-Всего: {box_total}
-⏳ Ожидают оплаты: {box_pending}
-💰 Оплачено (не подтв.): {box_paid}
-✅ Подтверждено: {box_confirmed}
+Всего: {sum(box_by_status.values())}
+⏳ Ожидают оплаты: {box_by_status.get(BoxOrderStatus.PENDING.value, 0)}
+💰 Оплачено (не подтв.): {box_by_status.get(BoxOrderStatus.PAID.value, 0)}
+✅ Подтверждено: {box_by_status.get(BoxOrderStatus.CONFIRMED.value, 0)}
 Выручка: {box_revenue} €"""
 
-    await message.answer(text)
+    if box_months:
+        text += "\n\n--- Наборы по месяцам ---"
+        for box_month in sorted(box_months, reverse=True)[:STATS_BOX_MONTHS]:
+            statuses = box_months[box_month]
+            total = sum(statuses.values())
+            paid = sum(statuses.get(s, 0) for s in BOX_REVENUE_STATUSES)
+            text += f"\n{box_month or '—'}: всего {total}, ✅ {paid}, ⏳ {statuses.get(BoxOrderStatus.PENDING.value, 0)}"
+
+    await message.answer(text + snapshot_note())
+
+
+@router.message(Command("recount"))
+async def cmd_recount(message: Message, config: Config):
+    """Пересчёт счётчиков /stats по исходным таблицам (сверка)."""
+    if message.from_user.id != config.admin_id:
+        return
+
+    status_msg = await message.answer("Пересчитываю счётчики...")
+
+    try:
+        async with get_session() as session:
+            rows = await rebuild_counters(session)
+            await session.commit()
+    except Exception as e:
+        logger.exception("Counters rebuild failed")
+        await status_msg.edit_text(f"Ошибка пересчёта:\n{e}")
+        return
+
+    await status_msg.edit_text(f"Счётчики пересчитаны: {rows} строк.")
+
+
+# ===== ПОДТВЕРЖДЕНИЕ ЗАКАЗОВ =====
+
+def box_month_display(box_month: str | None) -> str:
+    """"2026-03" -> "марта" для текстов пользователю."""
+    # Безопасный парсинг box_month (формат YYYY-MM)
+    month_num = 0
+    if box_month and len(box_month) >= 7:
+        try:
+            month_num = int(box_month[5:7])
+        except ValueError:
+            pass
+    return texts.MONTHS_GENITIVE.get(month_num, box_month or "—")
+
+
+async def report_decision(callback: CallbackQuery, result_text: str):
+    """
+    Отметить решение админа в сообщении с кнопками.
+
+    Отдельное уведомление заменяется итогом; в дайджесте итог дописывается
+    в конец, а из клавиатуры убирается строка этого заказа.
+    """
+    message = callback.message
+    try:
+        if not (message.text or "").startswith(DIGEST_HEADER):
+            await message.edit_text(result_text)
+            return
+
+        rows = []
+        if message.reply_markup:
+            rows = [
+                row for row in message.reply_markup.inline_keyboard
+                if all(button.callback_data != callback.data for button in row)
+            ]
+        await message.edit_text(
+            f"{message.html_text}\n{result_text}",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=rows) if rows else None,
+        )
+    except TelegramAPIError:
+        pass  # Сообщение уже изменено
 
 
 @router.callback_query(F.data.startswith("confirm_"))
@@ -156,10 +682,7 @@ async def admin_confirm_order(callback: CallbackQuery, bot: Bot, config: Config)
         return
 
     async with get_session() as session:
-        # Row-level lock для предотвращения race condition
-        result = await session.execute(
-            select(Order).where(Order.id == order_id).with_for_update()
-        )
+        result = await session.execute(select(Order).where(Order.id == order_id))
         order = result.scalar_one_or_none()
 
         if not order:
@@ -171,8 +694,21 @@ async def admin_confirm_order(callback: CallbackQuery, bot: Bot, config: Config)
             await callback.answer("Заказ уже обработан")
             return
 
-        order.status = OrderStatus.CONFIRMED
-        order.confirmed_at = datetime.now(timezone.utc)
+        # Условный UPDATE: из параллельных подтверждения и отклонения (или
+        # двойного нажатия) статус сменит одно, счётчики учтут только его
+        old_status = order.status
+        result = await session.execute(
+            update(Order)
+            .where(Order.id == order_id, Order.status == old_status)
+            .values(status=OrderStatus.CONFIRMED, confirmed_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            await callback.answer("Заказ уже обработан")
+            return
+        await record_transition(
+            session, COUNTER_ORDER, old_status, OrderStatus.CONFIRMED, order.amount
+        )
         await session.commit()
 
         # Уведомляем пользователя (с обработкой ошибок)
@@ -184,12 +720,7 @@ async def admin_confirm_order(callback: CallbackQuery, bot: Bot, config: Config)
         except TelegramAPIError as e:
             logger.warning(f"Failed to notify user {order.telegram_id}: {e}")
 
-        try:
-            await callback.message.edit_text(
-                f"✅ Заказ #{order_id} подтверждён."
-            )
-        except TelegramAPIError:
-            pass  # Сообщение уже изменено
+        await report_decision(callback, f"✅ Заказ #{order_id} подтверждён.")
 
     await callback.answer("Подтверждено")
 
@@ -216,10 +747,7 @@ async def admin_reject_order(callback: CallbackQuery, bot: Bot, config: Config):
         return
 
     async with get_session() as session:
-        # Row-level lock для предотвращения race condition
-        result = await session.execute(
-            select(Order).where(Order.id == order_id).with_for_update()
-        )
+        result = await session.execute(select(Order).where(Order.id == order_id))
         order = result.scalar_one_or_none()
 
         if not order:
@@ -235,7 +763,20 @@ async def admin_reject_order(callback: CallbackQuery, bot: Bot, config: Config):
             await callback.answer("Заказ уже подтверждён")
             return
 
-        order.status = OrderStatus.CANCELLED
+        # Условный UPDATE: статус мог смениться после чтения
+        old_status = order.status
+        result = await session.execute(
+            update(Order)
+            .where(Order.id == order_id, Order.status == old_status)
+            .values(status=OrderStatus.CANCELLED)
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            await callback.answer("Заказ уже обработан")
+            return
+        await record_transition(
+            session, COUNTER_ORDER, old_status, OrderStatus.CANCELLED, order.amount
+        )
         await session.commit()
 
         # Уведомляем пользователя (с обработкой ошибок)
@@ -247,10 +788,7 @@ async def admin_reject_order(callback: CallbackQuery, bot: Bot, config: Config):
         except TelegramAPIError as e:
             logger.warning(f"Failed to notify user {order.telegram_id}: {e}")
 
-        try:
-            await callback.message.edit_text(f"❌ Заказ #{order_id} отклонён.")
-        except TelegramAPIError:
-            pass
+        await report_decision(callback, f"❌ Заказ #{order_id} отклонён.")
 
     await callback.answer("Отклонено")
 
@@ -279,10 +817,7 @@ async def admin_confirm_box_order(callback: CallbackQuery, bot: Bot, config: Con
         return
 
     async with get_session() as session:
-        # Row-level lock для предотвращения race condition
-        result = await session.execute(
-            select(BoxOrder).where(BoxOrder.id == order_id).with_for_update()
-        )
+        result = await session.execute(select(BoxOrder).where(BoxOrder.id == order_id))
         order = result.scalar_one_or_none()
 
         if not order:
@@ -294,32 +829,34 @@ async def admin_confirm_box_order(callback: CallbackQuery, bot: Bot, config: Con
             await callback.answer("Заказ уже обработан")
             return
 
-        order.status = BoxOrderStatus.CONFIRMED
+        # Условный UPDATE: из параллельных подтверждения и отклонения (или
+        # двойного нажатия) статус сменит одно, счётчики учтут только его
+        old_status = order.status
+        result = await session.execute(
+            update(BoxOrder)
+            .where(BoxOrder.id == order_id, BoxOrder.status == old_status)
+            .values(status=BoxOrderStatus.CONFIRMED)
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            await callback.answer("Заказ уже обработан")
+            return
+        await record_transition(
+            session, COUNTER_BOX, old_status, BoxOrderStatus.CONFIRMED,
+            order.amount, order.box_month
+        )
         await session.commit()
 
         # Уведомляем пользователя
         try:
-            # Безопасный парсинг box_month (формат YYYY-MM)
-            month_num = 0
-            if order.box_month and len(order.box_month) >= 7:
-                try:
-                    month_num = int(order.box_month[5:7])
-                except ValueError:
-                    pass
-            month_display = texts.MONTHS_GENITIVE.get(month_num, order.box_month or "—")
             await bot.send_message(
                 order.telegram_id,
-                texts.BOX_CONFIRMED.format(month=month_display)
+                texts.BOX_CONFIRMED.format(month=box_month_display(order.box_month))
             )
         except TelegramAPIError as e:
             logger.warning(f"Failed to notify user {order.telegram_id}: {e}")
 
-        try:
-            await callback.message.edit_text(
-                f"✅ Предзаказ набора #{order_id} подтверждён."
-            )
-        except TelegramAPIError:
-            pass
+        await report_decision(callback, f"✅ Предзаказ набора #{order_id} подтверждён.")
 
     await callback.answer("Подтверждено")
 
@@ -346,10 +883,7 @@ async def admin_reject_box_order(callback: CallbackQuery, bot: Bot, config: Conf
         return
 
     async with get_session() as session:
-        # Row-level lock для предотвращения race condition
-        result = await session.execute(
-            select(BoxOrder).where(BoxOrder.id == order_id).with_for_update()
-        )
+        result = await session.execute(select(BoxOrder).where(BoxOrder.id == order_id))
         order = result.scalar_one_or_none()
 
         if not order:
@@ -365,7 +899,21 @@ async def admin_reject_box_order(callback: CallbackQuery, bot: Bot, config: Conf
             await callback.answer("Заказ уже обработан")
             return
 
-        order.status = BoxOrderStatus.CANCELLED
+        # Условный UPDATE: статус мог смениться после чтения
+        old_status = order.status
+        result = await session.execute(
+            update(BoxOrder)
+            .where(BoxOrder.id == order_id, BoxOrder.status == old_status)
+            .values(status=BoxOrderStatus.CANCELLED)
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            await callback.answer("Заказ уже обработан")
+            return
+        await record_transition(
+            session, COUNTER_BOX, old_status, BoxOrderStatus.CANCELLED,
+            order.amount, order.box_month
+        )
         await session.commit()
 
         # Уведомляем пользователя
@@ -377,22 +925,450 @@ async def admin_reject_box_order(callback: CallbackQuery, bot: Bot, config: Conf
         except TelegramAPIError as e:
             logger.warning(f"Failed to notify user {order.telegram_id}: {e}")
 
+        await report_decision(callback, f"❌ Предзаказ набора #{order_id} отклонён.")
+
+    await callback.answer("Отклонено")
+
+
+# ===== МАССОВОЕ ПОДТВЕРЖДЕНИЕ ИЗ ДАЙДЖЕСТА =====
+
+async def notify_digest_confirmed(
+    bot: Bot, order_users: list[int], box_users_by_month: dict[str, list[int]]
+):
+    """Разослать покупателям подтверждение оплаты."""
+    if order_users:
+        await fan_out(bot, order_users, texts.ORDER_CONFIRMED)
+    for box_month, telegram_ids in box_users_by_month.items():
+        await fan_out(
+            bot, telegram_ids, texts.BOX_CONFIRMED.format(month=box_month_display(box_month))
+        )
+
+
+@router.callback_query(F.data.startswith("digest_paid_"))
+async def admin_confirm_digest(callback: CallbackQuery, bot: Bot, config: Config):
+    """Подтверждение всех оплаченных заказов дайджеста."""
+    if callback.from_user.id != config.admin_id:
+        await callback.answer("Нет доступа")
+        return
+
+    # Строгий парсинг: ожидаем ровно "digest_paid_<hex-токен>"
+    parts = callback.data.split("_")
+    if len(parts) != 3:
+        logger.warning(f"Invalid callback format: {callback.data[:50]}")
+        await callback.answer("Ошибка данных")
+        return
+    digest_id = parts[2]
+    try:
+        bytes.fromhex(digest_id)
+    except ValueError:
+        logger.warning(f"Invalid digest_id in callback: {callback.data[:50]}")
+        await callback.answer("Ошибка данных")
+        return
+
+    orders = AdminNotifier.get_instance().paid_orders(digest_id, callback.message.message_id)
+    if orders is None:
+        await callback.answer("Дайджест устарел — подтверди заказы через /orders")
+        return
+
+    order_ids = [order_id for kind, order_id in orders if kind == ORDER_KIND]
+    box_ids = [order_id for kind, order_id in orders if kind == BOX_KIND]
+    now = datetime.now(timezone.utc)
+    order_users: list[int] = []
+    # box_month -> [count, amount] и box_month -> telegram_id покупателей
+    box_totals: dict[str, list[int]] = {}
+    box_users: dict[str, list[int]] = {}
+
+    # Только PAID: заказы, которые уже обработали кнопками, не трогаем
+    async with get_session() as session:
+        if order_ids:
+            result = await session.execute(
+                update(Order)
+                .where(Order.id.in_(order_ids), Order.status == OrderStatus.PAID)
+                .values(status=OrderStatus.CONFIRMED, confirmed_at=now)
+                .returning(Order.telegram_id, Order.amount)
+                .execution_options(synchronize_session=False)
+            )
+            rows = result.all()
+            if rows:
+                await record_transition(
+                    session, COUNTER_ORDER, OrderStatus.PAID, OrderStatus.CONFIRMED,
+                    sum(amount for _, amount in rows), count=len(rows),
+                )
+            order_users = [telegram_id for telegram_id, _ in rows]
+
+        if box_ids:
+            result = await session.execute(
+                update(BoxOrder)
+                .where(BoxOrder.id.in_(box_ids), BoxOrder.status == BoxOrderStatus.PAID)
+                .values(status=BoxOrderStatus.CONFIRMED)
+                .returning(BoxOrder.telegram_id, BoxOrder.amount, BoxOrder.box_month)
+                .execution_options(synchronize_session=False)
+            )
+            for telegram_id, amount, box_month in result:
+                total = box_totals.setdefault(box_month, [0, 0])
+                total[0] += 1
+                total[1] += amount
+                box_users.setdefault(box_month, []).append(telegram_id)
+            for box_month, (count, amount) in box_totals.items():
+                await record_transition(
+                    session, COUNTER_BOX, BoxOrderStatus.PAID, BoxOrderStatus.CONFIRMED,
+                    amount, box_month, count=count,
+                )
+        await session.commit()
+
+    confirmed = len(order_users) + sum(count for count, _ in box_totals.values())
+    logger.info(f"Digest {digest_id}: confirmed {confirmed} of {len(orders)} paid orders")
+    await callback.answer(f"Подтверждено: {confirmed}")
+
+    summary = f"✅ Подтверждено: {confirmed} из {len(orders)}"
+    if confirmed < len(orders):
+        summary += " (остальные уже обработаны)"
+    try:
+        await callback.message.edit_text(f"{callback.message.html_text}\n\n{summary}")
+    except TelegramAPIError:
+        pass
+
+    if confirmed:
+        run_in_background(
+            notify_digest_confirmed(bot, order_users, box_users),
+            name=f"digest_confirm_{digest_id}",
+        )
+
+
+# ===== МАССОВЫЕ ПЕРЕХОДЫ ПРЕДЗАКАЗОВ (/ship, /deliver) =====
+
+# action -> (из статуса, в статус, уведомление покупателю, как назвать в ответе)
+BULK_TRANSITIONS = {
+    "ship": (BoxOrderStatus.CONFIRMED, BoxOrderStatus.SHIPPED, texts.BOX_SHIPPED, "отправленными"),
+    "deliver": (
+        BoxOrderStatus.SHIPPED, BoxOrderStatus.DELIVERED, texts.BOX_DELIVERED, "доставленными"
+    ),
+}
+
+
+async def bulk_preview(message: Message, command: CommandObject, action: str):
+    """Показать, сколько предзаказов месяца затронет переход, и спросить подтверждение."""
+    box_month = (command.args or "").strip()
+    if not EXPORT_MONTH_PATTERN.match(box_month):
+        await message.answer(f"Использование: /{action} ГГГГ-ММ")
+        return
+
+    from_status, to_status, _, label = BULK_TRANSITIONS[action]
+    async with get_session() as session:
+        count, max_id = (await session.execute(
+            select(func.count(), func.max(BoxOrder.id)).where(
+                BoxOrder.box_month == box_month, BoxOrder.status == from_status
+            )
+        )).one()
+
+    if not count:
+        await message.answer(f"Нет предзаказов за {box_month} в статусе {from_status.value}.")
+        return
+
+    await message.answer(
+        f"Предзаказов за {box_month} в статусе {from_status.value}: {count}\n"
+        f"Отметить {label} ({to_status.value}) и уведомить покупателей?",
+        reply_markup=keyboards.admin_bulk_confirm(action, box_month, count, max_id),
+    )
+
+
+@router.message(Command("ship"))
+async def cmd_ship(message: Message, command: CommandObject, config: Config):
+    """Отправка всех подтверждённых предзаказов месяца."""
+    if message.from_user.id != config.admin_id:
+        return
+    await bulk_preview(message, command, "ship")
+
+
+@router.message(Command("deliver"))
+async def cmd_deliver(message: Message, command: CommandObject, config: Config):
+    """Доставка всех отправленных предзаказов месяца."""
+    if message.from_user.id != config.admin_id:
+        return
+    await bulk_preview(message, command, "deliver")
+
+
+async def notify_bulk_transition(
+    bot: Bot, status_msg: Message | None, telegram_ids: list[int], text: str
+):
+    """Разослать уведомления и дописать итог в сообщение админа."""
+    result = await fan_out(bot, telegram_ids, text)
+    logger.info(
+        f"Bulk notification: {result.sent} sent, {len(result.blocked)} blocked, "
+        f"{result.failed} failed"
+    )
+    if status_msg is None:
+        return
+    try:
+        await status_msg.edit_text(
+            f"{status_msg.text}\n\nУведомлено: {result.sent}, "
+            f"заблокировали бота: {len(result.blocked)}, ошибок: {result.failed}"
+        )
+    except TelegramAPIError:
+        pass
+
+
+@router.callback_query(F.data.startswith("bulk_"))
+async def admin_bulk_transition(callback: CallbackQuery, bot: Bot, config: Config):
+    """Массовый перевод предзаказов месяца одним UPDATE."""
+    if callback.from_user.id != config.admin_id:
+        await callback.answer("Нет доступа")
+        return
+
+    if callback.data == "bulk_cancel":
         try:
-            await callback.message.edit_text(f"❌ Предзаказ набора #{order_id} отклонён.")
+            await callback.message.edit_text("Отменено.")
         except TelegramAPIError:
             pass
+        await callback.answer()
+        return
 
-    await callback.answer("Отклонено")
+    # Строгий парсинг: ожидаем ровно "bulk_ship_2026-03_123"
+    parts = callback.data.split("_")
+    if (
+        len(parts) != 4
+        or parts[1] not in BULK_TRANSITIONS
+        or not EXPORT_MONTH_PATTERN.match(parts[2])
+        or not parts[3].isdigit()
+    ):
+        logger.warning(f"Invalid callback format: {callback.data[:50]}")
+        await callback.answer("Ошибка данных")
+        return
+    action, box_month, max_id = parts[1], parts[2], int(parts[3])
+    from_status, to_status, notification, label = BULK_TRANSITIONS[action]
+
+    values = {"status": to_status}
+    if to_status == BoxOrderStatus.SHIPPED:
+        values["shipped_at"] = datetime.now(timezone.utc)
+
+    # Одно UPDATE по (box_month, status): повторное нажатие ничего не найдёт.
+    # id <= max_id из превью: предзаказы, появившиеся после него, админ не
+    # видел — их не трогаем и не уведомляем
+    async with get_session() as session:
+        result = await session.execute(
+            update(BoxOrder)
+            .where(
+                BoxOrder.box_month == box_month,
+                BoxOrder.status == from_status,
+                BoxOrder.id <= max_id,
+            )
+            .values(**values)
+            .returning(BoxOrder.telegram_id, BoxOrder.amount)
+            .execution_options(synchronize_session=False)
+        )
+        rows = result.all()
+        if rows:
+            await record_transition(
+                session, COUNTER_BOX, from_status, to_status,
+                sum(amount for _, amount in rows), box_month, count=len(rows),
+            )
+        await session.commit()
+
+    if not rows:
+        await callback.answer("Нечего переводить")
+        return
+
+    logger.info(f"Bulk {action}: {len(rows)} box orders for {box_month}")
+    await callback.answer(f"Готово: {len(rows)}")
+    try:
+        # Рассылка идёт в памяти процесса: при рестарте недоставленные не повторятся
+        status_msg = await callback.message.edit_text(
+            f"✅ {len(rows)} предзаказов за {box_month} отмечены {label}. "
+            f"Рассылаю уведомления...\n"
+            f"Если бот перезапустится до итога, оставшиеся покупатели уведомления не получат."
+        )
+    except TelegramAPIError:
+        status_msg = None
+
+    run_in_background(
+        notify_bulk_transition(
+            bot, status_msg, [telegram_id for telegram_id, _ in rows], notification
+        ),
+        name=f"bulk_{action}_{box_month}",
+    )
+
+
+# ===== РАССЫЛКА (/broadcast) =====
+
+BROADCAST_USAGE = (
+    "Использование:\n"
+    "/broadcast all|reminders|box ГГГГ-ММ\n"
+    "Текст рассылки — со следующей строки того же сообщения."
+)
+
+
+@router.message(Command("broadcast"))
+async def cmd_broadcast(message: Message, config: Config):
+    """Черновик рассылки: превью текста и размер сегмента."""
+    if message.from_user.id != config.admin_id:
+        return
+
+    # html_text — чтобы сохранить форматирование админа
+    first_line, _, body = message.html_text.partition("\n")
+    body = body.strip()
+    try:
+        segment = parse_segment(first_line.partition(" ")[2])
+    except ValueError:
+        await message.answer(BROADCAST_USAGE)
+        return
+    if not body:
+        await message.answer(BROADCAST_USAGE)
+        return
+
+    job_id, count = await create_job(body, segment)
+    if job_id is None:
+        await message.answer(f"В сегменте {segment} нет получателей.")
+        return
+
+    # Превью — отдельным сообщением ровно в том виде, в каком уйдёт
+    await message.answer(body)
+    await message.answer(
+        f"📣 Рассылка #{job_id} → {segment}: {count} получателей.\n"
+        f"Отправить текст выше?",
+        reply_markup=keyboards.admin_broadcast_confirm(job_id, count),
+    )
+
+
+def parse_broadcast_callback(data: str) -> int:
+    """
+    "bc_start_12" / "bc_cancel_12" -> 12.
+
+    Raises:
+        ValueError: неверный формат
+    """
+    parts = data.split("_")
+    if len(parts) != 3:
+        raise ValueError("unexpected format")
+    return int(parts[2])
+
+
+@router.callback_query(F.data.startswith("bc_start_"))
+async def admin_broadcast_start(callback: CallbackQuery, bot: Bot, config: Config):
+    """Запуск рассылки: снимок получателей и фоновая доставка."""
+    if callback.from_user.id != config.admin_id:
+        await callback.answer("Нет доступа")
+        return
+    try:
+        job_id = parse_broadcast_callback(callback.data)
+    except ValueError:
+        logger.warning(f"Invalid callback format: {callback.data[:50]}")
+        await callback.answer("Ошибка данных")
+        return
+
+    total = await start_job(job_id, callback.message.chat.id, callback.message.message_id)
+    if total is None:
+        await callback.answer("Рассылка уже запущена или отменена")
+        return
+
+    await callback.answer(f"Запущено: {total}")
+    try:
+        await callback.message.edit_text(
+            f"📣 Рассылка #{job_id}: запускается, получателей {total}...",
+            reply_markup=keyboards.admin_broadcast_progress(job_id),
+        )
+    except TelegramAPIError:
+        pass
+    run_in_background(deliver(bot, job_id), name=f"broadcast_{job_id}")
+
+
+@router.callback_query(F.data.startswith("bc_cancel_"))
+async def admin_broadcast_cancel(callback: CallbackQuery, config: Config):
+    """Отмена черновика или остановка идущей рассылки."""
+    if callback.from_user.id != config.admin_id:
+        await callback.answer("Нет доступа")
+        return
+    try:
+        job_id = parse_broadcast_callback(callback.data)
+    except ValueError:
+        logger.warning(f"Invalid callback format: {callback.data[:50]}")
+        await callback.answer("Ошибка данных")
+        return
+
+    if not await cancel_job(job_id):
+        await callback.answer("Рассылка уже завершена")
+        return
+
+    # Идущая рассылка остановится после текущего батча и сама обновит прогресс
+    await callback.answer("Остановлено")
+    try:
+        await callback.message.edit_text(f"📣 Рассылка #{job_id} отменена.")
+    except TelegramAPIError:
+        pass
+
+
+# ===== НАГРУЗКА НА БД =====
+
+# Сколько хэндлеров показывать в /dbstats
+DBSTATS_TOP_HANDLERS = 15
+
+
+@router.message(Command("dbstats"))
+async def cmd_dbstats(message: Message, config: Config):
+    """Состояние пула и нагрузка на БД по хэндлерам с момента запуска."""
+    if message.from_user.id != config.admin_id:
+        return
+
+    pool = get_pool_stats()
+    lines = [
+        "Пул соединений:",
+        f"Занято: {pool.get('checked_out', '—')} из {pool.get('size', '—')}, "
+        f"overflow: {pool.get('overflow', '—')}",
+        f"Ожидание: среднее {pool['wait_avg_ms']:.1f} мс, max {pool['wait_max_ms']:.0f} мс, "
+        f"таймаутов {int(pool['timeouts'])}",
+    ]
+
+    admission = get_admission_stats()
+    if admission:
+        lines += [
+            "",
+            "Допуск к БД:",
+            f"Занято слотов: {int(admission['in_use'])} из {int(admission['limit'])}, "
+            f"в очереди: {int(admission['waiting'])}",
+            f"Всего: допущено {int(admission['admitted'])}, ждали {int(admission['queued'])}, "
+            f"отброшено {int(admission['shed'])}, max ожидание {admission['queue_max_ms']:.0f} мс",
+        ]
+
+    snapshot = get_snapshot_stats()
+    if snapshot:
+        taken_at = snapshot["taken_at"]
+        lines += [
+            "",
+            "Снапшот для отчётов:",
+            f"Обновлён: {f'{taken_at:%H:%M:%S} UTC' if taken_at else 'ещё нет'}, "
+            f"за {snapshot['duration_ms']:.0f} мс, {snapshot['size'] // 1024} КБ, "
+            f"ошибок {snapshot['failures']}",
+        ]
+
+    stats = get_query_stats()
+    if not stats:
+        lines.append("\nЗапросов к БД пока не было.")
+        await message.answer("\n".join(lines))
+        return
+
+    top = sorted(stats.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+    lines.append("\nНагрузка на БД по хэндлерам:\n")
+    for handler, s in top[:DBSTATS_TOP_HANDLERS]:
+        lines.append(
+            f"{handler}: {int(s['queries'])} запр., {s['total_ms']:.0f} мс "
+            f"(max {s['max_ms']:.0f} мс, медленных {int(s['slow'])})"
+        )
+
+    await message.answer("\n".join(lines))
 
 
 # ===== СИНХРОНИЗАЦИЯ С NOTION =====
 
 @router.message(Command("sync"))
-async def cmd_sync(message: Message, config: Config):
-    """Синхронизация контента с Notion."""
+async def cmd_sync(message: Message, command: CommandObject, config: Config):
+    """Синхронизация контента с Notion (/sync full — загрузить всё заново)."""
     if message.from_user.id != config.admin_id:
         return
 
+    args = (command.args or "").strip().lower()
+    if args not in ("", "full"):
+        await message.answer("Использование: /sync или /sync full")
+        return
+
     # Проверка конфигурации
     if not config.notion_token:
         await message.answer("NOTION_TOKEN не настроен.\n\nДобавь в .env:\nNOTION_TOKEN=secret_xxx")
@@ -403,11 +1379,14 @@ async def cmd_sync(message: Message, config: Config):
     try:
         # Синхронизируем
         sync_service = NotionSyncService(config)
-        result = await sync_service.sync_all()
+        result = await sync_service.sync_all(full=args == "full")
+        if result["skipped"]:
+            await status_msg.edit_text("Синхронизация уже идёт (другой процесс). Попробуй позже.")
+            return
 
-        # Перезагружаем in-memory кэш
+        # Перезагружаем in-memory кэш (кэш уже загружен — без force reload ничего не делает)
         content_manager = ContentManager.get_instance()
-        await content_manager.reload()
+        await content_manager.reload(force=True)
 
         # Валидация ключей UI
         missing = content_manager.validate_ui_keys()
@@ -415,8 +1394,9 @@ async def cmd_sync(message: Message, config: Config):
         # Формируем отчет
         text = f"""Синхронизация завершена
 
-Контент: {result['content']} записей
-UI тексты: {result['ui_texts']} записей"""
+Контент: {result['content']} изменено
+UI тексты: {result['ui_texts']} изменено
+Удалено: {result['removed']}"""
 
         if missing:
             text += f"\n\n⚠️ Отсутствуют ключи:\n{', '.join(missing[:10])}"
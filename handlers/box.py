@@ -9,6 +9,7 @@
 5. Подтверждение данных
 6. Ссылка на оплату
 """
+import html
 import logging
 from datetime import datetime, timezone
 from aiogram import Router, F, Bot
@@ -17,12 +18,13 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.exceptions import TelegramAPIError
-from sqlalchemy import select
+from sqlalchemy import select, update, Select
 
 import texts
 import keyboards
 from config import Config
-from database import get_session, BoxOrder, BoxOrderStatus
+from database import get_session, User, BoxOrder, BoxOrderStatus, COUNTER_BOX, record_transition
+from notifier import AdminNotifier, BOX_KIND
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -129,6 +131,31 @@ def validate_address(address: str) -> tuple[bool, str]:
     return True, ""
 
 
+def active_box_order_query(telegram_id: int, month_key: str) -> Select:
+    """Активный (не отменённый и не доставленный) предзаказ пользователя на месяц."""
+    return select(BoxOrder).where(
+        BoxOrder.telegram_id == telegram_id,
+        BoxOrder.box_month == month_key,
+        BoxOrder.status.in_([
+            BoxOrderStatus.PENDING,
+            BoxOrderStatus.PAID,
+            BoxOrderStatus.CONFIRMED,
+            BoxOrderStatus.SHIPPED,
+        ])
+    )
+
+
+def latest_pending_box_order_query(telegram_id: int) -> Select:
+    """Последний PENDING предзаказ пользователя (индекс telegram_id, status, created_at)."""
+    return (
+        select(BoxOrder)
+        .where(BoxOrder.telegram_id == telegram_id)
+        .where(BoxOrder.status == BoxOrderStatus.PENDING)
+        .order_by(BoxOrder.created_at.desc())
+        .limit(1)
+    )
+
+
 # ===== НАЧАЛО ПРЕДЗАКАЗА =====
 
 @router.message(Command("box"))
@@ -182,17 +209,8 @@ async def box_start(callback: CallbackQuery, state: FSMContext, config: Config):
         # Проверяем нет ли уже активного заказа на этот месяц
         # with_for_update() блокирует строки до конца транзакции (PostgreSQL)
         existing = await session.execute(
-            select(BoxOrder)
-            .where(
-                BoxOrder.telegram_id == callback.from_user.id,
-                BoxOrder.box_month == month_key,
-                BoxOrder.status.in_([
-                    BoxOrderStatus.PENDING,
-                    BoxOrderStatus.PAID,
-                    BoxOrderStatus.CONFIRMED,
-                    BoxOrderStatus.SHIPPED,
-                ])
-            )
+            active_box_order_query(callback.from_user.id, month_key)
+            .limit(1)
             .with_for_update(skip_locked=True)
         )
         if existing.scalar_one_or_none():
@@ -202,12 +220,17 @@ async def box_start(callback: CallbackQuery, state: FSMContext, config: Config):
         # Создаём заказ в БД сразу (без phone/address — заполним позже)
         order = BoxOrder(
             telegram_id=callback.from_user.id,
+            # user_id подставляется подзапросом в том же INSERT
+            user_id=select(User.id).where(User.telegram_id == callback.from_user.id).scalar_subquery(),
             box_month=month_key,
             amount=config.product_price,
             currency=config.product_currency,
             status=BoxOrderStatus.PENDING
         )
         session.add(order)
+        await record_transition(
+            session, COUNTER_BOX, None, order.status, order.amount, order.box_month
+        )
         await session.commit()
         await session.refresh(order)
         order_id = order.id
@@ -371,14 +394,12 @@ async def confirm_box_order(callback: CallbackQuery, state: FSMContext, config:
 Сумма: {config.product_price} {config.product_currency}
 Telegram: @{callback.from_user.username or "—"}"""
 
-    try:
-        await bot.send_message(
-            config.admin_id,
-            admin_text,
-            reply_markup=keyboards.admin_box_order_menu(order_id)
-        )
-    except TelegramAPIError as e:
-        logger.error(f"Failed to notify admin about box order #{order_id}: {e}")
+    await AdminNotifier.get_instance().notify(
+        admin_text,
+        f"📦 Новый предзаказ #{order_id} — {html.escape(data['name'])}",
+        kind=BOX_KIND,
+        order_id=order_id,
+    )
 
     await callback.answer()
 
@@ -413,13 +434,22 @@ async def box_cancel(callback: CallbackQuery, state: FSMContext):
     # Отменяем заказ в БД если он был создан (ДО очистки state)
     if order_id:
         async with get_session() as session:
+            # Условный UPDATE: если админ или box_paid успели сменить статус,
+            # строка не найдётся и счётчики не тронем
             result = await session.execute(
-                select(BoxOrder).where(BoxOrder.id == order_id)
+                update(BoxOrder)
+                .where(BoxOrder.id == order_id, BoxOrder.status == BoxOrderStatus.PENDING)
+                .values(status=BoxOrderStatus.CANCELLED)
+                .returning(BoxOrder.amount, BoxOrder.box_month)
+                .execution_options(synchronize_session=False)
             )
-            order = result.scalar_one_or_none()
-            if order and order.status == BoxOrderStatus.PENDING:
-                order.status = BoxOrderStatus.CANCELLED
-                await session.commit()
+            row = result.first()
+            if row:
+                await record_transition(
+                    session, COUNTER_BOX, BoxOrderStatus.PENDING, BoxOrderStatus.CANCELLED,
+                    row.amount, row.box_month
+                )
+            await session.commit()
 
     # Очищаем state ПОСЛЕ успешного commit
     await state.clear()
@@ -442,36 +472,36 @@ async def box_user_paid(callback: CallbackQuery, bot: Bot, config: Config):
     _, month_display = get_box_month()
 
     async with get_session() as session:
-        # Row-level lock для предотвращения race condition
-        result = await session.execute(
-            select(BoxOrder)
-            .where(BoxOrder.telegram_id == callback.from_user.id)
-            .where(BoxOrder.status == BoxOrderStatus.PENDING)
-            .order_by(BoxOrder.created_at.desc())
-            .with_for_update()
-        )
+        result = await session.execute(latest_pending_box_order_query(callback.from_user.id))
         order = result.scalar_one_or_none()
 
         if order:
-            # Двойная проверка статуса после получения lock
-            if order.status != BoxOrderStatus.PENDING:
+            # Условный UPDATE: админ или повторное нажатие могли успеть сменить статус
+            result = await session.execute(
+                update(BoxOrder)
+                .where(BoxOrder.id == order.id, BoxOrder.status == BoxOrderStatus.PENDING)
+                .values(status=BoxOrderStatus.PAID, paid_at=datetime.now(timezone.utc))
+                .execution_options(synchronize_session=False)
+            )
+            if not result.rowcount:
                 await callback.answer("Заказ уже обработан")
                 return
 
-            order.status = BoxOrderStatus.PAID
-            order.paid_at = datetime.now(timezone.utc)
+            await record_transition(
+                session, COUNTER_BOX, BoxOrderStatus.PENDING, BoxOrderStatus.PAID,
+                order.amount, order.box_month
+            )
             await session.commit()
             order_id = order.id
 
-            # Уведомляем админа
-            try:
-                await bot.send_message(
-                    config.admin_id,
-                    f"💰 Пользователь отметил оплату предзаказа набора #{order_id}\n\nПроверь и подтверди.",
-                    reply_markup=keyboards.admin_box_order_menu(order_id)
-                )
-            except TelegramAPIError as e:
-                logger.error(f"Failed to notify admin about box payment #{order_id}: {e}")
+            # Уведомляем админа (сразу или в дайджесте)
+            await AdminNotifier.get_instance().notify(
+                f"💰 Пользователь отметил оплату предзаказа набора #{order_id}\n\nПроверь и подтверди.",
+                f"💰 Оплата предзаказа #{order_id}",
+                kind=BOX_KIND,
+                order_id=order_id,
+                paid=True,
+            )
         else:
             await callback.answer("Заказ не найден")
 
@@ -10,6 +10,7 @@ from aiogram.fsm.context import FSMContext
 import texts
 import keyboards
 from content import ContentManager
+from content_format import send_parts
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -22,7 +23,7 @@ async def cmd_breathe(message: Message):
     """Команда /breathe — ссылка на медитацию."""
     content = ContentManager.get_instance()
     breathe_url = await content.get_random_breathe()
-    await message.answer(breathe_url)
+    await send_parts(message.bot, message.chat.id, breathe_url)
 
 
 @router.message(Command("movie"))
@@ -30,7 +31,7 @@ async def cmd_movie(message: Message):
     """Команда /movie — ссылка на фильм."""
     content = ContentManager.get_instance()
     movie_url = await content.get_random_movie()
-    await message.answer(movie_url)
+    await send_parts(message.bot, message.chat.id, movie_url)
 
 
 @router.message(Command("book"))
@@ -38,7 +39,7 @@ async def cmd_book(message: Message):
     """Команда /book — ссылка на книгу."""
     content = ContentManager.get_instance()
     book_url = await content.get_random_book()
-    await message.answer(book_url)
+    await send_parts(message.bot, message.chat.id, book_url)
 
 
 @router.message(Command("settings"))
@@ -74,8 +75,10 @@ async def menu_pause(message: Message, state: FSMContext):
         last_long_pause_type=last_long_pause_type,
     )
 
-    logger.info(f"Sending pause content (type={content_type}): {pause_text[:50]}...")
-    await message.answer(pause_text, reply_markup=keyboards.main_reply_keyboard())
+    logger.info(f"Sending pause content (type={content_type}): {pause_text[0][:50]}...")
+    await send_parts(
+        message.bot, message.chat.id, pause_text, reply_markup=keyboards.main_reply_keyboard()
+    )
 
 
 @router.message(F.text == texts.BTN_MENU_LONG_PAUSE)
@@ -99,8 +102,10 @@ async def menu_long_pause(message: Message, state: FSMContext):
         last_long_pause_type=content_type,
     )
 
-    logger.info(f"Sending long pause content (type={content_type}): {long_content[:50]}...")
-    await message.answer(long_content, reply_markup=keyboards.main_reply_keyboard())
+    logger.info(f"Sending long pause content (type={content_type}): {long_content[0][:50]}...")
+    await send_parts(
+        message.bot, message.chat.id, long_content, reply_markup=keyboards.main_reply_keyboard()
+    )
 
 
 @router.message(F.text == texts.BTN_MENU_NEW_BOX)
@@ -16,7 +16,7 @@ from sqlalchemy import select
 import texts
 import keyboards
 from config import Config
-from database import get_session, User, ReminderFrequency, ReminderTime
+from database import get_session, User, ReminderFrequency, ReminderTime, record_user_created
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -70,8 +70,13 @@ async def get_or_create_user(telegram_id: int, username: str | None, first_name:
                 first_name=first_name
             )
             session.add(user)
+            await record_user_created(session)
             await session.commit()
             await session.refresh(user)
+        elif user.blocked_at is not None:
+            # Снова пишет боту — значит, разблокировал; вернём его в рассылки
+            user.blocked_at = None
+            await session.commit()
 
         # Сохраняем значение до закрытия сессии
         onboarding_completed = user.onboarding_completed
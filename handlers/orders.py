@@ -1,16 +1,18 @@
+import html
 import logging
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.exceptions import TelegramAPIError
-from sqlalchemy import select
+from sqlalchemy import select, update, Select
 from datetime import datetime, timezone
 
 import texts
 import keyboards
 from config import Config
-from database import get_session, Order, OrderStatus
+from database import get_session, User, Order, OrderStatus, COUNTER_ORDER, record_transition
+from notifier import AdminNotifier, ORDER_KIND
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -77,6 +79,17 @@ def validate_address(address: str) -> tuple[bool, str]:
     return True, ""
 
 
+def latest_pending_order_query(telegram_id: int) -> Select:
+    """Последний PENDING заказ пользователя (индекс telegram_id, status, created_at)."""
+    return (
+        select(Order)
+        .where(Order.telegram_id == telegram_id)
+        .where(Order.status == OrderStatus.PENDING)
+        .order_by(Order.created_at.desc())
+        .limit(1)
+    )
+
+
 @router.callback_query(F.data == "order")
 async def start_order(callback: CallbackQuery, state: FSMContext):
     """Начало оформления заказа."""
@@ -167,6 +180,8 @@ async def confirm_order(callback: CallbackQuery, state: FSMContext, config: Conf
     async with get_session() as session:
         order = Order(
             telegram_id=callback.from_user.id,
+            # user_id подставляется подзапросом в том же INSERT
+            user_id=select(User.id).where(User.telegram_id == callback.from_user.id).scalar_subquery(),
             name=data["name"],
             phone=data["contact"],  # поле в БД называется phone
             address=data["address"],
@@ -175,6 +190,7 @@ async def confirm_order(callback: CallbackQuery, state: FSMContext, config: Conf
             status=OrderStatus.PENDING
         )
         session.add(order)
+        await record_transition(session, COUNTER_ORDER, None, order.status, order.amount)
         await session.commit()
         await session.refresh(order)  # Получаем ID после commit
         order_id = order.id
@@ -200,14 +216,12 @@ async def confirm_order(callback: CallbackQuery, state: FSMContext, config: Conf
 Сумма: {config.product_price} {config.product_currency}
 Telegram: @{callback.from_user.username or "—"}"""
 
-    try:
-        await bot.send_message(
-            config.admin_id,
-            admin_text,
-            reply_markup=keyboards.admin_order_menu(order_id)
-        )
-    except TelegramAPIError as e:
-        logger.error(f"Failed to notify admin about order #{order_id}: {e}")
+    await AdminNotifier.get_instance().notify(
+        admin_text,
+        f"🧾 Новый заказ #{order_id} — {html.escape(data['name'])}",
+        kind=ORDER_KIND,
+        order_id=order_id,
+    )
 
     await callback.answer()
 
@@ -234,37 +248,36 @@ async def user_paid(callback: CallbackQuery, bot: Bot, config: Config):
     order_contact = None
 
     async with get_session() as session:
-        # Row-level lock для предотвращения race condition
-        result = await session.execute(
-            select(Order)
-            .where(Order.telegram_id == callback.from_user.id)
-            .where(Order.status == OrderStatus.PENDING)
-            .order_by(Order.created_at.desc())
-            .with_for_update()
-        )
+        result = await session.execute(latest_pending_order_query(callback.from_user.id))
         order = result.scalar_one_or_none()
 
         if order:
-            # Двойная проверка статуса после получения lock
-            if order.status != OrderStatus.PENDING:
+            # Условный UPDATE: админ или повторное нажатие могли успеть сменить статус
+            result = await session.execute(
+                update(Order)
+                .where(Order.id == order.id, Order.status == OrderStatus.PENDING)
+                .values(status=OrderStatus.PAID, paid_at=datetime.now(timezone.utc))
+                .execution_options(synchronize_session=False)
+            )
+            if not result.rowcount:
                 await callback.answer("Заказ уже обработан")
                 return
 
-            order.status = OrderStatus.PAID
-            order.paid_at = datetime.now(timezone.utc)
+            await record_transition(
+                session, COUNTER_ORDER, OrderStatus.PENDING, OrderStatus.PAID, order.amount
+            )
             await session.commit()
             order_contact = order.phone
             order_id = order.id
 
-            # Уведомляем админа (с обработкой ошибок)
-            try:
-                await bot.send_message(
-                    config.admin_id,
-                    f"💰 Пользователь отметил оплату заказа #{order_id}\n\nПроверь и подтверди.",
-                    reply_markup=keyboards.admin_order_menu(order_id)
-                )
-            except TelegramAPIError as e:
-                logger.error(f"Failed to notify admin about payment #{order_id}: {e}")
+            # Уведомляем админа (сразу или в дайджесте)
+            await AdminNotifier.get_instance().notify(
+                f"💰 Пользователь отметил оплату заказа #{order_id}\n\nПроверь и подтверди.",
+                f"💰 Оплата заказа #{order_id}",
+                kind=ORDER_KIND,
+                order_id=order_id,
+                paid=True,
+            )
         else:
             await callback.answer("Заказ не найден")
 
@@ -7,6 +7,7 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
 from content import ContentManager
+from content_format import send_parts
 
 router = Router()
 
@@ -21,7 +22,7 @@ async def cmd_pause(message: Message, state: FSMContext):
     pause_text, content_type = await content.get_random_pause_excluding(last_type)
 
     await state.update_data(last_pause_type=content_type)
-    await message.answer(pause_text)
+    await send_parts(message.bot, message.chat.id, pause_text)
 
 
 @router.callback_query(F.data == "pause_now")
@@ -36,6 +37,6 @@ async def callback_pause_now(callback: CallbackQuery, state: FSMContext):
     await state.update_data(last_pause_type=content_type)
 
     # Паузы — это завершённые действия, отправляем новым сообщением
-    await callback.message.answer(pause_text)
+    await send_parts(callback.bot, callback.message.chat.id, pause_text)
 
     await callback.answer()
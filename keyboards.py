@@ -170,6 +170,87 @@ def admin_box_order_menu(order_id: int) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+def admin_digest(orders: list[tuple[str, int]]) -> InlineKeyboardMarkup:
+    """Кнопки дайджеста: строка на заказ ("order" / "box", order_id)."""
+    builder = InlineKeyboardBuilder()
+    for kind, order_id in orders:
+        prefix, label = ("box_", f"📦 #{order_id}") if kind == "box" else ("", f"#{order_id}")
+        builder.row(
+            InlineKeyboardButton(text=f"✓ {label}", callback_data=f"{prefix}confirm_{order_id}"),
+            InlineKeyboardButton(text=f"✗ {label}", callback_data=f"{prefix}reject_{order_id}")
+        )
+    return builder.as_markup()
+
+
+def admin_digest_bulk(
+    digest_id: str | None, count: int, pending_kinds: list[str]
+) -> InlineKeyboardMarkup:
+    """
+    Дайджест с большим числом заказов: массовое подтверждение оплаченных
+    (если digest_id задан) и браузер /orders с фильтром PENDING по видам
+    заказов из дайджеста ("order" / "box").
+    """
+    builder = InlineKeyboardBuilder()
+    if digest_id is not None:
+        builder.row(
+            InlineKeyboardButton(
+                text=f"✓ Подтвердить все оплаченные ({count})",
+                callback_data=f"digest_paid_{digest_id}"
+            )
+        )
+    for kind in pending_kinds:
+        # Формат OrdersView.data(): ob_{kind}_{status}_{month}_{direction}_{ts}_{id}
+        code, label = ("b", "📦 Наборы") if kind == "box" else ("o", "🧾 Заказы")
+        builder.row(
+            InlineKeyboardButton(
+                text=f"{label}: ожидают оплаты", callback_data=f"ob_{code}_p_0_f_0_0"
+            )
+        )
+    return builder.as_markup()
+
+
+def admin_bulk_confirm(action: str, box_month: str, count: int, max_id: int) -> InlineKeyboardMarkup:
+    """Подтверждение массового перевода предзаказов месяца (не новее max_id из превью)."""
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(
+            text=f"✓ Да, {count} шт.", callback_data=f"bulk_{action}_{box_month}_{max_id}"
+        ),
+        InlineKeyboardButton(text="✗ Отмена", callback_data="bulk_cancel")
+    )
+    return builder.as_markup()
+
+
+def admin_broadcast_confirm(job_id: int, count: int) -> InlineKeyboardMarkup:
+    """Запуск рассылки после превью."""
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text=f"✓ Отправить ({count})", callback_data=f"bc_start_{job_id}"),
+        InlineKeyboardButton(text="✗ Отмена", callback_data=f"bc_cancel_{job_id}")
+    )
+    return builder.as_markup()
+
+
+def admin_broadcast_progress(job_id: int) -> InlineKeyboardMarkup:
+    """Остановка идущей рассылки."""
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="⏹ Остановить", callback_data=f"bc_cancel_{job_id}")
+    )
+    return builder.as_markup()
+
+
+def admin_orders_browser(rows: list[list[tuple[str, str]]]) -> InlineKeyboardMarkup:
+    """Клавиатура браузера /orders: строки кнопок (текст, callback_data)."""
+    builder = InlineKeyboardBuilder()
+    for row in rows:
+        if row:
+            builder.row(*(
+                InlineKeyboardButton(text=text, callback_data=data) for text, data in row
+            ))
+    return builder.as_markup()
+
+
 # ===== ГЛАВНОЕ МЕНЮ (Reply Keyboard) =====
 
 def main_reply_keyboard() -> ReplyKeyboardMarkup:
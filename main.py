@@ -7,7 +7,7 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.types import BotCommand
 
 from config import load_config
-from database import init_db, close_db
+from database import init_db, close_db, init_read_db, close_read_db, ensure_counters
 from handlers import (
     onboarding_router,
     pause_router,
@@ -18,7 +18,9 @@ from handlers import (
 )
 from scheduler import create_scheduler
 from content import ContentManager
-from middleware import ThrottlingMiddleware
+from notifier import AdminNotifier
+from broadcast import resume_broadcasts
+from middleware import ThrottlingMiddleware, HandlerContextMiddleware, DatabaseBusyMiddleware
 
 
 async def main():
@@ -35,7 +37,30 @@ async def main():
         raise ValueError("BOT_TOKEN не установлен")
 
     # Инициализируем базу данных
-    await init_db(config.database_url)
+    await init_db(
+        config.database_url,
+        slow_query_ms=config.slow_query_ms,
+        pool_size=config.db_pool_size,
+        max_overflow=config.db_max_overflow,
+        pool_recycle=config.db_pool_recycle,
+        pool_timeout=config.db_pool_timeout,
+        pool_min_idle=config.db_pool_min_idle,
+        checkout_budget=config.db_checkout_budget,
+        admission_limit=config.db_admission_limit,
+        admission_queue_timeout=config.db_admission_queue_timeout,
+    )
+
+    # Отчётные запросы — на снапшот SQLite или read-replica
+    await init_read_db(
+        config.database_url,
+        read_url=config.database_read_url,
+        snapshot_path=config.snapshot_path,
+        snapshot_enabled=config.snapshot_interval_minutes > 0,
+        slow_query_ms=config.slow_query_ms,
+    )
+
+    # Счётчики /stats: на существующей базе заполняем их один раз
+    await ensure_counters()
 
     # Загружаем кэш контента из SQLite
     content_manager = ContentManager.get_instance()
@@ -55,9 +80,19 @@ async def main():
     # Передаём config во все хэндлеры
     dp["config"] = config
 
+    # Уведомления админу (отдельно или дайджестом)
+    admin_notifier = AdminNotifier.get_instance()
+    admin_notifier.setup(bot, config.admin_id, config.admin_digest_seconds)
+
     # Подключаем middleware
     dp.message.middleware(ThrottlingMiddleware())
     dp.callback_query.middleware(ThrottlingMiddleware())
+    # Привязка SQL-запросов к хэндлеру (для /dbstats и лога медленных запросов)
+    dp.message.middleware(HandlerContextMiddleware())
+    dp.callback_query.middleware(HandlerContextMiddleware())
+    # Перегрузка БД: вместо стектрейса просим пользователя повторить позже
+    dp.message.middleware(DatabaseBusyMiddleware())
+    dp.callback_query.middleware(DatabaseBusyMiddleware())
 
     # Регистрируем роутеры (порядок важен!)
     # 1. Команды и FSM — сначала, чтобы они имели приоритет
@@ -82,8 +117,14 @@ async def main():
     ])
 
     # Создаём и запускаем планировщик напоминаний
-    pause_scheduler = create_scheduler(bot)
+    pause_scheduler = create_scheduler(bot, config)
     pause_scheduler.start()
+    admin_notifier.start()
+    # Кэш контента перечитывается после синхронизации на любой реплике
+    await content_manager.start_watching()
+
+    # Рассылки, прерванные рестартом, продолжаются с checkpoint
+    await resume_broadcasts(bot)
 
     # Обработка сигналов для graceful shutdown
     shutdown_event = asyncio.Event()
@@ -122,7 +163,11 @@ async def main():
         # Cleanup
         logging.info("Останавливаем планировщик...")
         pause_scheduler.stop()
+        await content_manager.stop_watching()
+        # Накопленный дайджест отправляем до закрытия бота
+        await admin_notifier.stop()
         logging.info("Закрываем соединение с БД...")
+        await close_read_db()
         await close_db()
         logging.info("Бот остановлен")
 
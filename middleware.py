@@ -9,6 +9,9 @@ from cachetools import TTLCache
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery, TelegramObject
 
+import texts
+from database import handler_context, DatabaseBusyError
+
 logger = logging.getLogger(__name__)
 
 # Константы для rate limiting
@@ -95,3 +98,51 @@ class ThrottlingMiddleware(BaseMiddleware):
             except Exception:
                 pass
         # Для Message просто игнорируем (не отвечаем чтобы не спамить)
+
+
+class HandlerContextMiddleware(BaseMiddleware):
+    """
+    Выставляет имя хэндлера в contextvar для инструментирования SQL.
+    Регистрируется как inner middleware — к этому моменту хэндлер уже выбран.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        if callback is None:
+            return await handler(event, data)
+
+        name = f"{callback.__module__}.{callback.__name__}"
+        with handler_context(name):
+            return await handler(event, data)
+
+
+class DatabaseBusyMiddleware(BaseMiddleware):
+    """
+    Load shedding: если БД перегружена (DatabaseBusyError из get_session),
+    отвечаем пользователю просьбой повторить, а не ждём и не падаем.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        except DatabaseBusyError as e:
+            logger.warning(f"Request shed, database busy: {e}")
+            try:
+                if isinstance(event, CallbackQuery):
+                    await event.answer(texts.DB_BUSY, show_alert=True)
+                elif isinstance(event, Message):
+                    await event.answer(texts.DB_BUSY)
+            except Exception:
+                pass
+            return None
@@ -0,0 +1,216 @@
+"""
+Уведомления админу с режимом дайджеста.
+
+Без дайджеста (ADMIN_DIGEST_SECONDS=0) каждое событие уходит отдельным
+сообщением с кнопками «Подтвердить» / «Отклонить», как раньше.
+
+В режиме дайджеста события копятся в памяти и раз в N секунд уходят
+одним сообщением: в Telegram один чат принимает около одного сообщения
+в секунду, и на запуске продаж отдельные уведомления упираются в
+RetryAfter. В дайджесте — кнопки по каждому заказу (если их немного)
+или одна кнопка «Подтвердить все оплаченные».
+
+Id дайджеста для массовой кнопки — случайный токен, а не счётчик: после
+рестарта (или на другой реплике) кнопка старого дайджеста не совпадёт
+ни с одним новым и будет отклонена как устаревшая. Токен привязан к
+message_id дайджеста и проверяется вместе с ним.
+
+События с PRIORITY_HIGH дайджест не ждут.
+
+Очередь дайджеста живёт в памяти: при штатной остановке stop() её
+отправляет, а при падении процесса теряются события последних
+ADMIN_DIGEST_SECONDS. Сами заказы в БД — их видно в /orders.
+"""
+import asyncio
+import logging
+import secrets
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+
+import keyboards
+
+logger = logging.getLogger(__name__)
+
+# ===== КОНСТАНТЫ ДАЙДЖЕСТА =====
+DIGEST_HEADER = "🔔 Дайджест"          # По нему хэндлеры узнают сообщение-дайджест
+DIGEST_MAX_LINES = 30                  # Строк событий в одном сообщении
+DIGEST_MAX_ORDER_BUTTONS = 5           # Больше заказов — только массовая кнопка
+DIGEST_KEEP = 50                       # Сколько последних дайджестов помнит массовая кнопка
+DIGEST_ID_BYTES = 8                    # Токен id дайджеста (hex в callback_data)
+
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 1
+
+ORDER_KIND = "order"
+BOX_KIND = "box"
+
+
+@dataclass
+class AdminEvent:
+    """Событие для админа."""
+    text: str                   # Полный текст (отдельным сообщением)
+    summary: str                # Одна строка для дайджеста (HTML-экранирована)
+    kind: str | None = None     # ORDER_KIND / BOX_KIND, если событие про заказ
+    order_id: int | None = None
+    paid: bool = False          # Пользователь отметил оплату
+
+
+class AdminNotifier:
+    """Отправка событий админу (singleton)."""
+
+    _instance: "AdminNotifier | None" = None
+
+    def __init__(self):
+        self.bot: Bot | None = None
+        self.admin_id = 0
+        self.digest_seconds = 0
+        self._pending: list[AdminEvent] = []
+        self._task: asyncio.Task | None = None
+        # digest_id -> (message_id дайджеста, [(kind, order_id)] оплаченных заказов)
+        self._paid_by_digest: OrderedDict[str, tuple[int, list[tuple[str, int]]]] = OrderedDict()
+
+    @classmethod
+    def get_instance(cls) -> "AdminNotifier":
+        """Получить singleton instance."""
+        if cls._instance is None:
+            cls._instance = AdminNotifier()
+        return cls._instance
+
+    def setup(self, bot: Bot, admin_id: int, digest_seconds: int = 0):
+        """Привязать бота и режим (вызывается из main.py)."""
+        self.bot = bot
+        self.admin_id = admin_id
+        self.digest_seconds = digest_seconds
+
+    def start(self):
+        """Запустить фоновую отправку дайджестов."""
+        if self.digest_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="admin_digest")
+            logger.info(f"Admin digest every {self.digest_seconds}s")
+
+    async def stop(self):
+        """Остановить отправку и выслать накопленное."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def notify(
+        self,
+        text: str,
+        summary: str,
+        kind: str | None = None,
+        order_id: int | None = None,
+        paid: bool = False,
+        priority: int = PRIORITY_NORMAL,
+    ):
+        """Отправить событие сразу или положить в дайджест."""
+        event = AdminEvent(text, summary, kind, order_id, paid)
+        if self._task is None or priority == PRIORITY_HIGH:
+            await self._send_now(event)
+        else:
+            self._pending.append(event)
+
+    async def _send_now(self, event: AdminEvent):
+        if self.bot is None:
+            logger.warning(f"Admin notifier not configured, dropped: {event.summary}")
+            return
+
+        reply_markup = None
+        if event.kind == ORDER_KIND:
+            reply_markup = keyboards.admin_order_menu(event.order_id)
+        elif event.kind == BOX_KIND:
+            reply_markup = keyboards.admin_box_order_menu(event.order_id)
+
+        try:
+            await self.bot.send_message(self.admin_id, event.text, reply_markup=reply_markup)
+        except TelegramAPIError as e:
+            logger.error(f"Failed to notify admin: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.digest_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Admin digest failed")
+
+    async def flush(self):
+        """Отправить накопленные события одним сообщением."""
+        if not self._pending or self.bot is None:
+            return
+        events, self._pending = self._pending, []
+
+        text, reply_markup, digest_id, paid = self._render(events)
+        try:
+            message = await self.bot.send_message(self.admin_id, text, reply_markup=reply_markup)
+        except TelegramRetryAfter as e:
+            # Вернём события в начало очереди — уйдут следующим дайджестом
+            logger.warning(f"Admin digest delayed by flood control ({e.retry_after}s)")
+            self._pending = events + self._pending
+        except TelegramAPIError as e:
+            logger.error(f"Failed to send admin digest ({len(events)} events): {e}")
+        else:
+            if digest_id is not None:
+                self._paid_by_digest[digest_id] = (message.message_id, paid)
+                while len(self._paid_by_digest) > DIGEST_KEEP:
+                    self._paid_by_digest.popitem(last=False)
+
+    def _render(
+        self, events: list[AdminEvent]
+    ) -> tuple[str, InlineKeyboardMarkup | None, str | None, list[tuple[str, int]]]:
+        """
+        Текст и клавиатура дайджеста.
+
+        Returns:
+            (текст, клавиатура, id для массовой кнопки или None, оплаченные заказы)
+        """
+        lines = [f"{DIGEST_HEADER}: {len(events)} событий\n"]
+        lines += [event.summary for event in events[:DIGEST_MAX_LINES]]
+        if len(events) > DIGEST_MAX_LINES:
+            lines.append(f"… и ещё {len(events) - DIGEST_MAX_LINES} (см. /orders)")
+
+        # Один заказ может встретиться дважды: создан и оплачен
+        orders = list(dict.fromkeys(
+            (event.kind, event.order_id) for event in events if event.kind
+        ))
+        paid = list(dict.fromkeys(
+            (event.kind, event.order_id) for event in events if event.kind and event.paid
+        ))
+
+        text = "\n".join(lines)
+        if not orders:
+            return text, None, None, []
+        if len(orders) <= DIGEST_MAX_ORDER_BUTTONS:
+            return text, keyboards.admin_digest(orders), None, []
+
+        # Неоплаченные без кнопок по заказу — ссылка на /orders с фильтром PENDING,
+        # иначе без оплаченных в дайджесте не было бы ни одной кнопки
+        paid_set = set(paid)
+        pending_kinds = list(dict.fromkeys(
+            kind for kind, order_id in orders if (kind, order_id) not in paid_set
+        ))
+        digest_id = secrets.token_hex(DIGEST_ID_BYTES) if paid else None
+        reply_markup = keyboards.admin_digest_bulk(digest_id, len(paid), pending_kinds)
+        return text, reply_markup, digest_id, paid
+
+    def paid_orders(self, digest_id: str, message_id: int) -> list[tuple[str, int]] | None:
+        """
+        Оплаченные заказы дайджеста для массового подтверждения.
+
+        None — дайджест неизвестен (устарел, отправлен до рестарта или
+        другой репликой) или кнопка нажата не в том сообщении.
+        """
+        entry = self._paid_by_digest.get(digest_id)
+        if entry is None or entry[0] != message_id:
+            return None
+        del self._paid_by_digest[digest_id]
+        return entry[1]
@@ -0,0 +1,151 @@
+"""
+HTTP-клиент Notion API.
+
+Notion разрешает интеграции в среднем ~3 запроса в секунду и при
+превышении отвечает 429 с Retry-After. Все запросы процесса берут слот
+у общего RateLimiter (fanout.py), а 429 ставит на паузу весь лимитер,
+а не один запрос. 5xx и сетевые ошибки повторяются с экспоненциальной
+задержкой — но только для идемпотентных запросов. POST /pages после
+таймаута чтения или 5xx мог уже создать страницу, поэтому неидемпотентный
+запрос повторяется лишь на 429 и ошибках соединения (запрос не ушёл).
+Если установлен пакет h2, клиент работает по HTTP/2 и параллельные
+запросы идут по одному соединению.
+"""
+import asyncio
+import importlib.util
+import logging
+import random
+from typing import Any
+
+import httpx
+
+from fanout import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# ===== КОНСТАНТЫ NOTION API =====
+NOTION_API_URL = "https://api.notion.com/v1"
+NOTION_VERSION = "2022-06-28"
+NOTION_RATE = 3                 # Запросов в секунду на интеграцию
+NOTION_TIMEOUT = 30.0
+NOTION_MAX_RETRIES = 5
+NOTION_BACKOFF_BASE = 1.0       # Секунды; удваивается с каждой попыткой
+NOTION_BACKOFF_MAX = 30.0
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Неидемпотентный запрос: ответ, после которого Notion точно ничего не сделал
+UNSAFE_RETRY_STATUSES = frozenset({429})
+# Ошибки до отправки запроса — повторять безопасно всегда
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# HTTP/2 в httpx — опциональная зависимость (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Лимит общий на процесс: токен интеграции один
+_limiter = RateLimiter(NOTION_RATE)
+
+
+class NotionAPIError(Exception):
+    """Notion ответил ошибкой, которую не исправить повтором (или повторы кончились)."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Notion API error: {status_code}")
+        self.status_code = status_code
+
+
+def retry_delay(response: httpx.Response | None, attempt: int) -> float:
+    """Задержка перед повтором: Retry-After, иначе экспонента с джиттером."""
+    if response is not None:
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            pass
+    delay = min(NOTION_BACKOFF_BASE * 2 ** attempt, NOTION_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1)
+
+
+class NotionClient:
+    """Запросы к Notion API через общий лимитер, с повторами."""
+
+    def __init__(self, token: str, base_url: str = NOTION_API_URL, limiter: RateLimiter | None = None):
+        self.token = token
+        self.base_url = base_url
+        self.limiter = limiter or _limiter
+        self._client: httpx.AsyncClient | None = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Получить или создать HTTP клиент."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "Authorization": f"Bearer {self.token}",
+                    "Notion-Version": NOTION_VERSION,
+                    "Content-Type": "application/json",
+                },
+                timeout=NOTION_TIMEOUT,
+                http2=HTTP2_AVAILABLE,
+            )
+        return self._client
+
+    async def close(self):
+        """Закрыть HTTP клиент."""
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(
+        self, method: str, path: str, idempotent: bool | None = None, **kwargs
+    ) -> dict[str, Any]:
+        """
+        Выполнить запрос и вернуть JSON ответа.
+
+        Args:
+            idempotent: Можно ли повторять после 5xx и обрыва (по умолчанию —
+                всё, кроме POST; чтение через POST передаёт True)
+
+        Raises:
+            NotionAPIError: ошибка 4xx или исчерпаны повторы
+            httpx.TransportError: сеть недоступна после всех повторов
+        """
+        client = self._get_client()
+        if idempotent is None:
+            idempotent = method.upper() != "POST"
+        retry_statuses = RETRY_STATUSES if idempotent else UNSAFE_RETRY_STATUSES
+        attempt = 0
+        while True:
+            await self.limiter.wait()
+            try:
+                response = await client.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                if attempt == NOTION_MAX_RETRIES or not (idempotent or isinstance(e, NOT_SENT_ERRORS)):
+                    raise
+                delay = retry_delay(None, attempt)
+                logger.warning(f"Notion request failed ({e!r}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code not in retry_statuses or attempt == NOTION_MAX_RETRIES:
+                # Не логируем полный response body — может содержать sensitive data
+                logger.error(f"Notion API error: {response.status_code}")
+                raise NotionAPIError(response.status_code)
+
+            delay = retry_delay(response, attempt)
+            logger.warning(f"Notion API {response.status_code}, retrying in {delay:.1f}s")
+            if response.status_code == 429:
+                # Лимит на интеграцию — тормозим все запросы процесса
+                self.limiter.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+            attempt += 1
+
+    async def query_database(
+        self, database_id: str, body: dict, params: dict | None = None
+    ) -> dict[str, Any]:
+        """Одна страница результатов POST /databases/{id}/query."""
+        return await self.request(
+            "POST", f"/databases/{database_id}/query", idempotent=True, params=params, json=body
+        )
@@ -1,121 +1,223 @@
 """
 Синхронизация контента с Notion.
+
+Синхронизация инкрементальная: для каждой базы хранится водяной знак
+(NotionSyncState.last_edited_time), и из Notion запрашиваются только
+страницы, изменённые не раньше него. Изменения применяются как upsert
+по notion_page_id.
+
+Удалённые и архивные страницы в выборку изменений не попадают, поэтому
+раз в NOTION_RECONCILE_INTERVAL список живых страниц сверяется целиком —
+запросом только id (filter_properties), без свойств страниц.
+
+Первая синхронизация базы и /sync full загружают все страницы. Они
+пишутся в теневую таблицу (*_shadow) и переносятся в живую одной короткой
+транзакцией: ContentManager.reload видит либо старый, либо новый кэш,
+а запись в живую таблицу длится миллисекунды, а не всю синхронизацию.
+
+Перед переносом теневой таблицы сравниваются хэши её содержимого и живой
+таблицы: если ничего не изменилось, живая таблица не трогается, а
+sync_changed() сообщает, что перезагружать кэш не нужно. Синхронизация с
+изменениями увеличивает content_version — по ней кэш перечитывают все реплики.
+
+Страницы обрабатываются потоком: пока пачка из NOTION_PAGE_SIZE страниц
+разбирается и пишется в БД, следующая уже запрашивается. В памяти не
+больше SYNC_PIPELINE_DEPTH пачек, независимо от размера базы.
+
+Тексты проверяются при разборе (content_format.py): UI текст с битым
+{placeholder} или длиннее лимита Telegram в кэш не попадает, о контенте
+длиннее лимита пишется предупреждение — он уйдёт несколькими сообщениями.
 """
+import asyncio
+import hashlib
 import logging
-from typing import Any
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable
 
-import httpx
-from sqlalchemy import delete
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import Config
-from database import get_session, ContentCache, UITextCache
+from content_format import TELEGRAM_MESSAGE_LIMIT, prepare_content, prepare_ui_text
+from notion_client import NotionClient
+from database import (
+    get_session,
+    ContentCache,
+    UITextCache,
+    ContentCacheShadow,
+    UITextCacheShadow,
+    NotionSyncState,
+    bump_content_version,
+    try_lock,
+    NOTION_SYNC_LOCK_KEY,
+)
 
 logger = logging.getLogger(__name__)
 
+# ===== КОНСТАНТЫ СИНХРОНИЗАЦИИ =====
+NOTION_PAGE_SIZE = 100
+# Как часто сверять список страниц целиком (ловит удалённые в Notion страницы)
+NOTION_RECONCILE_INTERVAL = timedelta(hours=1)
+# Для id-only запроса: у title-свойства в любой базе id "title"
+NOTION_ID_ONLY_PROPERTY = "title"
+# Строк в одном IN (...) при удалении и поиске существующих записей
+SYNC_CHUNK_SIZE = 500
+# Пачек страниц, ожидающих записи, пока запрашиваются следующие
+SYNC_PIPELINE_DEPTH = 2
+
+CONTENT_ACTIVE_FILTER = {"property": "Active", "checkbox": {"equals": True}}
+
+# Живая таблица -> (теневая таблица, уникальная колонка живой таблицы)
+SHADOW_TABLES = {
+    ContentCache: (ContentCacheShadow, "notion_page_id"),
+    UITextCache: (UITextCacheShadow, "key"),
+}
+
+def parse_notion_time(value: str | None) -> datetime | None:
+    """ISO-время Notion ("2026-03-01T10:00:00.000Z") -> aware datetime."""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    """SQLite возвращает naive datetime — считаем его UTC."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def sync_changed(result: dict[str, Any]) -> bool:
+    """Изменила ли синхронизация кэш (результат sync_all)."""
+    return bool(result["content"] or result["ui_texts"] or result["removed"])
+
+
+def _chunks(items: list, size: int = SYNC_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def _execute_chunks(session: AsyncSession, statement, rows: list[dict]) -> None:
+    """executemany по SYNC_CHUNK_SIZE строк, с временем каждого чанка в логе."""
+    for chunk in _chunks(rows):
+        started = time.monotonic()
+        await session.execute(statement, chunk)
+        logger.debug(
+            f"{statement.table.name}: {len(chunk)} rows in "
+            f"{(time.monotonic() - started) * 1000:.1f} ms"
+        )
+
 
 class NotionSyncService:
     """Сервис синхронизации контента с Notion."""
 
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, client: NotionClient | None = None):
         self.config = config
-        self._client: httpx.AsyncClient | None = None
-
-    async def _get_client(self) -> httpx.AsyncClient:
-        """Получить или создать HTTP клиент."""
-        if self._client is None:
-            self._client = httpx.AsyncClient(
-                base_url="https://api.notion.com/v1",
-                headers={
-                    "Authorization": f"Bearer {self.config.notion_token}",
-                    "Notion-Version": "2022-06-28",
-                    "Content-Type": "application/json",
-                },
-                timeout=30.0,
-            )
-        return self._client
+        self.client = client or NotionClient(config.notion_token)
 
     async def close(self):
         """Закрыть HTTP клиент."""
-        if self._client:
-            await self._client.aclose()
-            self._client = None
+        await self.client.close()
 
-    async def sync_all(self) -> dict[str, Any]:
+    async def sync_all(self, full: bool = False) -> dict[str, Any]:
         """
-        Полная синхронизация всех данных.
+        Синхронизация всех данных.
+
+        Args:
+            full: Загрузить все страницы, игнорируя водяные знаки
 
         Returns:
-            dict с ключами: content (int), ui_texts (int), errors (list[str])
+            dict с ключами: content (int), ui_texts (int) — изменённые записи,
+            removed (int) — удалённые записи, errors (list[str]),
+            skipped (bool) — синхронизация уже идёт в другом процессе
         """
-        result = {"content": 0, "ui_texts": 0, "errors": []}
-
-        try:
-            if self.config.notion_content_db:
-                content_count = await self._sync_content()
-                result["content"] = content_count
-                logger.info(f"Synced {content_count} content items")
-            else:
-                result["errors"].append("NOTION_CONTENT_DB не настроен")
-        except Exception as e:
-            logger.exception("Content sync failed")
-            result["errors"].append(f"Контент: {e}")
+        # Одна синхронизация на все реплики: теневые таблицы и водяные знаки общие
+        async with try_lock(NOTION_SYNC_LOCK_KEY) as acquired:
+            if not acquired:
+                logger.info("Notion sync is already running elsewhere, skipping")
+                return {**self._empty_result(), "skipped": True}
+            return await self._sync_all(full)
+
+    @staticmethod
+    def _empty_result() -> dict[str, Any]:
+        return {"content": 0, "ui_texts": 0, "removed": 0, "errors": [], "skipped": False}
+
+    async def _sync_all(self, full: bool) -> dict[str, Any]:
+        result = self._empty_result()
+
+        async def run(key: str, label: str, setting: str, database_id: str, sync):
+            if not database_id:
+                result["errors"].append(f"{setting} не настроен")
+                return
+            try:
+                count, removed = await sync(full)
+            except Exception as e:
+                logger.exception(f"Sync of {key} failed")
+                result["errors"].append(f"{label}: {e}")
+                return
+            result[key] = count
+            result["removed"] += removed
+            logger.info(f"Synced {count} {key}, removed {removed}")
+
+        # Базы независимы — запрашиваем параллельно, темп держит общий лимитер клиента
+        await asyncio.gather(
+            run("content", "Контент", "NOTION_CONTENT_DB",
+                self.config.notion_content_db, self._sync_content),
+            run("ui_texts", "UI тексты", "NOTION_UI_TEXTS_DB",
+                self.config.notion_ui_texts_db, self._sync_ui_texts),
+        )
 
-        try:
-            if self.config.notion_ui_texts_db:
-                ui_count = await self._sync_ui_texts()
-                result["ui_texts"] = ui_count
-                logger.info(f"Synced {ui_count} UI texts")
-            else:
-                result["errors"].append("NOTION_UI_TEXTS_DB не настроен")
-        except Exception as e:
-            logger.exception("UI texts sync failed")
-            result["errors"].append(f"UI тексты: {e}")
+        # Остальные реплики перечитают кэш по новой версии
+        if sync_changed(result):
+            try:
+                await bump_content_version()
+            except Exception as e:
+                logger.exception("Content version bump failed")
+                result["errors"].append(f"Версия контента: {e}")
 
         await self.close()
         return result
 
-    async def _fetch_all_pages(
-        self, database_id: str, filter_obj: dict | None = None
-    ) -> list[dict]:
+    async def _iter_pages(
+        self,
+        database_id: str,
+        filter_obj: dict | None = None,
+        filter_properties: list[str] | None = None,
+    ) -> AsyncIterator[list[dict]]:
         """
-        Получить все страницы из базы с пагинацией.
+        Страницы базы пачками по NOTION_PAGE_SIZE — по мере получения.
 
         Args:
             database_id: ID базы данных Notion
             filter_obj: Опциональный фильтр для запроса
-
-        Returns:
-            Список всех страниц
+            filter_properties: Вернуть только эти свойства страниц
         """
-        client = await self._get_client()
-        pages = []
+        params = {"filter_properties": filter_properties} if filter_properties else None
         start_cursor = None
 
         while True:
-            body: dict[str, Any] = {"page_size": 100}
+            body: dict[str, Any] = {"page_size": NOTION_PAGE_SIZE}
             if start_cursor:
                 body["start_cursor"] = start_cursor
             if filter_obj:
                 body["filter"] = filter_obj
 
-            response = await client.post(
-                f"/databases/{database_id}/query",
-                json=body,
-            )
-
-            if response.status_code != 200:
-                # Не логируем полный response body — может содержать sensitive data
-                logger.error(f"Notion API error: {response.status_code}")
-                raise Exception(f"Notion API error: {response.status_code}")
-
-            data = response.json()
-            pages.extend(data.get("results", []))
+            data = await self.client.query_database(database_id, body, params)
+            yield data.get("results", [])
 
             if not data.get("has_more"):
                 break
             start_cursor = data.get("next_cursor")
 
-        return pages
+    async def _fetch_page_ids(self, database_id: str, filter_obj: dict | None = None) -> set[str]:
+        """id живых страниц базы — без содержимого свойств."""
+        ids = set()
+        async for batch in self._iter_pages(
+            database_id, filter_obj, filter_properties=[NOTION_ID_ONLY_PROPERTY]
+        ):
+            ids.update(page["id"] for page in batch)
+        return ids
 
     def _extract_rich_text(self, blocks: list) -> str:
         """
@@ -145,98 +247,382 @@ class NotionSyncService:
         """Извлечь значение из Checkbox property."""
         return checkbox_value is True
 
-    async def _sync_content(self) -> int:
+    # ===== РАЗБОР СТРАНИЦ =====
+
+    def _parse_content_page(self, page: dict) -> dict | None:
+        """Строка ContentCache из страницы или None (страницу в кэше не держим)."""
+        props = page.get("properties", {})
+
+        # В выборку изменений попадают и выключенные страницы
+        if not self._extract_checkbox(props.get("Active", {}).get("checkbox")):
+            return None
+
+        # Type (Select)
+        content_type = self._extract_select(props.get("Type", {}).get("select"))
+        if not content_type:
+            logger.warning(f"Page {page['id']} has no Type, skipping")
+            return None
+
+        # Content (Rich Text)
+        content = self._extract_rich_text(props.get("Content", {}).get("rich_text", []))
+        if not content:
+            logger.warning(f"Page {page['id']} has no Content, skipping")
+            return None
+
+        # Проверка при загрузке: длинный текст уйдёт несколькими сообщениями
+        parts = prepare_content(content)
+        if len(parts) > 1:
+            logger.warning(
+                f"Page {page['id']} is longer than {TELEGRAM_MESSAGE_LIMIT} characters, "
+                f"will be sent as {len(parts)} messages"
+            )
+
+        return {
+            "content_type": content_type,
+            "content": content,
+            "notion_page_id": page["id"],
+            "is_active": True,
+        }
+
+    def _parse_ui_page(self, page: dict) -> dict | None:
+        """Строка UITextCache из страницы или None."""
+        props = page.get("properties", {})
+
+        # Key (Title)
+        key = self._extract_title(props.get("Key", {}).get("title", []))
+        if not key:
+            logger.warning(f"UI page {page['id']} has no Key, skipping")
+            return None
+
+        # Text (Rich Text)
+        text = self._extract_rich_text(props.get("Text", {}).get("rich_text", []))
+
+        # Текст, который нельзя отправить, в кэш не берём — бот покажет fallback
+        try:
+            prepare_ui_text(text)
+        except ValueError as e:
+            logger.warning(f"UI page {page['id']} ({key}): {e}, skipping")
+            return None
+
+        return {"key": key, "text": text, "notion_page_id": page["id"]}
+
+    # ===== ИНКРЕМЕНТАЛЬНАЯ СИНХРОНИЗАЦИЯ =====
+
+    async def _load_state(self, database_id: str) -> NotionSyncState | None:
+        async with get_session() as session:
+            return await session.get(NotionSyncState, database_id)
+
+    async def _save_state(
+        self, database_id: str, watermark: datetime | None, reconciled_at: datetime | None
+    ):
+        async with get_session() as session:
+            state = await session.get(NotionSyncState, database_id)
+            if state is None:
+                state = NotionSyncState(database_id=database_id)
+                session.add(state)
+            state.last_edited_time = watermark
+            state.reconciled_at = reconciled_at
+            state.updated_at = datetime.now(timezone.utc)
+            await session.commit()
+
+    async def _sync_database(
+        self,
+        database_id: str,
+        model,
+        parse: Callable[[dict], dict | None],
+        live_filter: dict | None,
+        full: bool,
+    ) -> tuple[int, int]:
         """
-        Синхронизация базы контента.
+        Применить изменения базы Notion к таблице кэша.
 
         Returns:
-            Количество синхронизированных записей
+            (изменённые записи, удалённые записи)
         """
-        # Получаем только активные записи
-        pages = await self._fetch_all_pages(
-            self.config.notion_content_db,
-            filter_obj={"property": "Active", "checkbox": {"equals": True}},
-        )
+        state = None if full else await self._load_state(database_id)
+        watermark = _as_utc(state.last_edited_time) if state else None
+        reconciled_at = _as_utc(state.reconciled_at) if state else None
+        now = datetime.now(timezone.utc)
+
+        if watermark is None:
+            filter_obj = live_filter
+            shadow, _ = SHADOW_TABLES[model]
+            await self._clear_shadow(shadow)
+        else:
+            # Время в Notion округлено до минуты — берём on_or_after,
+            # повторно пришедшие страницы upsert применит без изменений
+            filter_obj = {
+                "timestamp": "last_edited_time",
+                "last_edited_time": {"on_or_after": watermark.isoformat()},
+            }
+
+        changed = removed_count = loaded = 0
+        new_watermark = watermark
+        async for batch in self._pipeline(database_id, filter_obj):
+            upserts, removed, edited = self._parse_batch(batch, parse)
+            if edited and (new_watermark is None or edited > new_watermark):
+                new_watermark = edited
+            if watermark is None:
+                await self._write_shadow(shadow, upserts)
+                loaded += len(upserts)
+            else:
+                batch_changed, batch_removed = await self._apply_changes(model, upserts, removed, None)
+                changed += batch_changed
+                removed_count += batch_removed
+
+        if watermark is None:
+            # Полная загрузка сама является сверкой
+            if not loaded:
+                # Пустой ответ скорее ошибка настройки базы, чем пустой контент
+                raise ValueError(f"Notion вернул 0 записей, {model.__tablename__} не заменён")
+            changed, removed_count = await self._swap_shadow(model)
+            reconciled_at = now
+        elif reconciled_at is None or now - reconciled_at >= NOTION_RECONCILE_INTERVAL:
+            # Иначе — id-only проход по расписанию
+            live_ids = await self._fetch_page_ids(database_id, live_filter)
+            _, batch_removed = await self._apply_changes(model, [], set(), live_ids)
+            removed_count += batch_removed
+            reconciled_at = now
+
+        await self._save_state(database_id, new_watermark, reconciled_at)
+        return changed, removed_count
+
+    async def _pipeline(self, database_id: str, filter_obj: dict | None) -> AsyncIterator[list[dict]]:
+        """
+        Пачки страниц через очередь: запрос следующей пачки идёт,
+        пока потребитель разбирает и пишет текущую.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SYNC_PIPELINE_DEPTH)
+
+        async def produce():
+            try:
+                async for batch in self._iter_pages(database_id, filter_obj):
+                    await queue.put(batch)
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(None)
 
-        async with get_session() as session:
-            # Очищаем старый кэш
-            await session.execute(delete(ContentCache))
-
-            count = 0
-            for page in pages:
-                try:
-                    props = page.get("properties", {})
-
-                    # Type (Select)
-                    content_type = self._extract_select(props.get("Type", {}).get("select"))
-                    if not content_type:
-                        logger.warning(f"Page {page['id']} has no Type, skipping")
-                        continue
-
-                    # Content (Rich Text)
-                    content = self._extract_rich_text(
-                        props.get("Content", {}).get("rich_text", [])
-                    )
-                    if not content:
-                        logger.warning(f"Page {page['id']} has no Content, skipping")
-                        continue
-
-                    cache_entry = ContentCache(
-                        content_type=content_type,
-                        content=content,
-                        notion_page_id=page["id"],
-                        is_active=True,
-                    )
-                    session.add(cache_entry)
-                    count += 1
+        producer = asyncio.create_task(produce())
+        try:
+            while (item := await queue.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            producer.cancel()
+
+    def _parse_batch(
+        self, pages: list[dict], parse: Callable[[dict], dict | None]
+    ) -> tuple[list[dict], set[str], datetime | None]:
+        """
+        Разобрать пачку страниц.
 
-                except Exception as e:
-                    logger.warning(f"Failed to parse content page {page.get('id')}: {e}")
+        Returns:
+            (строки для upsert, id страниц к удалению, самый поздний last_edited_time)
+        """
+        upserts: list[dict] = []
+        removed: set[str] = set()
+        latest = None
+        for page in pages:
+            edited = parse_notion_time(page.get("last_edited_time"))
+            if edited and (latest is None or edited > latest):
+                latest = edited
+            try:
+                row = None if page.get("archived") or page.get("in_trash") else parse(page)
+            except Exception as e:
+                logger.warning(f"Failed to parse page {page.get('id')}: {e}")
+                continue
+            if row is None:
+                removed.add(page["id"])
+            else:
+                upserts.append(row)
+        return upserts, removed, latest
 
+    async def _clear_shadow(self, shadow):
+        async with get_session() as session:
+            await session.execute(delete(shadow))
             await session.commit()
 
-        return count
+    async def _write_shadow(self, shadow, rows: list[dict]):
+        """Дописать пачку строк в теневую таблицу."""
+        if not rows:
+            return
+        now = datetime.now(timezone.utc)
+        async with get_session() as session:
+            await _execute_chunks(
+                session, insert(shadow), [{**values, "updated_at": now} for values in rows]
+            )
+            await session.commit()
 
-    async def _sync_ui_texts(self) -> int:
+    async def _swap_shadow(self, model) -> tuple[int, int]:
         """
-        Синхронизация базы UI текстов.
+        Заменить содержимое живой таблицы теневой — одной транзакцией.
 
         Returns:
-            Количество синхронизированных записей
+            (записей в таблице после замены, удалённые записи);
+            (0, 0), если содержимое не изменилось
         """
-        pages = await self._fetch_all_pages(self.config.notion_ui_texts_db)
+        shadow, unique_column = SHADOW_TABLES[model]
+        # При дублях уникальной колонки побеждает последняя записанная строка
+        columns = [column.name for column in shadow.__table__.columns if column.name != "id"]
+        shadow_key = getattr(shadow, unique_column)
+        latest = shadow.id.in_(select(func.max(shadow.id)).group_by(shadow_key))
+
+        if await self._table_hash(shadow, unique_column, latest) == await self._table_hash(
+            model, unique_column
+        ):
+            await self._clear_shadow(shadow)
+            logger.info(f"{model.__tablename__} unchanged, swap skipped")
+            return 0, 0
 
         async with get_session() as session:
-            # Очищаем старый кэш
-            await session.execute(delete(UITextCache))
-
-            count = 0
-            for page in pages:
-                try:
-                    props = page.get("properties", {})
-
-                    # Key (Title)
-                    key = self._extract_title(props.get("Key", {}).get("title", []))
-                    if not key:
-                        logger.warning(f"UI page {page['id']} has no Key, skipping")
-                        continue
-
-                    # Text (Rich Text)
-                    text = self._extract_rich_text(
-                        props.get("Text", {}).get("rich_text", [])
-                    )
+            removed = (await session.execute(
+                select(func.count())
+                .select_from(model)
+                .where(getattr(model, unique_column).not_in(select(shadow_key)))
+            )).scalar_one()
+
+            started = time.monotonic()
+            await session.execute(delete(model))
+            result = await session.execute(
+                insert(model).from_select(
+                    columns,
+                    select(*(shadow.__table__.c[name] for name in columns)).where(latest),
+                )
+            )
+            await session.commit()
+            swap_ms = (time.monotonic() - started) * 1000
 
-                    cache_entry = UITextCache(
-                        key=key,
-                        text=text,
-                        notion_page_id=page["id"],
+            await session.execute(delete(shadow))
+            await session.commit()
+
+        logger.info(f"Swapped {result.rowcount} rows into {model.__tablename__} in {swap_ms:.0f} ms")
+        return result.rowcount, removed
+
+    async def _table_hash(self, model, unique_column: str, where=None) -> str:
+        """sha256 содержимого таблицы кэша (без id и updated_at) в порядке unique_column."""
+        columns = [
+            column for column in model.__table__.columns if column.name not in ("id", "updated_at")
+        ]
+        statement = select(*columns).order_by(model.__table__.c[unique_column])
+        if where is not None:
+            statement = statement.where(where)
+
+        digest = hashlib.sha256()
+        async with get_session() as session:
+            async for row in await session.stream(statement):
+                digest.update(repr(tuple(row)).encode())
+                digest.update(b"\n")
+        return digest.hexdigest()
+
+    async def _apply_changes(
+        self, model, upserts: list[dict], removed: set[str], live_ids: set[str] | None
+    ) -> tuple[int, int]:
+        """Upsert по notion_page_id и удаление пропавших страниц — одной транзакцией."""
+        # UI-тексты уникальны по key: при дублях побеждает последняя страница
+        if model is UITextCache:
+            upserts = list({row["key"]: row for row in upserts}.values())
+        upsert_ids = [row["notion_page_id"] for row in upserts]
+
+        async with get_session() as session:
+            if live_ids is not None:
+                stored = set((await session.execute(select(model.notion_page_id))).scalars())
+                removed = removed | (stored - live_ids)
+            removed_ids = list(removed - set(upsert_ids))
+
+            removed_count = 0
+            for chunk in _chunks(removed_ids):
+                result = await session.execute(
+                    delete(model)
+                    .where(model.notion_page_id.in_(chunk))
+                    .execution_options(synchronize_session=False)
+                )
+                removed_count += result.rowcount
+
+            # Строки, а не ORM-объекты: без identity map и unit of work
+            existing = {}
+            for chunk in _chunks(upsert_ids):
+                rows = await session.execute(
+                    select(model.__table__).where(model.notion_page_id.in_(chunk))
+                )
+                existing.update({row.notion_page_id: row for row in rows})
+
+            if model is UITextCache and upserts:
+                # Страница сменила ключ — её запись удаляем и вставляем заново:
+                # UPDATE на месте упрётся в UNIQUE(key), если страницы обменялись
+                # ключами (A: X→Y, B: Y→X)
+                rekeyed = [
+                    existing.pop(row["notion_page_id"]).id
+                    for row in upserts
+                    if row["notion_page_id"] in existing
+                    and existing[row["notion_page_id"]].key != row["key"]
+                ]
+                for chunk in _chunks(rekeyed):
+                    await session.execute(
+                        delete(UITextCache)
+                        .where(UITextCache.id.in_(chunk))
+                        .execution_options(synchronize_session=False)
                     )
-                    session.add(cache_entry)
-                    count += 1
 
-                except Exception as e:
-                    logger.warning(f"Failed to parse UI page {page.get('id')}: {e}")
+                # Ключ переехал на страницу вне пачки — старую запись убираем.
+                # Записи страниц пачки с этими ключами уже нет: сменившие ключ
+                # удалены выше, а ключи в upserts уникальны
+                for chunk in _chunks(upserts):
+                    await session.execute(
+                        delete(UITextCache)
+                        .where(
+                            UITextCache.key.in_([row["key"] for row in chunk]),
+                            UITextCache.notion_page_id.not_in(
+                                [row["notion_page_id"] for row in chunk]
+                            ),
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
 
+            now = datetime.now(timezone.utc)
+            inserts, updates = [], []
+            for values in upserts:
+                row = existing.get(values["notion_page_id"])
+                if row is None:
+                    inserts.append({**values, "updated_at": now})
+                # Страницы с водяного знака приходят повторно — их не трогаем
+                elif any(getattr(row, name) != value for name, value in values.items()):
+                    updates.append({**values, "id": row.id, "updated_at": now})
+
+            await _execute_chunks(session, insert(model), inserts)
+            # UPDATE по первичному ключу — executemany
+            await _execute_chunks(session, update(model), updates)
             await session.commit()
 
-        return count
+        return len(inserts) + len(updates), removed_count
+
+    async def _sync_content(self, full: bool = False) -> tuple[int, int]:
+        """
+        Синхронизация базы контента.
+
+        Returns:
+            (изменённые записи, удалённые записи)
+        """
+        return await self._sync_database(
+            self.config.notion_content_db,
+            ContentCache,
+            self._parse_content_page,
+            CONTENT_ACTIVE_FILTER,
+            full,
+        )
+
+    async def _sync_ui_texts(self, full: bool = False) -> tuple[int, int]:
+        """
+        Синхронизация базы UI текстов.
+
+        Returns:
+            (изменённые записи, удалённые записи)
+        """
+        return await self._sync_database(
+            self.config.notion_ui_texts_db,
+            UITextCache,
+            self._parse_ui_page,
+            None,
+            full,
+        )
@@ -2,17 +2,36 @@
 Планировщик напоминаний — автоматическая отправка пауз.
 """
 import asyncio
+import html
 import random
 import logging
+from typing import Awaitable, Callable
 from datetime import datetime, timezone
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from aiogram import Bot
-from aiogram.exceptions import TelegramAPIError
-from sqlalchemy import select
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from sqlalchemy import select, Row, Select
 
-from database import get_session, User, ReminderFrequency, ReminderTime
+from config import Config
+from database import (
+    get_session,
+    background_db,
+    handler_context,
+    refresh_snapshot,
+    snapshot_enabled,
+    expire_pending_box_orders,
+    archive_cancelled_orders,
+    User,
+    ReminderFrequency,
+    ReminderTime,
+)
 from content import ContentManager
+from content_format import send_parts
+from fanout import telegram_limiter
+from notion_sync import NotionSyncService, sync_changed
+from notifier import AdminNotifier, PRIORITY_HIGH
 
 logger = logging.getLogger(__name__)
 
@@ -33,22 +52,121 @@ TIME_RANGES = {
 THREE_PER_WEEK_DAYS = {0, 2, 4}  # Monday, Wednesday, Friday
 
 
+def tracked_job(name: str, func: Callable[[], Awaitable[None]]) -> Callable[[], Awaitable[None]]:
+    """
+    Обернуть задачу так, чтобы её SQL-запросы учитывались под именем `name`,
+    а падение сразу (мимо дайджеста) сообщалось админу. Сессии задачи —
+    фоновые (background_db): под нагрузкой они ждут, а не отбрасываются.
+    """
+    async def run() -> None:
+        with handler_context(name), background_db():
+            try:
+                await func()
+            except Exception as e:
+                await AdminNotifier.get_instance().notify(
+                    f"⚠️ Задача {name} упала:\n{html.escape(str(e))}",
+                    f"⚠️ Задача {name} упала",
+                    priority=PRIORITY_HIGH,
+                )
+                raise
+    return run
+
+
+def eligible_reminder_groups(
+    current_hour: int, current_weekday: int
+) -> list[tuple[ReminderTime, ReminderFrequency]]:
+    """
+    Пары (время, частота), которым в этот час вообще может уйти напоминание.
+
+    Фиксированное время срабатывает в начале своего диапазона,
+    RANDOM — в любой час диапазона (конкретный час проверяется по пользователю).
+    """
+    frequencies = [ReminderFrequency.DAILY]
+    if current_weekday in THREE_PER_WEEK_DAYS:
+        frequencies.append(ReminderFrequency.THREE_PER_WEEK)
+    if current_weekday == 0:
+        frequencies.append(ReminderFrequency.WEEKLY)
+
+    times = []
+    for reminder_time, (start_hour, end_hour) in TIME_RANGES.items():
+        if reminder_time == ReminderTime.RANDOM:
+            if start_hour <= current_hour < end_hour:
+                times.append(reminder_time)
+        elif current_hour == start_hour:
+            times.append(reminder_time)
+
+    return [(t, f) for t in times for f in frequencies]
+
+
+def reminder_batch_query(
+    reminder_time: ReminderTime,
+    frequency: ReminderFrequency,
+    after_id: int = 0,
+    limit: int = SCHEDULER_BATCH_SIZE,
+) -> Select:
+    """
+    Батч получателей напоминаний.
+
+    Условия reminder_enabled/onboarding_completed должны совпадать с WHERE
+    частичного индекса ix_users_reminder_eligible — иначе SQLite его не выберет.
+    Выбираем только нужные колонки: индекс покрывающий, а selectin-связи
+    User не подгружаются.
+    """
+    return (
+        select(User.id, User.telegram_id, User.reminder_frequency, User.reminder_time)
+        .where(
+            User.reminder_enabled == True,  # noqa: E712
+            User.onboarding_completed == True,  # noqa: E712
+            User.reminder_time == reminder_time,
+            User.reminder_frequency == frequency,
+            User.id > after_id,
+        )
+        .order_by(User.id)
+        .limit(limit)
+    )
+
+
 class PauseScheduler:
     """Планировщик для автоматической отправки напоминаний."""
 
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, config: Config):
         self.bot = bot
+        self.config = config
         self.scheduler = AsyncIOScheduler()
 
     def start(self):
         """Запуск планировщика."""
         # Проверка каждый час в начале часа
         self.scheduler.add_job(
-            self.check_and_send_pauses,
+            tracked_job("scheduler.pause_check", self.check_and_send_pauses),
             CronTrigger(minute=0),
             id="pause_check",
             replace_existing=True
         )
+        # Отмена брошенных предзаказов и архивирование — раз в час, между напоминаниями
+        self.scheduler.add_job(
+            tracked_job("scheduler.retention", self.run_retention),
+            CronTrigger(minute=30),
+            id="retention",
+            replace_existing=True
+        )
+        # Подтягивание правок контента из Notion
+        if self.config.notion_token and self.config.notion_sync_interval_minutes:
+            self.scheduler.add_job(
+                tracked_job("scheduler.notion_sync", self.sync_content),
+                IntervalTrigger(minutes=self.config.notion_sync_interval_minutes),
+                id="notion_sync",
+                replace_existing=True
+            )
+        # Снапшот для отчётов: первый сразу при старте, дальше по интервалу
+        if snapshot_enabled():
+            self.scheduler.add_job(
+                tracked_job("scheduler.snapshot", refresh_snapshot),
+                IntervalTrigger(minutes=self.config.snapshot_interval_minutes),
+                id="snapshot_refresh",
+                next_run_time=datetime.now(timezone.utc),
+                replace_existing=True
+            )
         self.scheduler.start()
         logger.info("Pause scheduler started")
 
@@ -68,20 +186,16 @@ class PauseScheduler:
 
         sent_count = 0
 
-        # Используем пагинацию для экономии памяти
-        offset = 0
-        while True:
-            async with get_session() as session:
-                result = await session.execute(
-                    select(User)
-                    .where(
-                        User.reminder_enabled == True,  # noqa: E712
-                        User.onboarding_completed == True  # noqa: E712
+        # Для каждой подходящей пары (время, частота) — keyset-пагинация по id
+        # через частичный индекс ix_users_reminder_eligible
+        for reminder_time, frequency in eligible_reminder_groups(current_hour, current_weekday):
+            last_id = 0
+            while True:
+                async with get_session() as session:
+                    result = await session.execute(
+                        reminder_batch_query(reminder_time, frequency, last_id)
                     )
-                    .offset(offset)
-                    .limit(SCHEDULER_BATCH_SIZE)
-                )
-                users = result.scalars().all()
+                    users = result.all()
 
                 if not users:
                     break  # Больше нет пользователей
@@ -92,18 +206,42 @@ class PauseScheduler:
                         if success:
                             sent_count += 1
 
-                offset += SCHEDULER_BATCH_SIZE
+                last_id = users[-1].id
+
+                if len(users) < SCHEDULER_BATCH_SIZE:
+                    break
 
                 # Небольшая пауза между батчами чтобы не перегружать Telegram API
-                if len(users) == SCHEDULER_BATCH_SIZE:
-                    await asyncio.sleep(SCHEDULER_BATCH_DELAY)
+                await asyncio.sleep(SCHEDULER_BATCH_DELAY)
 
         if sent_count > 0:
             logger.info(f"Sent {sent_count} pause reminders at hour {current_hour}")
 
+    async def run_retention(self):
+        """Отменить брошенные PENDING-предзаказы и унести старые отменённые в архив."""
+        if self.config.box_pending_ttl_hours:
+            await expire_pending_box_orders(self.config.box_pending_ttl_hours)
+        if self.config.order_retention_days:
+            await archive_cancelled_orders(self.config.order_retention_days)
+
+    async def sync_content(self):
+        """Синхронизировать Notion; кэш перезагружается, только если что-то изменилось."""
+        result = await NotionSyncService(self.config).sync_all()
+        if result["skipped"]:
+            return
+        if result["errors"]:
+            # Без уведомления админу: ошибка настройки повторялась бы каждый запуск
+            logger.warning(f"Scheduled Notion sync errors: {'; '.join(result['errors'])}")
+        if sync_changed(result):
+            await ContentManager.get_instance().reload(force=True)
+            logger.info(
+                f"Content updated from Notion: {result['content']} content, "
+                f"{result['ui_texts']} UI texts, {result['removed']} removed"
+            )
+
     def _should_send_to_user(
         self,
-        user: User,
+        user: User | Row,
         current_hour: int,
         current_weekday: int
     ) -> bool:
@@ -147,13 +285,20 @@ class PauseScheduler:
         pause_text = await content.get_random_reminder()
 
         try:
-            await self.bot.send_message(telegram_id, pause_text)
+            # Слот общего лимита бота: напоминания идут вместе с рассылками
+            await telegram_limiter.wait()
+            await send_parts(self.bot, telegram_id, pause_text)
             return True
+        except TelegramRetryAfter as e:
+            # Лимит бота общий — притормаживаем и рассылки тоже
+            telegram_limiter.pause(e.retry_after)
+            logger.warning(f"Failed to send pause to {telegram_id}: flood control {e.retry_after}s")
+            return False
         except TelegramAPIError as e:
             logger.warning(f"Failed to send pause to {telegram_id}: {e}")
             return False
 
 
-def create_scheduler(bot: Bot) -> PauseScheduler:
+def create_scheduler(bot: Bot, config: Config) -> PauseScheduler:
     """Создать экземпляр планировщика."""
-    return PauseScheduler(bot)
+    return PauseScheduler(bot, config)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк синхронизации с Notion на фейковом API (scripts/fake_notion.py).
+
+Для каждого размера базы поднимает fake_notion в отдельном процессе,
+синхронизирует пустую временную SQLite-базу (полная загрузка), затем
+повторяет синхронизацию без изменений (инкрементальная). Синхронизация
+идёт в отдельном процессе, чтобы пиковый RSS относился к одному прогону
+и не включал страницы, которые держит фейковый сервер.
+
+Печатает: вызовы API (запросы, 429, 5xx), время, пиковый RSS и время SQL.
+
+Использование:
+    python scripts/bench_notion_sync.py --pages 10000 50000
+    python scripts/bench_notion_sync.py --pages 10000 --rate 1000 --latency 0.05 --error-429 0.02
+
+--rate по умолчанию — лимит Notion (3 запроса/с): 50k страниц — около 3 минут.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+# Добавляем родительскую директорию в path для импорта модулей бота
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+FAKE_NOTION = os.path.join(ROOT, "scripts", "fake_notion.py")
+
+UI_PAGES = 50
+
+
+def start_fake_notion(args: argparse.Namespace, pages: int) -> tuple[subprocess.Popen, str]:
+    """Запустить fake_notion в отдельном процессе; возвращает (процесс, base_url)."""
+    process = subprocess.Popen(
+        [
+            sys.executable, FAKE_NOTION,
+            "--content-pages", str(pages),
+            "--ui-pages", str(UI_PAGES),
+            "--latency", str(args.latency),
+            "--error-429", str(args.error_429),
+            "--error-5xx", str(args.error_5xx),
+            "--seed", "1",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    base_url = process.stdout.readline().strip()
+    if not base_url:
+        process.kill()
+        raise RuntimeError("fake_notion не запустился")
+    return process, base_url
+
+
+async def fake_stats(base_url: str) -> dict:
+    async with httpx.AsyncClient() as client:
+        response = await client.get(base_url.removesuffix("/v1") + "/_stats")
+        return response.json()
+
+
+async def sync_once(base_url: str, rate: float, label: str) -> dict:
+    """Один прогон sync_all: время, SQL-время и результат."""
+    from config import Config
+    from database import handler_context, get_query_stats, reset_query_stats
+    from fanout import RateLimiter
+    from notion_client import NotionClient
+    from notion_sync import NotionSyncService
+    from fake_notion import CONTENT_DB_ID, UI_TEXTS_DB_ID
+
+    config = Config.model_construct(
+        notion_token="bench",
+        notion_content_db=CONTENT_DB_ID,
+        notion_ui_texts_db=UI_TEXTS_DB_ID,
+    )
+    service = NotionSyncService(
+        config, NotionClient("bench", base_url=base_url, limiter=RateLimiter(rate))
+    )
+
+    before = await fake_stats(base_url)
+    reset_query_stats()
+    started = time.monotonic()
+    with handler_context(label):
+        result = await service.sync_all()
+    wall = time.monotonic() - started
+    after = await fake_stats(base_url)
+    sql = get_query_stats().get(label, {"queries": 0, "total_ms": 0.0})
+
+    return {
+        "label": label,
+        "wall_s": wall,
+        "queries": after["queries"] - before["queries"],
+        "rate_limited": after["rate_limited"] - before["rate_limited"],
+        "server_errors": after["server_errors"] - before["server_errors"],
+        "sql_queries": int(sql["queries"]),
+        "sql_ms": sql["total_ms"],
+        "rows": result["content"] + result["ui_texts"],
+        "errors": result["errors"],
+    }
+
+
+async def run_pages(pages: int, args: argparse.Namespace) -> list[dict]:
+    from database import init_db, close_db
+
+    sys.path.insert(0, os.path.join(ROOT, "scripts"))
+    process, base_url = start_fake_notion(args, pages)
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            await init_db(f"sqlite+aiosqlite:///{tmp}/bench.db", slow_query_ms=10_000)
+            runs = [
+                await sync_once(base_url, args.rate, "full"),
+                await sync_once(base_url, args.rate, "incremental"),
+            ]
+        finally:
+            await close_db()
+            process.terminate()
+            process.wait()
+
+    # ru_maxrss на Linux — в килобайтах
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    for run in runs:
+        run["pages"] = pages
+        run["peak_rss_mb"] = peak_mb
+    return runs
+
+
+def run_in_child(pages: int, args: argparse.Namespace) -> list[dict]:
+    return asyncio.run(run_pages(pages, args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк синхронизации с Notion")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--rate", type=float, default=None, help="запросов/с (по умолчанию лимит Notion)")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-429", type=float, default=0.0)
+    parser.add_argument("--error-5xx", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.rate is None:
+        from notion_client import NOTION_RATE
+        args.rate = NOTION_RATE
+
+    context = multiprocessing.get_context("spawn")
+    print(
+        f"{'pages':>7} {'run':<12} {'API':>5} {'429':>4} {'5xx':>4} "
+        f"{'wall, s':>8} {'SQL':>6} {'SQL, ms':>8} {'RSS, MB':>8}  rows"
+    )
+    for pages in args.pages:
+        with context.Pool(1) as pool:
+            runs = pool.apply(run_in_child, (pages, args))
+        for run in runs:
+            print(
+                f"{run['pages']:>7} {run['label']:<12} {run['queries']:>5} "
+                f"{run['rate_limited']:>4} {run['server_errors']:>4} {run['wall_s']:>8.1f} "
+                f"{run['sql_queries']:>6} {run['sql_ms']:>8.0f} {run['peak_rss_mb']:>8.0f}  {run['rows']}"
+            )
+            for error in run["errors"]:
+                print(f"        ! {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Проверка инкрементальной синхронизации с Notion на фейковом API
+(scripts/fake_notion.py, в том же процессе).
+
+Полная загрузка во временную SQLite-базу, затем правки в фейковом
+Notion и инкрементальные прогоны sync_all() (каждый — со сверкой id,
+иначе архивированные страницы уходят только по расписанию сверки).
+После каждого прогона кэш сравнивается с тем, что сейчас лежит в Notion:
+- правка текста и архивирование страницы;
+- две страницы UI текстов обменялись ключами (A: X→Y, B: Y→X) —
+  раньше падало на UNIQUE(key) и водяной знак не двигался;
+- ключ переехал на другую страницу.
+
+Использование:
+    python scripts/check_notion_sync.py
+
+Код возврата 1, если хотя бы одна проверка не прошла.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import timedelta
+
+# Добавляем родительскую директорию в path для импорта модулей бота
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+from sqlalchemy import select
+
+from config import Config
+from database import init_db, close_db, get_session
+from database.models import ContentCache, UITextCache
+from fanout import RateLimiter
+from notion_client import NotionClient
+import notion_sync
+from notion_sync import NotionSyncService
+from fake_notion import (
+    FakeNotion,
+    CONTENT_DB_ID,
+    UI_TEXTS_DB_ID,
+    ui_properties,
+    rich_text,
+)
+
+CONTENT_PAGES = 40
+UI_PAGES = 10
+
+
+def _title(page: dict, name: str) -> str:
+    return "".join(block["plain_text"] for block in page["properties"][name]["title"])
+
+
+def _text(page: dict, name: str) -> str:
+    return "".join(block["plain_text"] for block in page["properties"][name]["rich_text"])
+
+
+def _live(fake: FakeNotion, database_id: str) -> list[dict]:
+    return [
+        page for page in fake.databases[database_id]
+        if not page["archived"] and not page["in_trash"]
+    ]
+
+
+async def _compare(fake: FakeNotion) -> list[str]:
+    """Расхождения кэша с фейковым Notion."""
+    problems = []
+    async with get_session() as session:
+        ui_rows = {
+            row.notion_page_id: (row.key, row.text)
+            for row in (await session.execute(select(UITextCache))).scalars()
+        }
+        content_ids = set(
+            (await session.execute(select(ContentCache.notion_page_id))).scalars()
+        )
+
+    expected_ui = {
+        page["id"]: (_title(page, "Key"), _text(page, "Text"))
+        for page in _live(fake, UI_TEXTS_DB_ID)
+    }
+    if ui_rows != expected_ui:
+        problems.append(f"ui_text_cache: {ui_rows} != {expected_ui}")
+
+    expected_content = {
+        page["id"] for page in _live(fake, CONTENT_DB_ID)
+        if page["properties"]["Active"]["checkbox"]
+    }
+    if content_ids != expected_content:
+        problems.append(
+            f"content_cache: лишние {content_ids - expected_content}, "
+            f"нет {expected_content - content_ids}"
+        )
+    return problems
+
+
+def _set_key(fake: FakeNotion, index: int, key: str) -> None:
+    page = fake.databases[UI_TEXTS_DB_ID][index]
+    title = {**page["properties"]["Key"], "title": rich_text(key)}
+    properties = {**page["properties"], "Key": title}
+    fake.touch(UI_TEXTS_DB_ID, index, properties=properties)
+
+
+async def check() -> list[str]:
+    notion_sync.NOTION_RECONCILE_INTERVAL = timedelta(0)
+    fake = FakeNotion(seed=1)
+    fake.fill(CONTENT_DB_ID, CONTENT_PAGES)
+    fake.fill(UI_TEXTS_DB_ID, UI_PAGES, ui_properties)
+    base_url = await fake.start()
+
+    config = Config.model_construct(
+        notion_token="check",
+        notion_content_db=CONTENT_DB_ID,
+        notion_ui_texts_db=UI_TEXTS_DB_ID,
+    )
+    client = NotionClient("check", base_url=base_url, limiter=RateLimiter(1000))
+    service = NotionSyncService(config, client)
+
+    def edit_and_archive():
+        page = fake.databases[UI_TEXTS_DB_ID][0]
+        text = {**page["properties"]["Text"], "rich_text": rich_text("Новый текст")}
+        properties = {**page["properties"], "Text": text}
+        fake.touch(UI_TEXTS_DB_ID, 0, properties=properties)
+        fake.touch(CONTENT_DB_ID, 1, archived=True)
+
+    def swap_keys():
+        _set_key(fake, 2, "UI_TEXT_3")
+        _set_key(fake, 3, "UI_TEXT_2")
+
+    def move_key():
+        # Страница 5 забирает ключ страницы 4, а страница 4 — новый ключ
+        _set_key(fake, 5, "UI_TEXT_4")
+        _set_key(fake, 4, "UI_TEXT_MOVED")
+
+    steps = (
+        ("полная загрузка", None, True),
+        ("правка и архив", edit_and_archive, False),
+        ("обмен ключами", swap_keys, False),
+        ("переезд ключа", move_key, False),
+        ("без изменений", None, False),
+    )
+
+    failures = []
+    try:
+        for label, change, full in steps:
+            if change:
+                change()
+            result = await service.sync_all(full=full)
+            problems = list(result["errors"]) + await _compare(fake)
+            status = "OK" if not problems else "FAIL"
+            print(f"{status:<5} {label}: изменено {result['content'] + result['ui_texts']}, "
+                  f"удалено {result['removed']}")
+            for problem in problems:
+                print(f"      ! {problem}")
+                failures.append(f"{label}: {problem}")
+    finally:
+        await client.close()
+        await fake.stop()
+    return failures
+
+
+async def main() -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        await init_db(f"sqlite+aiosqlite:///{tmp}/check.db", slow_query_ms=10_000)
+        try:
+            failures = await check()
+        finally:
+            await close_db()
+
+    if failures:
+        print(f"\nПроверок с ошибками: {len(failures)}")
+        return 1
+    print("\nСинхронизация в порядке")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
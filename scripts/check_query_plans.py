@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Проверка планов горячих запросов (EXPLAIN QUERY PLAN на SQLite).
+
+Строит временную базу по моделям, наполняет её синтетическими данными
+реалистичного объёма и проверяет, что горячие запросы (в том виде,
+в каком их компилирует SQLAlchemy) идут через свой индекс, не уходят
+в полный скан таблицы и не сортируют во временном B-дереве.
+
+Для каждого провала печатается план и составной индекс, которого
+не хватает запросу (если такого индекса в схеме нет).
+
+Использование:
+    python scripts/check_query_plans.py
+
+Код возврата 1, если хотя бы один запрос регрессировал.
+"""
+import os
+import random
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, event, insert
+
+# Добавляем родительскую директорию в path для импорта модулей бота
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.models import (
+    Base,
+    User,
+    Order,
+    OrderStatus,
+    BoxOrder,
+    BoxOrderStatus,
+    ReminderFrequency,
+    ReminderTime,
+)
+from database.counters import counters_query
+from scheduler import reminder_batch_query
+from handlers.box import active_box_order_query, latest_pending_box_order_query
+from handlers.orders import latest_pending_order_query
+from handlers.admin import (
+    orders_page_query,
+    OrdersView,
+    KIND_BOX,
+    DIRECTION_OLDER,
+    DIRECTION_NEWER,
+)
+
+# ===== ОБЪЁМ СИНТЕТИЧЕСКИХ ДАННЫХ =====
+USERS_COUNT = 50000
+ORDERS_COUNT = 50000
+BOX_ORDERS_COUNT = 100000
+BOX_MONTHS = [f"2026-{m:02d}" for m in range(1, 13)]
+
+# Маленькие служебные таблицы, полный скан которых допустим
+SMALL_TABLES = {"order_counters"}
+
+
+class HotQuery:
+    """Горячий запрос, составной индекс, на который он рассчитан, и его имя в плане."""
+
+    def __init__(
+        self, name: str, stmt, table: str, columns: tuple[str, ...], index: str | None = None
+    ):
+        self.name = name
+        self.stmt = stmt
+        self.table = table
+        self.columns = columns
+        self.index = index
+
+
+def hot_queries() -> list[HotQuery]:
+    """Все горячие запросы бота."""
+    # Курсор /orders где-то в середине истории
+    deep_cursor = datetime(2025, 6, 15, tzinfo=timezone.utc)
+    return [
+        HotQuery(
+            "scheduler: батч получателей напоминаний",
+            reminder_batch_query(ReminderTime.MORNING, ReminderFrequency.DAILY, after_id=500),
+            "users", ("reminder_time", "reminder_frequency", "id"), "ix_users_reminder_eligible",
+        ),
+        HotQuery(
+            "box_start: проверка активного предзаказа",
+            active_box_order_query(100000123, "2026-03").limit(1),
+            "box_orders", ("telegram_id", "status"), "ix_box_orders_telegram_status_created",
+        ),
+        HotQuery(
+            "user_paid: последний PENDING заказ",
+            latest_pending_order_query(100000123),
+            "orders", ("telegram_id", "status", "created_at"), "ix_orders_telegram_status_created",
+        ),
+        HotQuery(
+            "box_user_paid: последний PENDING предзаказ",
+            latest_pending_box_order_query(100000123),
+            "box_orders", ("telegram_id", "status", "created_at"),
+            "ix_box_orders_telegram_status_created",
+        ),
+        HotQuery(
+            "/orders: первая страница",
+            orders_page_query(OrdersView()),
+            "orders", ("created_at", "id"), "ix_orders_created_id",
+        ),
+        HotQuery(
+            "/orders: глубокая страница по статусу",
+            orders_page_query(OrdersView(status="d"), DIRECTION_OLDER, (deep_cursor, 1000)),
+            "orders", ("status", "created_at", "id"), "ix_orders_status_created_id",
+        ),
+        HotQuery(
+            "/orders: заказы за месяц, назад",
+            orders_page_query(OrdersView(month="2025-06"), DIRECTION_NEWER, (deep_cursor, 1000)),
+            "orders", ("created_at", "id"), "ix_orders_created_id",
+        ),
+        HotQuery(
+            "/orders: наборы по месяцу",
+            orders_page_query(OrdersView(KIND_BOX, month="2026-03"), DIRECTION_OLDER, (deep_cursor, 1000)),
+            "box_orders", ("box_month", "created_at", "id"), "ix_box_orders_month_created_id",
+        ),
+        HotQuery(
+            "/orders: наборы по статусу",
+            orders_page_query(OrdersView(KIND_BOX, status="c"), DIRECTION_OLDER, (deep_cursor, 1000)),
+            "box_orders", ("status", "created_at", "id"), "ix_box_orders_status_created_id",
+        ),
+        HotQuery(
+            "/stats: счётчики",
+            counters_query(),
+            "order_counters", (),
+        ),
+    ]
+
+
+def populate(conn) -> None:
+    """Наполнить базу пользователями и заказами."""
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    users = []
+    for i in range(1, USERS_COUNT + 1):
+        enabled = rng.random() < 0.6
+        users.append({
+            "telegram_id": 100000000 + i,
+            "created_at": start + timedelta(minutes=i),
+            "onboarding_completed": rng.random() < 0.9,
+            "reminder_enabled": enabled,
+            "reminder_frequency": rng.choice(list(ReminderFrequency)) if enabled else None,
+            "reminder_time": rng.choice(list(ReminderTime)) if enabled else None,
+        })
+    conn.execute(insert(User), users)
+
+    orders = []
+    for i in range(ORDERS_COUNT):
+        orders.append({
+            "telegram_id": 100000000 + rng.randint(1, USERS_COUNT),
+            "name": f"Name {i}",
+            "phone": f"+4917{i:08d}",
+            "address": f"Street {i}, City",
+            "status": rng.choice(list(OrderStatus)),
+            "created_at": start + timedelta(minutes=rng.randint(0, 500000)),
+        })
+    conn.execute(insert(Order), orders)
+
+    box_orders = []
+    for i in range(BOX_ORDERS_COUNT):
+        box_orders.append({
+            "telegram_id": 100000000 + rng.randint(1, USERS_COUNT),
+            "name": f"Name {i}",
+            "phone": f"+4917{i:08d}",
+            "address": f"Street {i}, City",
+            "box_month": rng.choice(BOX_MONTHS),
+            "status": rng.choice(list(BoxOrderStatus)),
+            "created_at": start + timedelta(minutes=rng.randint(0, 500000)),
+        })
+    conn.execute(insert(BoxOrder), box_orders)
+
+    conn.exec_driver_sql("ANALYZE")
+
+
+def explain(conn, stmt) -> list[str]:
+    """
+    EXPLAIN QUERY PLAN для statement в том виде, в каком его выполняет SQLAlchemy.
+
+    Запрос выполняется один раз, а SQL и уже приведённые параметры
+    перехватываются из before_cursor_execute — так IN-списки, Enum и
+    прочие типы раскрываются ровно как в боте.
+    """
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(conn, "before_cursor_execute", capture)
+    try:
+        conn.execute(stmt).all()
+    finally:
+        event.remove(conn, "before_cursor_execute", capture)
+
+    statement, parameters = captured[-1]
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return [row[-1] for row in rows]
+
+
+def index_columns(conn, table: str) -> dict[str, tuple[str, ...]]:
+    """Индексы таблицы: имя -> колонки."""
+    result = {}
+    for row in conn.exec_driver_sql(f"PRAGMA index_list('{table}')").all():
+        name = row[1]
+        cols = conn.exec_driver_sql(f"PRAGMA index_info('{name}')").all()
+        result[name] = tuple(col[2] for col in cols)
+    return result
+
+
+def has_composite_index(conn, table: str, columns: tuple[str, ...]) -> bool:
+    """Есть ли индекс, начинающийся с нужных колонок."""
+    if not columns:
+        return True
+    return any(
+        cols[:len(columns)] == columns
+        for cols in index_columns(conn, table).values()
+    )
+
+
+def check(conn, query: HotQuery) -> tuple[bool, str | None]:
+    """
+    Проверить план запроса.
+
+    Returns:
+        (ok, missing_index): missing_index — описание недостающего индекса
+    """
+    plan = explain(conn, query.stmt)
+    problems = []
+    for line in plan:
+        if line.startswith("SCAN ") and "USING" not in line:
+            table = line.split()[1]
+            if table not in SMALL_TABLES:
+                problems.append(f"полный скан: {line}")
+        if "USE TEMP B-TREE" in line:
+            problems.append(f"сортировка во временном B-дереве: {line}")
+
+    # Запрос должен идти через свой индекс, а не через любой подходящий
+    if query.index and not any(
+        re.search(rf"\bINDEX {re.escape(query.index)}\b", line) for line in plan
+    ):
+        problems.append(f"не использует индекс {query.index}")
+
+    missing = None
+    if not has_composite_index(conn, query.table, query.columns):
+        missing = f"{query.table}({', '.join(query.columns)})"
+        problems.append(f"нет составного индекса {missing}")
+
+    status = "OK  " if not problems else "FAIL"
+    print(f"[{status}] {query.name}")
+    for line in plan:
+        print(f"         {line}")
+    for problem in problems:
+        print(f"         !! {problem}")
+    return not problems, missing
+
+
+def main() -> int:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+
+    failed = 0
+    missing_indexes = []
+    with engine.begin() as conn:
+        print(
+            f"Наполняю базу: {USERS_COUNT} users, {ORDERS_COUNT} orders, "
+            f"{BOX_ORDERS_COUNT} box_orders..."
+        )
+        populate(conn)
+
+        for query in hot_queries():
+            ok, missing = check(conn, query)
+            if not ok:
+                failed += 1
+            if missing:
+                missing_indexes.append(missing)
+
+    print()
+    if missing_indexes:
+        print("Недостающие составные индексы:")
+        for missing in missing_indexes:
+            print(f"  - {missing}")
+    print(f"Итого: {failed} регрессий" if failed else "Все планы в порядке")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
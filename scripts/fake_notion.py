@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Локальная замена Notion API для тестов и бенчмарков синхронизации.
+
+Поднимает HTTP-сервер (aiohttp) с теми эндпоинтами, которыми пользуются
+notion_sync.py и scripts/migrate_to_notion.py:
+- POST /v1/databases/{id}/query — пагинация (page_size, start_cursor),
+  фильтры Active (checkbox) и last_edited_time (on_or_after),
+  filter_properties=title
+- POST /v1/pages — создание страницы в базе
+
+Можно добавить задержку ответа и долю ответов 429 (с Retry-After) и 503.
+GET /_stats (вне /v1) отдаёт счётчики обращений.
+
+Использование:
+    python scripts/fake_notion.py --content-pages 10000 --latency 0.05 --error-429 0.02
+
+Сервер печатает base_url (http://127.0.0.1:PORT/v1). Подставь его в NotionClient(base_url=...)
+или в NOTION_API_URL для scripts/migrate_to_notion.py. Токен и ID баз любые:
+базы создаются при первом обращении.
+"""
+import argparse
+import asyncio
+import random
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+# ID баз, которые заполняет --content-pages / --ui-pages
+CONTENT_DB_ID = "fake-content-db"
+UI_TEXTS_DB_ID = "fake-ui-texts-db"
+
+CONTENT_TYPES = ("pause_short", "pause_long", "breathe", "movie", "book")
+MAX_PAGE_SIZE = 100
+BASE_TIME = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def notion_time(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def rich_text(text: str) -> list[dict]:
+    return [{"type": "text", "text": {"content": text}, "plain_text": text}]
+
+
+def make_page(database_id: str, properties: dict, edited: datetime) -> dict:
+    """Страница в формате ответа Notion."""
+    page_id = str(uuid.uuid4())
+    return {
+        "object": "page",
+        "id": page_id,
+        "created_time": notion_time(edited),
+        "last_edited_time": notion_time(edited),
+        "archived": False,
+        "in_trash": False,
+        "parent": {"type": "database_id", "database_id": database_id},
+        "url": f"https://www.notion.so/{page_id.replace('-', '')}",
+        "properties": properties,
+    }
+
+
+def content_properties(i: int) -> dict:
+    content_type = CONTENT_TYPES[i % len(CONTENT_TYPES)]
+    return {
+        "Title": {"id": "title", "type": "title", "title": rich_text(f"{content_type}_{i}")},
+        "Type": {"id": "type", "type": "select", "select": {"name": content_type}},
+        "Content": {"id": "cont", "type": "rich_text", "rich_text": rich_text(f"пауза номер {i} " * 8)},
+        "Active": {"id": "actv", "type": "checkbox", "checkbox": i % 20 != 0},
+    }
+
+
+def ui_properties(i: int) -> dict:
+    return {
+        "Key": {"id": "title", "type": "title", "title": rich_text(f"UI_TEXT_{i}")},
+        "Category": {"id": "catg", "type": "select", "select": {"name": "system"}},
+        "Text": {"id": "text", "type": "rich_text", "rich_text": rich_text(f"Текст {i}")},
+    }
+
+
+def _as_property(value: dict) -> dict:
+    """Свойство из запроса /pages ({"title": [...]}) -> свойство ответа."""
+    for kind in ("title", "rich_text"):
+        if kind in value:
+            blocks = [
+                {**block, "plain_text": block.get("text", {}).get("content", "")}
+                for block in value[kind]
+            ]
+            return {"id": "title" if kind == "title" else kind, "type": kind, kind: blocks}
+    kind = next(iter(value))
+    return {"id": kind, "type": kind, kind: value[kind]}
+
+
+@dataclass
+class FakeNotionStats:
+    """Счётчики обращений — для отчётов бенчмарка."""
+    queries: int = 0
+    pages_created: int = 0
+    rate_limited: int = 0
+    server_errors: int = 0
+
+
+@dataclass
+class FakeNotion:
+    """Состояние фейкового Notion: базы со страницами и настройки сбоев."""
+    latency: float = 0.0          # Секунд на ответ
+    error_429: float = 0.0        # Доля ответов 429
+    error_5xx: float = 0.0        # Доля ответов 503
+    retry_after: int = 1          # Retry-After в ответе 429
+    seed: int | None = None
+    databases: dict[str, list[dict]] = field(default_factory=dict)
+    stats: FakeNotionStats = field(default_factory=FakeNotionStats)
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+        self._runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    def fill(self, database_id: str, count: int, properties=content_properties):
+        """Добавить count синтетических страниц (время правки растёт по секунде)."""
+        pages = self.databases.setdefault(database_id, [])
+        start = len(pages)
+        for i in range(start, start + count):
+            pages.append(make_page(database_id, properties(i), BASE_TIME + timedelta(seconds=i)))
+
+    def touch(self, database_id: str, index: int, **changes) -> dict:
+        """Изменить страницу (archived=True, in_trash=True или свойства) — как правка в Notion."""
+        page = self.databases[database_id][index]
+        page.update(changes)
+        page["last_edited_time"] = notion_time(datetime.now(timezone.utc))
+        return page
+
+    # ===== HTTP =====
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._faults])
+        app.router.add_post("/v1/databases/{database_id}/query", self._query)
+        app.router.add_post("/v1/pages", self._create_page)
+        app.router.add_get("/_stats", self._stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запустить сервер; возвращает base_url."""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}/v1"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @web.middleware
+    async def _faults(self, request: web.Request, handler):
+        if not request.path.startswith("/v1/"):
+            return await handler(request)
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            return web.json_response({"object": "error", "code": "unauthorized"}, status=401)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        roll = self._random.random()
+        if roll < self.error_429:
+            self.stats.rate_limited += 1
+            return web.json_response(
+                {"object": "error", "code": "rate_limited"},
+                status=429,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        if roll < self.error_429 + self.error_5xx:
+            self.stats.server_errors += 1
+            return web.json_response({"object": "error", "code": "service_unavailable"}, status=503)
+        return await handler(request)
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response(asdict(self.stats))
+
+    async def _query(self, request: web.Request) -> web.Response:
+        self.stats.queries += 1
+        body = await request.json()
+        pages = [
+            page for page in self.databases.get(request.match_info["database_id"], [])
+            if not page["archived"] and not page["in_trash"]
+        ]
+
+        filter_obj = body.get("filter")
+        if filter_obj:
+            try:
+                pages = [page for page in pages if self._matches(page, filter_obj)]
+            except (KeyError, ValueError):
+                return web.json_response({"object": "error", "code": "validation_error"}, status=400)
+
+        page_size = min(body.get("page_size", MAX_PAGE_SIZE), MAX_PAGE_SIZE)
+        start = int(body.get("start_cursor") or 0)
+        results = pages[start:start + page_size]
+        has_more = start + page_size < len(pages)
+
+        only = request.query.getall("filter_properties", [])
+        if only:
+            results = [
+                {**page, "properties": {
+                    name: prop for name, prop in page["properties"].items() if prop["id"] in only
+                }}
+                for page in results
+            ]
+
+        return web.json_response({
+            "object": "list",
+            "results": results,
+            "has_more": has_more,
+            "next_cursor": str(start + page_size) if has_more else None,
+        })
+
+    def _matches(self, page: dict, filter_obj: dict) -> bool:
+        if filter_obj.get("timestamp") == "last_edited_time":
+            since = parse_time(filter_obj["last_edited_time"]["on_or_after"])
+            return parse_time(page["last_edited_time"]) >= since
+        prop = page["properties"][filter_obj["property"]]
+        return prop["checkbox"] == filter_obj["checkbox"]["equals"]
+
+    async def _create_page(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        database_id = body["parent"]["database_id"]
+        properties = {name: _as_property(value) for name, value in body["properties"].items()}
+        page = make_page(database_id, properties, datetime.now(timezone.utc))
+        self.databases.setdefault(database_id, []).append(page)
+        self.stats.pages_created += 1
+        return web.json_response(page)
+
+
+async def serve(args: argparse.Namespace):
+    fake = FakeNotion(
+        latency=args.latency,
+        error_429=args.error_429,
+        error_5xx=args.error_5xx,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    fake.fill(CONTENT_DB_ID, args.content_pages)
+    fake.fill(UI_TEXTS_DB_ID, args.ui_pages, ui_properties)
+    base_url = await fake.start(port=args.port)
+    print(base_url, flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fake.stop()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake Notion API")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--content-pages", type=int, default=0)
+    parser.add_argument("--ui-pages", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="секунд на ответ")
+    parser.add_argument("--error-429", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        pass
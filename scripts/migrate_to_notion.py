@@ -1,17 +1,25 @@
 #!/usr/bin/env python3
 """
-Миграция контента из texts.py в Notion.
+Миграция встроенного контента (fallback из content.py) в Notion.
 
 Использование:
 1. Создай Notion Integration на https://www.notion.so/my-integrations
 2. Создай 2 базы данных в Notion (Content и UI Texts) с нужными колонками
 3. Расшарь базы интеграции (Share → Invite → выбери интеграцию)
 4. Заполни переменные ниже
-5. Запусти: python scripts/migrate_to_notion.py
+5. Запусти: python scripts/migrate_to_notion.py [--dry-run] [--concurrency N]
+
+Страницы создаются параллельно (--concurrency) через NotionClient: общий
+лимит 3 запроса/с, повтор на 429. После 5xx или обрыва создание не
+повторяется — страница могла уже создаться. Ключ каждой созданной страницы
+дописывается в checkpoint-файл, а перед созданием скрипт читает заголовки
+страниц, которые уже есть в базах: повторный запуск пропускает и те, и
+другие — после сбоя скрипт можно просто запустить снова, дублей не будет.
+--dry-run показывает, что будет создано, ничего не отправляя.
 
 Структура базы "Content":
 - Title (title): название записи
-- Type (select): pause_short, pause_long, breathe, movie, book
+- Type (select): pause_phrases, pause_long, pause_music, breathe, movie, book
 - Content (rich_text): текст или URL
 - Active (checkbox): true
 
@@ -20,9 +28,11 @@
 - Category (select): onboarding, box, order, system
 - Text (rich_text): текст с {placeholders}
 """
+import argparse
 import asyncio
 import os
 import sys
+from dataclasses import dataclass
 
 import httpx
 
@@ -30,25 +40,41 @@ import httpx
 NOTION_TOKEN = os.getenv("NOTION_TOKEN", "")
 CONTENT_DB_ID = os.getenv("NOTION_CONTENT_DB", "")
 UI_TEXTS_DB_ID = os.getenv("NOTION_UI_TEXTS_DB", "")
+# Для прогона на scripts/fake_notion.py — его base_url
+NOTION_API_URL = os.getenv("NOTION_API_URL", "https://api.notion.com/v1")
 
-# Добавляем родительскую директорию в path для импорта texts
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-import texts
-
+MIGRATION_CONCURRENCY = 3
+CHECKPOINT_PATH = "notion_migration.checkpoint"
 
-async def create_page(client: httpx.AsyncClient, database_id: str, properties: dict) -> dict:
-    """Создать страницу в Notion."""
-    response = await client.post(
-        "/pages",
-        json={
-            "parent": {"database_id": database_id},
-            "properties": properties,
-        },
-    )
-    if response.status_code != 200:
-        print(f"Error: {response.status_code} - {response.text}")
-        response.raise_for_status()
-    return response.json()
+# Добавляем родительскую директорию в path для импорта модулей бота
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import content
+from notion_client import NotionClient, NotionAPIError
+
+# Тип контента (как его читает ContentManager) -> встроенный список
+CONTENT_SOURCES = (
+    ("pause_phrases", content.FALLBACK_PAUSE_PHRASES),
+    ("pause_long", content.FALLBACK_PAUSE_POEMS),
+    ("pause_music", content.FALLBACK_PAUSE_MUSIC),
+    ("breathe", content.FALLBACK_BREATHE),
+    ("movie", content.FALLBACK_MOVIES),
+    ("book", content.FALLBACK_BOOKS),
+)
+
+# Категория UI текста по префиксу ключа
+UI_CATEGORIES = (
+    (("ONBOARDING_", "WELCOME_BACK"), "onboarding"),
+    (("BOX_",), "box"),
+    (("ORDER_", "WELCOME", "ABOUT"), "order"),
+)
+
+
+@dataclass
+class MigrationItem:
+    """Страница, которую нужно создать."""
+    key: str            # Ключ в checkpoint-файле
+    database_id: str
+    properties: dict
 
 
 def make_title(text: str) -> dict:
@@ -79,154 +105,167 @@ def make_checkbox(value: bool) -> dict:
     return {"checkbox": value}
 
 
-async def migrate_content(client: httpx.AsyncClient):
-    """Миграция контента (паузы, ссылки)."""
-    print("\n=== Миграция контента ===")
-
-    # PAUSE_SHORT
-    for i, text in enumerate(texts.PAUSE_SHORT, 1):
-        props = {
-            "Title": make_title(f"pause_short_{i}"),
-            "Type": make_select("pause_short"),
-            "Content": make_rich_text(text),
-            "Active": make_checkbox(True),
-        }
-        await create_page(client, CONTENT_DB_ID, props)
-        print(f"  pause_short_{i}")
-        await asyncio.sleep(0.35)  # Rate limit: 3 req/sec
-
-    # PAUSE_LONG
-    for i, text in enumerate(texts.PAUSE_LONG, 1):
-        props = {
-            "Title": make_title(f"pause_long_{i}"),
-            "Type": make_select("pause_long"),
-            "Content": make_rich_text(text),
-            "Active": make_checkbox(True),
-        }
-        await create_page(client, CONTENT_DB_ID, props)
-        print(f"  pause_long_{i}")
-        await asyncio.sleep(0.35)
-
-    # BREATHE_CONTENT
-    for i, url in enumerate(texts.BREATHE_CONTENT, 1):
-        props = {
-            "Title": make_title(f"breathe_{i}"),
-            "Type": make_select("breathe"),
-            "Content": make_rich_text(url),
-            "Active": make_checkbox(True),
-        }
-        await create_page(client, CONTENT_DB_ID, props)
-        print(f"  breathe_{i}")
-        await asyncio.sleep(0.35)
-
-    # MOVIES
-    for i, url in enumerate(texts.MOVIES, 1):
-        props = {
-            "Title": make_title(f"movie_{i}"),
-            "Type": make_select("movie"),
-            "Content": make_rich_text(url),
-            "Active": make_checkbox(True),
-        }
-        await create_page(client, CONTENT_DB_ID, props)
-        print(f"  movie_{i}")
-        await asyncio.sleep(0.35)
-
-    # BOOKS
-    for i, url in enumerate(texts.BOOKS, 1):
-        props = {
-            "Title": make_title(f"book_{i}"),
-            "Type": make_select("book"),
-            "Content": make_rich_text(url),
-            "Active": make_checkbox(True),
-        }
-        await create_page(client, CONTENT_DB_ID, props)
-        print(f"  book_{i}")
-        await asyncio.sleep(0.35)
-
-    print("Контент мигрирован!")
-
-
-async def migrate_ui_texts(client: httpx.AsyncClient):
-    """Миграция UI текстов."""
-    print("\n=== Миграция UI текстов ===")
-
-    ui_texts = {
-        # Онбординг
-        "ONBOARDING_WELCOME": ("onboarding", texts.ONBOARDING_WELCOME),
-        "ONBOARDING_ASK_REMINDERS": ("onboarding", texts.ONBOARDING_ASK_REMINDERS),
-        "ONBOARDING_NO_REMINDERS": ("onboarding", texts.ONBOARDING_NO_REMINDERS),
-        "ONBOARDING_ASK_FREQUENCY": ("onboarding", texts.ONBOARDING_ASK_FREQUENCY),
-        "ONBOARDING_ASK_TIME": ("onboarding", texts.ONBOARDING_ASK_TIME),
-        "ONBOARDING_CONFIRM": ("onboarding", texts.ONBOARDING_CONFIRM),
-        "WELCOME_BACK": ("onboarding", texts.WELCOME_BACK),
-        # Набор
-        "BOX_INTRO": ("box", texts.BOX_INTRO),
-        "BOX_ASK_NAME": ("box", texts.BOX_ASK_NAME),
-        "BOX_ASK_PHONE": ("box", texts.BOX_ASK_PHONE),
-        "BOX_ASK_ADDRESS": ("box", texts.BOX_ASK_ADDRESS),
-        "BOX_CONFIRM": ("box", texts.BOX_CONFIRM),
-        "BOX_PAYMENT": ("box", texts.BOX_PAYMENT),
-        "BOX_THANKS": ("box", texts.BOX_THANKS),
-        "BOX_CONFIRMED": ("box", texts.BOX_CONFIRMED),
-        "BOX_LATER": ("box", texts.BOX_LATER),
-        # Заказы
-        "WELCOME": ("order", texts.WELCOME),
-        "ABOUT": ("order", texts.ABOUT),
-        "ORDER_START": ("order", texts.ORDER_START),
-        "ORDER_EMAIL": ("order", texts.ORDER_EMAIL),
-        "ORDER_CONFIRM": ("order", texts.ORDER_CONFIRM),
-        "ORDER_PAYMENT": ("order", texts.ORDER_PAYMENT),
-        "ORDER_THANKS": ("order", texts.ORDER_THANKS),
-        "ORDER_CONFIRMED": ("order", texts.ORDER_CONFIRMED),
-        # Система
-        "HELP": ("system", texts.HELP),
-    }
-
-    for key, (category, text) in ui_texts.items():
-        props = {
+def ui_category(key: str) -> str:
+    for prefixes, category in UI_CATEGORIES:
+        if key.startswith(prefixes):
+            return category
+    return "system"
+
+
+def content_items() -> list[MigrationItem]:
+    """Контент (паузы, ссылки)."""
+    items = []
+    for content_type, values in CONTENT_SOURCES:
+        for i, text in enumerate(values, 1):
+            title = f"{content_type}_{i}"
+            items.append(MigrationItem(f"content:{title}", CONTENT_DB_ID, {
+                "Title": make_title(title),
+                "Type": make_select(content_type),
+                "Content": make_rich_text(text),
+                "Active": make_checkbox(True),
+            }))
+    return items
+
+
+def ui_text_items() -> list[MigrationItem]:
+    """UI тексты."""
+    return [
+        MigrationItem(f"ui:{key}", UI_TEXTS_DB_ID, {
             "Key": make_title(key),
-            "Category": make_select(category),
+            "Category": make_select(ui_category(key)),
             "Text": make_rich_text(text),
-        }
-        await create_page(client, UI_TEXTS_DB_ID, props)
-        print(f"  {key}")
-        await asyncio.sleep(0.35)
-
-    print("UI тексты мигрированы!")
+        })
+        for key, text in content.FALLBACK_UI_TEXTS.items()
+    ]
+
+
+def load_checkpoint(path: str) -> set[str]:
+    """Ключи уже созданных страниц."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+async def existing_keys(client: NotionClient) -> set[str]:
+    """Ключи страниц, которые уже есть в базах (по title-свойству Title / Key)."""
+    keys = set()
+    for prefix, database_id in (("content", CONTENT_DB_ID), ("ui", UI_TEXTS_DB_ID)):
+        body = {"page_size": 100}
+        while True:
+            data = await client.query_database(
+                database_id, body, params={"filter_properties": "title"}
+            )
+            for page in data["results"]:
+                for prop in page["properties"].values():
+                    if prop.get("type") == "title":
+                        title = "".join(block.get("plain_text", "") for block in prop["title"])
+                        keys.add(f"{prefix}:{title}")
+            if not data.get("has_more"):
+                break
+            body["start_cursor"] = data["next_cursor"]
+    return keys
+
+
+async def migrate(
+    client: NotionClient, items: list[MigrationItem], checkpoint_path: str, concurrency: int
+) -> tuple[int, int]:
+    """
+    Создать страницы параллельно, отмечая каждую в checkpoint-файле.
+
+    Returns:
+        (создано, ошибок)
+    """
+    pending = iter(items)
+    created = failed = 0
+
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        async def worker():
+            nonlocal created, failed
+            # Итератор общий: каждая страница достаётся ровно одному воркеру
+            for item in pending:
+                try:
+                    await client.request("POST", "/pages", json={
+                        "parent": {"database_id": item.database_id},
+                        "properties": item.properties,
+                    })
+                except (NotionAPIError, httpx.TransportError) as e:
+                    # Не останавливаемся: повторный запуск доделает оставшееся,
+                    # а страницу, созданную несмотря на ошибку, найдёт existing_keys()
+                    failed += 1
+                    print(f"  ✗ {item.key}: {e}")
+                    continue
+                checkpoint.write(item.key + "\n")
+                checkpoint.flush()
+                created += 1
+                print(f"  {item.key}")
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    return created, failed
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Миграция встроенного контента в Notion")
+    parser.add_argument("--dry-run", action="store_true", help="только показать, что будет создано")
+    parser.add_argument("--concurrency", type=int, default=MIGRATION_CONCURRENCY)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="файл с ключами созданных страниц")
+    return parser.parse_args()
 
 
 async def main():
-    # Проверка настроек
-    if not NOTION_TOKEN:
-        print("Ошибка: NOTION_TOKEN не установлен")
-        print("Установи переменную окружения или отредактируй скрипт")
-        sys.exit(1)
+    args = parse_args()
 
-    if not CONTENT_DB_ID:
-        print("Ошибка: NOTION_CONTENT_DB не установлен")
-        sys.exit(1)
+    # Проверка настроек (для --dry-run не нужны)
+    if not args.dry_run:
+        if not NOTION_TOKEN:
+            print("Ошибка: NOTION_TOKEN не установлен")
+            print("Установи переменную окружения или отредактируй скрипт")
+            sys.exit(1)
 
-    if not UI_TEXTS_DB_ID:
-        print("Ошибка: NOTION_UI_TEXTS_DB не установлен")
-        sys.exit(1)
+        if not CONTENT_DB_ID:
+            print("Ошибка: NOTION_CONTENT_DB не установлен")
+            sys.exit(1)
+
+        if not UI_TEXTS_DB_ID:
+            print("Ошибка: NOTION_UI_TEXTS_DB не установлен")
+            sys.exit(1)
+
+    done = load_checkpoint(args.checkpoint)
+    items = [item for item in content_items() + ui_text_items() if item.key not in done]
 
     print("Миграция контента в Notion")
     print(f"Content DB: {CONTENT_DB_ID}")
     print(f"UI Texts DB: {UI_TEXTS_DB_ID}")
+    print(f"Уже создано (checkpoint {args.checkpoint}): {len(done)}, осталось: {len(items)}")
+
+    if args.dry_run:
+        print("\n=== Dry run: будет создано (без проверки Notion) ===")
+        for item in items:
+            print(f"  {item.key}")
+        return
+
+    client = NotionClient(NOTION_TOKEN, base_url=NOTION_API_URL)
+    try:
+        # Страницы, созданные несмотря на ошибку ответа, в checkpoint не попали
+        existing = await existing_keys(client)
+        items = [item for item in items if item.key not in existing]
+        print(f"Уже в Notion: {len(existing)}, к созданию: {len(items)}")
+
+        if not items:
+            print("\nНечего создавать — всё уже в Notion")
+            return
+
+        created, failed = await migrate(client, items, args.checkpoint, args.concurrency)
+    finally:
+        await client.close()
+
+    if failed:
+        print(f"\n=== Создано {created}, ошибок {failed} ===")
+        print("Запусти скрипт ещё раз — созданные страницы будут пропущены")
+        sys.exit(1)
 
-    async with httpx.AsyncClient(
-        base_url="https://api.notion.com/v1",
-        headers={
-            "Authorization": f"Bearer {NOTION_TOKEN}",
-            "Notion-Version": "2022-06-28",
-            "Content-Type": "application/json",
-        },
-        timeout=30.0,
-    ) as client:
-        await migrate_content(client)
-        await migrate_ui_texts(client)
-
-    print("\n=== Миграция завершена! ===")
+    print(f"\n=== Миграция завершена! Создано {created} ===")
     print("\nТеперь добавь в .env:")
     print(f"NOTION_TOKEN={NOTION_TOKEN}")
     print(f"NOTION_CONTENT_DB={CONTENT_DB_ID}")
@@ -119,6 +119,14 @@ BOX_LATER = """Хорошо.
 
 Можно вернуться позже."""
 
+BOX_SHIPPED = """Набор отправлен.
+
+Скоро он будет у тебя."""
+
+BOX_DELIVERED = """Набор доставлен.
+
+Спасибо, что ты здесь."""
+
 # Месяцы на русском (родительный падеж)
 MONTHS_GENITIVE = {
     1: "января",
@@ -192,6 +200,9 @@ ORDER_CONFIRMED = """Оплата подтверждена.
 Набор скоро отправится к тебе.
 Спасибо, что ты здесь."""
 
+DB_BUSY = """Сейчас здесь слишком людно.
+Попробуй ещё раз через минуту."""
+
 HELP = """Команды:
 
 /start — начало